@@ -27,8 +27,8 @@ import {
 } from "lucide-react";
 import { useRouter } from "next/navigation";
 import { 
-  useGetProductsQuery, 
-  useGetCategoriesQuery,
+  useGetProductsInfiniteQuery, 
+  useGetCategoriesInfiniteQuery,
   useGetMyCartQuery,
   useAddCartItemMutation
 } from "../Redux/productsApi ";
@@ -51,8 +51,15 @@ const ProductsPage = () => {
   const [addCartItem] = useAddCartItemMutation();
 
   // Fetch products and categories from API
-  const { data: productsData, isLoading, isError } = useGetProductsQuery();
-  const { data: categoriesData } = useGetCategoriesQuery();
+  const {
+    data: productsData,
+    isLoading,
+    isError,
+    hasNextPage,
+    isFetchingNextPage,
+    fetchNextPage
+  } = useGetProductsInfiniteQuery();
+  const { data: categoriesData } = useGetCategoriesInfiniteQuery();
   const { data: cartData } = useGetMyCartQuery();
 
   const menuItems = [
@@ -66,8 +73,8 @@ const ProductsPage = () => {
 
   const itemsPerPage = 8;
 
-  // Extract products and categories from API response
-  const products = productsData || [];
+  // Extract products and categories from the pages fetched so far
+  const products = productsData?.pages.flatMap(page => page.results) || [];
   const categories = ["All", ...new Set(products.map(product => product.category_name))].filter(Boolean);
 
   // Brands and colors can be extracted from products if needed
@@ -119,6 +126,10 @@ const ProductsPage = () => {
   };
 
   const handleNextPage = () => {
+    // Fetch the next page from the API before running out of loaded products
+    if (hasNextPage && !isFetchingNextPage && (currentPage + 1) * itemsPerPage >= products.length) {
+      fetchNextPage();
+    }
     setCurrentPage(prev => prev + 1);
   };
 
@@ -935,7 +946,7 @@ const ProductsPage = () => {
                 <span className="text-sm">
                   Showing {startIndex + 1}-
                   {Math.min(startIndex + itemsPerPage, filteredProducts.length)}{" "}
-                  of {filteredProducts.length} products
+                  of {filteredProducts.length}{hasNextPage ? "+" : ""} products
                 </span>
                 <div className="flex space-x-2">
                   <button
@@ -957,13 +968,13 @@ const ProductsPage = () => {
                         ? "bg-gray-700 hover:bg-gray-600"
                         : "bg-gray-200 hover:bg-gray-300"
                     } ${
-                      currentPage * itemsPerPage >= filteredProducts.length
+                      currentPage * itemsPerPage >= filteredProducts.length && !hasNextPage
                         ? "opacity-50 cursor-not-allowed"
                         : ""
                     }`}
                     onClick={handleNextPage}
                     disabled={
-                      currentPage * itemsPerPage >= filteredProducts.length
+                      currentPage * itemsPerPage >= filteredProducts.length && !hasNextPage
                     }
                   >
                     <ChevronRight className="h-4 w-4" />
@@ -1,6 +1,13 @@
 // app/redux/productsApi.js
 import { createApi, fetchBaseQuery } from '@reduxjs/toolkit/query/react';
 
+// List endpoints are cursor-paginated: each page is { next, previous, results },
+// and the following page is fetched with the cursor of the `next` link
+const cursorPages = {
+  initialPageParam: null,
+  getNextPageParam: (lastPage) => lastPage.next ? new URL(lastPage.next).searchParams.get('cursor') : undefined
+};
+
 export const productsApi = createApi({
   reducerPath: 'productsApi',
   baseQuery: fetchBaseQuery({ 
@@ -16,8 +23,18 @@ export const productsApi = createApi({
   tagTypes: ['Product', 'Category', 'Cart'],
   endpoints: (builder) => ({
     // ============= PRODUCT ENDPOINTS =============
-    getProducts: builder.query({
-      query: () => 'products/',
+    getProducts: builder.infiniteQuery({
+      infiniteQueryOptions: cursorPages,
+      query: ({ pageParam }) => ({ url: 'products/', params: pageParam ? { cursor: pageParam } : undefined }),
+      providesTags: ['Product']
+    }),
+    
+    searchProducts: builder.infiniteQuery({
+      infiniteQueryOptions: cursorPages,
+      query: ({ queryArg: q, pageParam }) => ({
+        url: 'products/search/',
+        params: pageParam ? { q, cursor: pageParam } : { q }
+      }),
       providesTags: ['Product']
     }),
     
@@ -26,6 +43,11 @@ export const productsApi = createApi({
       providesTags: (result, error, id) => [{ type: 'Product', id }]
     }),
     
+    resolveVariant: builder.query({
+      query: ({ id, options }) => ({ url: `products/${id}/resolve-variant/`, params: { options: options.join(',') } }),
+      providesTags: (result, error, { id }) => [{ type: 'Product', id }]
+    }),
+    
     createProduct: builder.mutation({
       query: (product) => ({
         url: 'products/',
@@ -79,9 +101,27 @@ export const productsApi = createApi({
       invalidatesTags: (result, error, { id }) => [{ type: 'Product', id }]
     }),
     
+    startProductImport: builder.mutation({
+      query: (formData) => ({
+        url: 'products/imports/',
+        method: 'POST',
+        body: formData
+      })
+    }),
+    
+    getProductImport: builder.query({
+      query: (id) => `products/imports/${id}/`
+    }),
+    
     // ============= CATEGORY ENDPOINTS =============
-    getCategories: builder.query({
-      query: () => 'products/categories/',
+    getCategories: builder.infiniteQuery({
+      infiniteQueryOptions: cursorPages,
+      query: ({ pageParam }) => ({ url: 'products/categories/', params: pageParam ? { cursor: pageParam } : undefined }),
+      providesTags: ['Category']
+    }),
+    
+    getCategoryTree: builder.query({
+      query: () => 'products/categories/tree/',
       providesTags: ['Category']
     }),
     
@@ -154,17 +194,22 @@ export const productsApi = createApi({
 // Export hooks for usage in components
 export const {
   // Product endpoints
-  useGetProductsQuery,
+  useGetProductsInfiniteQuery,
+  useSearchProductsInfiniteQuery,
   useGetProductByIdQuery,
+  useResolveVariantQuery,
   useCreateProductMutation,
   useUpdateProductMutation,
   usePatchProductMutation,
   useDeleteProductMutation,
   useAddProductReviewMutation,
   useUploadProductImagesMutation,
+  useStartProductImportMutation,
+  useGetProductImportQuery,
   
   // Category endpoints
-  useGetCategoriesQuery,
+  useGetCategoriesInfiniteQuery,
+  useGetCategoryTreeQuery,
   useCreateCategoryMutation,
   useGetCategoryByIdQuery,
   useUpdateCategoryMutation,
@@ -0,0 +1,46 @@
+import threading
+
+from core.write_buffer import WriteBuffer
+from .models import UserActivity
+
+
+class UserActivityBuffer(WriteBuffer):
+    """
+    Buffers UserActivity rows so tracked requests never wait on the insert
+    """
+    model = UserActivity
+    settings_name = 'USER_ACTIVITY_BUFFER'
+
+    def record(self, activity_type, user_id=None, session_id=None, **fields):
+        """
+        Queue an activity; returns False if it was dropped because the buffer is full
+        """
+        return self.add(UserActivity(
+            activity_type=activity_type,
+            user_id=user_id,
+            session_id=session_id,
+            **fields
+        ))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_user_activity_buffer():
+    """
+    Get the process-wide UserActivity buffer, creating it from settings on first use
+    """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = UserActivityBuffer.from_settings()
+    return _buffer
+
+
+def record_search(search_query, user_id=None, session_id=None):
+    max_length = UserActivity._meta.get_field('search_query').max_length
+    return get_user_activity_buffer().record(
+        'search', user_id=user_id, session_id=session_id, search_query=search_query[:max_length]
+    )
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserActivity
+from .models import ProductViewDaily, SalesDaily, UserActivity
 
 @admin.register(UserActivity)
 class UserActivityAdmin(admin.ModelAdmin):
@@ -7,3 +7,16 @@ class UserActivityAdmin(admin.ModelAdmin):
     list_filter = ['activity_type', 'timestamp']
     search_fields = ['user__email', 'search_query']
 
+
+@admin.register(ProductViewDaily)
+class ProductViewDailyAdmin(admin.ModelAdmin):
+    list_display = ['product', 'seller', 'day', 'count']
+    list_filter = ['day']
+    search_fields = ['product__name']
+
+
+@admin.register(SalesDaily)
+class SalesDailyAdmin(admin.ModelAdmin):
+    list_display = ['product', 'seller', 'category', 'day', 'units', 'gross', 'refunds', 'cancellations']
+    list_filter = ['day']
+    search_fields = ['product__name']
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from analytics.sales import rebuild_sales_daily
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales facts from orders, items and refunds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Fact rows per bulk insert')
+
+    def handle(self, *args, **options):
+        written = rebuild_sales_daily(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily sales rows'))
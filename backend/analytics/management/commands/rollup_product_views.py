@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import rollup_product_views
+
+
+class Command(BaseCommand):
+    help = 'Fold new product views into the daily view counters (safe to re-run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=50000,
+            help='Maximum number of product view ids consumed per transaction'
+        )
+        parser.add_argument(
+            '--settle-seconds', type=int, default=60,
+            help='Leave views newer than this for the next run'
+        )
+        parser.add_argument(
+            '--overlap-days', type=int, default=1,
+            help='Recount this many days before today to pick up views that committed late'
+        )
+
+    def handle(self, *args, **options):
+        rolled_up = rollup_product_views(
+            batch_size=options['batch_size'],
+            settle_seconds=options['settle_seconds'],
+            overlap_days=options['overlap_days']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {rolled_up} product views'))
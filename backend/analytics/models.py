@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from products.models import Product, Category
 
 class UserActivity(models.Model):
@@ -17,7 +18,8 @@ class UserActivity(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
     search_query = models.CharField(max_length=255, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the activity happens, not when a buffered batch is written
+    timestamp = models.DateTimeField(default=timezone.now)
     
     class Meta:
         indexes = [
@@ -31,4 +33,67 @@ class UserActivity(models.Model):
     def __str__(self):
         user_identifier = self.user.username if self.user else self.session_id
         return f"{self.activity_type} by {user_identifier} at {self.timestamp}"
-    
\ No newline at end of file
+    
+
+class ProductViewDaily(models.Model):
+    """Daily product view counts rolled up from ProductView rows"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_views')
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_product_views')
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='product_view_daily_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['seller', 'day'], name='product_view_daily_seller_idx'),
+            models.Index(fields=['day'], name='product_view_daily_day_idx'),
+        ]
+        verbose_name_plural = "Product Views (Daily)"
+    
+    def __str__(self):
+        return f"{self.count} views of {self.product_id} on {self.day}"
+
+
+class SalesDaily(models.Model):
+    """
+    Daily sales of a product, keyed by the day its orders were placed and
+    kept up to date as orders are placed, cancelled and refunded (see
+    analytics/sales.py).
+
+    Facts are deleted with their product, like the order items they are
+    derived from, so a rebuild always agrees with the table.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_sales')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_sales')
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)  # Units ordered
+    gross = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # Value of the units ordered
+    refunds = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # Refunded value
+    cancellations = models.PositiveIntegerField(default=0)  # Units in orders since cancelled
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='sales_daily_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['seller', 'day'], name='sales_daily_seller_idx'),
+            models.Index(fields=['category', 'day'], name='sales_daily_category_idx'),
+            models.Index(fields=['day'], name='sales_daily_day_idx'),
+        ]
+        verbose_name_plural = "Sales (Daily)"
+    
+    def __str__(self):
+        return f"{self.units} units of {self.product_id} on {self.day}"
+
+
+class RollupCheckpoint(models.Model):
+    """High-water mark for an incremental aggregation job"""
+    name = models.CharField(max_length=100, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
@@ -0,0 +1,104 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from products.models import ProductView
+from .models import ProductViewDaily, RollupCheckpoint
+
+PRODUCT_VIEW_ROLLUP = 'product_view_daily'
+
+
+def _upsert_counts(rows):
+    """
+    Write ``rows`` ({(product_id, day): {'product__seller_id', 'count'}})
+    as the counters' new values
+    """
+    ProductViewDaily.objects.bulk_create(
+        [
+            ProductViewDaily(product_id=product_id, seller_id=row['product__seller_id'], day=day, count=row['count'])
+            for (product_id, day), row in rows.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['product', 'day'],
+        update_fields=['count', 'seller'],
+    )
+
+
+def _daily_counts(views):
+    rows = views.annotate(
+        day=TruncDate('timestamp')
+    ).values(
+        'product_id', 'product__seller_id', 'day'
+    ).annotate(
+        count=Count('id')
+    ).order_by()
+    return {(row['product_id'], row['day']): row for row in rows}
+
+
+def _current_counts(rows):
+    existing = ProductViewDaily.objects.filter(
+        product_id__in={product_id for product_id, _ in rows},
+        day__in={day for _, day in rows}
+    ).values_list('product_id', 'day', 'count')
+    return {(product_id, day): count for product_id, day, count in existing}
+
+
+def rollup_product_views(batch_size=50000, settle_seconds=60, overlap_days=1):
+    """
+    Fold new ProductView rows into ProductViewDaily.
+
+    Rows are consumed in id order above the checkpoint's high-water mark,
+    and each batch's counter upsert and checkpoint advance commit together,
+    so the job resumes where it stopped. Rows recorded in the last
+    ``settle_seconds`` are left for the next run, giving buffered inserts
+    that are still in flight time to commit.
+
+    An id below the mark can still commit after the mark has passed it,
+    so every run then recounts today and the ``overlap_days`` days before
+    it from the rows up to the mark and overwrites those counters. That
+    recount is idempotent and picks up such late rows; only rows landing
+    after their day has left the overlap are missed.
+
+    Returns the number of ProductView rows rolled up.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settle_seconds)
+    upper_bound = ProductView.objects.filter(timestamp__lte=cutoff).aggregate(max_id=Max('id'))['max_id']
+    if upper_bound is None:
+        return 0
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            checkpoint, _ = RollupCheckpoint.objects.select_for_update().get_or_create(name=PRODUCT_VIEW_ROLLUP)
+            if checkpoint.last_id >= upper_bound:
+                break
+
+            batch_end = min(checkpoint.last_id + batch_size, upper_bound)
+            rows = _daily_counts(ProductView.objects.filter(id__gt=checkpoint.last_id, id__lte=batch_end))
+            if rows:
+                # Add onto the existing counters; the checkpoint lock keeps runs serialized
+                current = _current_counts(rows)
+                for key, row in rows.items():
+                    row['count'] += current.get(key, 0)
+                _upsert_counts(rows)
+                total += sum(row['count'] - current.get(key, 0) for key, row in rows.items())
+
+            checkpoint.last_id = batch_end
+            checkpoint.save(update_fields=['last_id', 'updated_at'])
+
+    with transaction.atomic():
+        checkpoint = RollupCheckpoint.objects.select_for_update().get(name=PRODUCT_VIEW_ROLLUP)
+        first_day = timezone.localdate() - timedelta(days=overlap_days)
+        rows = _daily_counts(ProductView.objects.filter(
+            timestamp__gte=timezone.make_aware(datetime.combine(first_day, time.min)),
+            id__lte=checkpoint.last_id
+        ))
+        current = _current_counts(rows)
+        late = {key: row for key, row in rows.items() if row['count'] != current.get(key, 0)}
+        if late:
+            _upsert_counts(late)
+            total += sum(row['count'] - current.get(key, 0) for key, row in late.items())
+    return total
@@ -0,0 +1,257 @@
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from rest_framework import serializers
+
+from orders.models import OrderItem
+from payments.models import Refund
+from .models import SalesDaily
+
+SALES_MEASURES = ('units', 'gross', 'refunds', 'cancellations')
+
+# Dimensions the sales endpoint can group by, as {name: (group key, label field or None)}
+SALES_DIMENSIONS = {
+    'day': ('day', None),
+    'week': ('week', None),
+    'month': ('month', None),
+    'product': ('product_id', 'product__name'),
+    'category': ('category_id', 'category__name'),
+    'seller': ('seller_id', 'seller__username'),
+}
+TIME_DIMENSIONS = ('day', 'week', 'month')
+
+CENT = Decimal('0.01')
+
+_money_field = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+def order_day(order):
+    """
+    The day an order's sales are filed under: the local date it was placed
+    """
+    return timezone.localdate(order.created_at)
+
+
+def _delta(deltas, product_id, day, seller_id, category_id):
+    return deltas.setdefault((product_id, day), {
+        'seller_id': seller_id, 'category_id': category_id,
+        'units': 0, 'gross': Decimal('0'), 'refunds': Decimal('0'), 'cancellations': 0,
+    })
+
+
+def add_sales(deltas):
+    """
+    Add ``deltas`` ({(product_id, day): {'seller_id', 'category_id', measure: n}})
+    onto the fact rows, creating rows for a product's first sale of a day.
+
+    Existing rows are bumped in one UPDATE of ``F()`` increments, so
+    concurrent orders for the same product add up instead of overwriting
+    each other, and new rows go in with one INSERT; if another order
+    created one of them first, the rows are retried one by one.
+    """
+    deltas = {
+        key: delta for key, delta in deltas.items() if any(delta[measure] for measure in SALES_MEASURES)
+    }
+    if not deltas:
+        return
+    product_ids = {product_id for product_id, _ in deltas}
+    days = {day for _, day in deltas}
+    existing = {
+        (product_id, day): pk
+        for pk, product_id, day in SalesDaily.objects.filter(
+            product_id__in=product_ids, day__in=days
+        ).values_list('pk', 'product_id', 'day')
+        if (product_id, day) in deltas
+    }
+
+    if existing:
+        rows = []
+        for key, pk in existing.items():
+            row = SalesDaily(pk=pk)
+            for measure in SALES_MEASURES:
+                setattr(row, measure, F(measure) + deltas[key][measure])
+            rows.append(row)
+        SalesDaily.objects.bulk_update(rows, SALES_MEASURES)
+
+    new = [key for key in deltas if key not in existing]
+    if not new:
+        return
+    try:
+        with transaction.atomic():
+            SalesDaily.objects.bulk_create([_fact(key, deltas[key]) for key in new])
+    except IntegrityError:
+        # Another order created some of the rows first
+        for key in new:
+            _add_one(key, deltas[key])
+
+
+def _fact(key, delta):
+    product_id, day = key
+    return SalesDaily(
+        product_id=product_id, seller_id=delta['seller_id'], category_id=delta['category_id'],
+        day=day, **{measure: delta[measure] for measure in SALES_MEASURES}
+    )
+
+
+def _add_one(key, delta):
+    product_id, day = key
+    changes = {measure: F(measure) + delta[measure] for measure in SALES_MEASURES}
+    rows = SalesDaily.objects.filter(product_id=product_id, day=day)
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            _fact(key, delta).save(force_insert=True)
+    except IntegrityError:
+        rows.update(**changes)
+
+
+def order_lines(order_ids):
+    """
+    The items of the given orders as (order_id, product_id, seller_id,
+    category_id, quantity, line total) tuples, in id order
+    """
+    return [
+        (row['order_id'], row['product_id'], row['product__seller_id'], row['product__category_id'],
+         row['quantity'], row['price'] * row['quantity'])
+        for row in OrderItem.objects.filter(order_id__in=order_ids).order_by('id').values(
+            'order_id', 'product_id', 'product__seller_id', 'product__category_id', 'quantity', 'price'
+        )
+    ]
+
+
+def allocate_refund(amount, lines):
+    """
+    Split a refund over an order's lines in proportion to their totals,
+    rounded to cents with the remainder on the last line; returns one
+    share per line
+    """
+    total = sum(line[-1] for line in lines)
+    if not lines or not total:
+        return []
+    shares = [(amount * line[-1] / total).quantize(CENT, rounding=ROUND_HALF_UP) for line in lines[:-1]]
+    return shares + [amount - sum(shares, Decimal('0'))]
+
+
+def record_order_placed(order, order_items):
+    """
+    Add a new order's units and value. The items' products must be loaded.
+    """
+    deltas = {}
+    day = order_day(order)
+    for order_item in order_items:
+        product = order_item.product
+        delta = _delta(deltas, product.id, day, product.seller_id, product.category_id)
+        delta['units'] += order_item.quantity
+        delta['gross'] += order_item.price * order_item.quantity
+    add_sales(deltas)
+
+
+def record_cancellation(order, sign=1):
+    """
+    Count an order's units as cancelled, or with ``sign`` -1 take them
+    back out when a cancelled order is reinstated
+    """
+    deltas = {}
+    day = order_day(order)
+    for _, product_id, seller_id, category_id, quantity, _ in order_lines([order.id]):
+        _delta(deltas, product_id, day, seller_id, category_id)['cancellations'] += sign * quantity
+    add_sales(deltas)
+
+
+def record_refund(refund):
+    """
+    Spread a refund over the products of its order
+    """
+    order = refund.payment.order
+    lines = order_lines([order.id])
+    deltas = {}
+    day = order_day(order)
+    for line, share in zip(lines, allocate_refund(Decimal(refund.amount), lines)):
+        _delta(deltas, line[1], day, line[2], line[3])['refunds'] += share
+    add_sales(deltas)
+
+
+def rebuild_sales_daily(batch_size=1000):
+    """
+    Recompute the whole fact table from orders, items and refunds, e.g.
+    to backfill it or to pick up items edited after checkout. Returns the
+    number of fact rows written.
+    """
+    with transaction.atomic():
+        SalesDaily.objects.all().delete()
+        facts = {}
+        rows = OrderItem.objects.annotate(day=TruncDate('order__created_at')).values(
+            'product_id', 'day', 'product__seller_id', 'product__category_id'
+        ).annotate(
+            units=Sum('quantity'),
+            gross=Sum(F('price') * F('quantity')),
+            cancellations=Sum('quantity', filter=Q(order__status='cancelled')),
+        ).order_by()
+        for row in rows.iterator():
+            delta = _delta(facts, row['product_id'], row['day'], row['product__seller_id'], row['product__category_id'])
+            delta['units'] += row['units']
+            delta['gross'] += row['gross']
+            delta['cancellations'] += row['cancellations'] or 0
+
+        # Refunds are split per refund, exactly as record_refund does
+        refunds = list(Refund.objects.values_list('amount', 'payment__order_id', 'payment__order__created_at'))
+        lines = defaultdict(list)
+        for line in order_lines({order_id for _, order_id, _ in refunds}):
+            lines[line[0]].append(line)
+        for amount, order_id, created_at in refunds:
+            day = timezone.localdate(created_at)
+            for line, share in zip(lines[order_id], allocate_refund(amount, lines[order_id])):
+                _delta(facts, line[1], day, line[2], line[3])['refunds'] += share
+
+        SalesDaily.objects.bulk_create(
+            [_fact(key, delta) for key, delta in facts.items()], batch_size=batch_size
+        )
+    return len(facts)
+
+
+def sales_report(facts, dimensions):
+    """
+    Roll the fact rows up to the given dimensions (see SALES_DIMENSIONS),
+    e.g. ['month'] for a monthly series or ['category', 'product'] to
+    drill into categories; no dimensions gives the grand total. Only the
+    fact table and the labels of the grouped products, categories and
+    sellers are read.
+    """
+    if 'week' in dimensions:
+        facts = facts.annotate(week=TruncWeek('day'))
+    if 'month' in dimensions:
+        facts = facts.annotate(month=TruncMonth('day'))
+
+    group_by = []
+    for dimension in dimensions:
+        key, label = SALES_DIMENSIONS[dimension]
+        group_by += [key, label] if label else [key]
+
+    time_keys = [dimension for dimension in dimensions if dimension in TIME_DIMENSIONS]
+    measures = {measure: Sum(measure) for measure in SALES_MEASURES}
+    if group_by:
+        rows = facts.values(*group_by).annotate(**measures).order_by(*time_keys, '-gross', *group_by)
+    else:
+        rows = [facts.aggregate(**measures)]
+
+    results = []
+    for row in rows:
+        for dimension in time_keys:
+            row[dimension] = row[dimension].isoformat()
+        for dimension in dimensions:
+            key, label = SALES_DIMENSIONS[dimension]
+            if label:
+                row[dimension] = {'id': row.pop(key), 'name': row.pop(label)}
+        row['units'] = row['units'] or 0
+        row['cancellations'] = row['cancellations'] or 0
+        gross, refunds = row['gross'] or Decimal('0'), row['refunds'] or Decimal('0')
+        row['gross'] = _money_field.to_representation(gross)
+        row['refunds'] = _money_field.to_representation(refunds)
+        row['net'] = _money_field.to_representation(gross - refunds)
+        results.append(row)
+    return results
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from orders.models import Order
+from orders.signals import order_placed
+from payments.models import Refund
+from .sales import record_cancellation, record_order_placed, record_refund
+
+
+@receiver(order_placed)
+def add_placed_order(sender, order, items, **kwargs):
+    record_order_placed(order, items)
+
+
+@receiver(post_save, sender=Order)
+def track_cancellation(sender, instance, created, **kwargs):
+    """
+    Count an order's units as cancelled when it moves to cancelled, and
+    take them back out if it moves on from there
+    """
+    # Instances loaded without their status cannot tell a transition
+    previous = instance.__dict__.get('_loaded_status')
+    if not created and '_loaded_status' in instance.__dict__ and previous != instance.status:
+        if instance.status == 'cancelled':
+            record_cancellation(instance)
+        elif previous == 'cancelled':
+            record_cancellation(instance, sign=-1)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_save, sender=Refund)
+def add_refund(sender, instance, created, **kwargs):
+    if created:
+        record_refund(instance)
@@ -1,3 +1,251 @@
+from datetime import timedelta
+from io import StringIO
+from decimal import Decimal
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from carts.models import Cart, CartItem
+from orders.models import Order
+from payments.models import Payment
+from products.models import Category, Product, ProductView
+from .models import ProductViewDaily, RollupCheckpoint, SalesDaily
+from .rollups import PRODUCT_VIEW_ROLLUP, rollup_product_views
+
+User = get_user_model()
+
+
+class ProductViewRollupTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.category = Category.objects.create(name='Rollups')
+        self.product = Product.objects.create(
+            name='Viewed', description='d', price='5.00', stock=1,
+            category=self.category, seller=self.seller
+        )
+        self.now = timezone.now()
+
+    def add_views(self, count, days_ago=0, product=None):
+        ProductView.objects.bulk_create([
+            ProductView(product=product or self.product, timestamp=self.now - timedelta(days=days_ago, minutes=5))
+            for _ in range(count)
+        ])
+
+    def counts(self):
+        return dict(ProductViewDaily.objects.values_list('day', 'count'))
+
+    def test_rollup_counts_views_per_day(self):
+        self.add_views(3)
+        self.add_views(2, days_ago=1)
+        self.assertEqual(rollup_product_views(), 5)
+        today = (self.now - timedelta(minutes=5)).date()
+        yesterday = (self.now - timedelta(days=1, minutes=5)).date()
+        self.assertEqual(self.counts(), {today: 3, yesterday: 2})
+        self.assertEqual(ProductViewDaily.objects.filter(seller=self.seller).count(), 2)
+
+    def test_rerunning_is_idempotent(self):
+        self.add_views(4)
+        rollup_product_views()
+        self.assertEqual(rollup_product_views(), 0)
+        self.assertEqual(sum(self.counts().values()), 4)
+
+    def test_resumes_from_high_water_mark(self):
+        self.add_views(3)
+        rollup_product_views(batch_size=2)
+        self.add_views(2)
+        self.assertEqual(rollup_product_views(batch_size=2), 2)
+        self.assertEqual(sum(self.counts().values()), 5)
+        checkpoint = RollupCheckpoint.objects.get(name=PRODUCT_VIEW_ROLLUP)
+        self.assertEqual(checkpoint.last_id, ProductView.objects.latest('id').id)
+
+    def test_recent_views_wait_for_next_run(self):
+        ProductView.objects.create(product=self.product, timestamp=timezone.now())
+        self.assertEqual(rollup_product_views(settle_seconds=60), 0)
+        self.assertEqual(rollup_product_views(settle_seconds=0), 1)
+
+    def test_views_committing_below_the_mark_are_recounted(self):
+        self.add_views(3)
+        # A buffered insert that took the middle id has not committed yet
+        late = ProductView.objects.order_by('id')[1]
+        ProductView.objects.filter(id=late.id).delete()
+        self.assertEqual(rollup_product_views(), 2)
+
+        ProductView.objects.create(id=late.id, product=self.product, timestamp=late.timestamp)
+        self.assertEqual(rollup_product_views(), 1)
+        self.assertEqual(rollup_product_views(), 0)
+        self.assertEqual(sum(self.counts().values()), 3)
+
+
+    def test_deleting_a_rolled_up_product_removes_its_rollups(self):
+        self.add_views(3)
+        rollup_product_views()
+        client = APIClient()
+        client.force_authenticate(user=self.seller)
+        response = client.delete(f'/api/products/{self.product.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Product.objects.filter(id=self.product.id).exists())
+        self.assertFalse(ProductViewDaily.objects.exists())
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.other = User.objects.create_user('other', 'other@test.com', 'password123', role='seller')
+        self.category = Category.objects.create(name='Dashboard')
+        self.mine = Product.objects.create(
+            name='Mine', description='d', price='5.00', stock=1,
+            category=self.category, seller=self.seller
+        )
+        self.theirs = Product.objects.create(
+            name='Theirs', description='d', price='5.00', stock=1,
+            category=self.category, seller=self.other
+        )
+        today = timezone.now().date()
+        ProductViewDaily.objects.bulk_create([
+            ProductViewDaily(product=self.mine, seller=self.seller, day=today, count=7),
+            ProductViewDaily(product=self.mine, seller=self.seller, day=today - timedelta(days=1), count=3),
+            ProductViewDaily(product=self.mine, seller=self.seller, day=today - timedelta(days=60), count=100),
+            ProductViewDaily(product=self.theirs, seller=self.other, day=today, count=50),
+        ])
+        self.client.force_authenticate(user=self.seller)
+
+    def test_seller_dashboard_reads_from_rollup(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/analytics/dashboard/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([day['count'] for day in response.data['views_by_day']], [3, 7])
+        self.assertEqual(list(response.data['top_products']), [
+            {'id': self.mine.id, 'name': 'Mine', 'view_count': 110}
+        ])
+        self.assertEqual(response.data['top_categories'], [
+            {'id': self.category.id, 'name': 'Dashboard', 'product_count': 1}
+        ])
+
+    def test_admin_sees_all_sellers(self):
+        admin = User.objects.create_user('admin', 'admin@test.com', 'password123', role='admin', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/analytics/dashboard/', {'days': 7})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['name'] for p in response.data['top_products']], ['Mine', 'Theirs'])
+        self.assertEqual(response.data['top_categories'][0]['product_count'], 2)
+
+
+class SalesDailyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.other = User.objects.create_user('other', 'other@test.com', 'password123', role='seller')
+        self.admin = User.objects.create_user('admin', 'admin@test.com', 'password123', role='admin', is_staff=True)
+        self.customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        self.clothing = Category.objects.create(name='Clothing')
+        self.shirts = Category.objects.create(name='Shirts', parent=self.clothing)
+        self.books = Category.objects.create(name='Books')
+        self.shirt = Product.objects.create(
+            name='Shirt', description='d', price='10.00', stock=20, category=self.shirts, seller=self.seller
+        )
+        self.book = Product.objects.create(
+            name='Book', description='d', price='30.00', stock=20, category=self.books, seller=self.other
+        )
+        self.order = self.place_order({self.shirt: 2, self.book: 1})
+
+    def place_order(self, quantities):
+        cart, _ = Cart.objects.get_or_create(customer=self.customer)
+        for product, quantity in quantities.items():
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.post('/api/orders/', {
+            'shipping_address': 'a', 'billing_address': 'b', 'payment_method': 'card', 'total_price': '0.00'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Order.objects.filter(user=self.customer).latest('id')
+
+    def facts(self):
+        return {
+            row.product_id: (row.units, row.gross, row.refunds, row.cancellations)
+            for row in SalesDaily.objects.all()
+        }
+
+    def set_status(self, order, status_value):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.patch(f'/api/orders/{order.id}/update_status/', {'status': status_value})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_checkout_adds_units_and_gross(self):
+        self.place_order({self.shirt: 1})
+        self.assertEqual(self.facts(), {
+            self.shirt.id: (3, Decimal('30.00'), Decimal('0.00'), 0),
+            self.book.id: (1, Decimal('30.00'), Decimal('0.00'), 0),
+        })
+        fact = SalesDaily.objects.get(product=self.shirt)
+        self.assertEqual((fact.seller_id, fact.category_id), (self.seller.id, self.shirts.id))
+        self.assertEqual(fact.day, timezone.localdate(self.order.created_at))
+
+    def test_cancelling_and_reinstating_an_order(self):
+        self.set_status(self.order, 'cancelled')
+        self.assertEqual(SalesDaily.objects.get(product=self.shirt).cancellations, 2)
+        self.set_status(self.order, 'processing')
+        self.assertEqual(SalesDaily.objects.get(product=self.shirt).cancellations, 0)
+
+    def test_refund_is_split_over_products(self):
+        payment = Payment.objects.create(order=self.order, amount='50.00', status='completed')
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(f'/api/payments/{payment.id}/refund/', {'reason': 'Damaged', 'amount': '10.00'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.facts(), {
+            self.shirt.id: (2, Decimal('20.00'), Decimal('4.00'), 2),
+            self.book.id: (1, Decimal('30.00'), Decimal('6.00'), 1),
+        })
+
+    def test_rebuild_matches_incremental_facts(self):
+        self.set_status(self.place_order({self.book: 2}), 'cancelled')
+        payment = Payment.objects.create(order=self.order, amount='50.00', status='completed')
+        self.client.post(f'/api/payments/{payment.id}/refund/', {'reason': 'Late', 'amount': '25.00'})
+        incremental = self.facts()
+        call_command('rebuild_sales_daily', stdout=StringIO())
+        self.assertEqual(self.facts(), incremental)
+
+    def test_deleting_a_sold_product_drops_its_facts(self):
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.delete(f'/api/products/{self.shirt.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.facts(), {self.book.id: (1, Decimal('30.00'), Decimal('0.00'), 0)})
+        call_command('rebuild_sales_daily', stdout=StringIO())
+        self.assertEqual(self.facts(), {self.book.id: (1, Decimal('30.00'), Decimal('0.00'), 0)})
+
+    def test_admin_rolls_up_and_drills_down(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/api/analytics/sales/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{
+            'units': 3, 'gross': '50.00', 'refunds': '0.00', 'cancellations': 0, 'net': '50.00'
+        }])
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/analytics/sales/', {'group_by': 'month,category'})
+        self.assertEqual(
+            [(row['category']['name'], row['gross']) for row in response.data['results']],
+            [('Books', '30.00'), ('Shirts', '20.00')]
+        )
+        self.assertEqual(response.data['results'][0]['month'], timezone.localdate().replace(day=1).isoformat())
+
+        response = self.client.get('/api/analytics/sales/', {'group_by': 'product', 'category': self.clothing.id})
+        self.assertEqual([row['product']['id'] for row in response.data['results']], [self.shirt.id])
+
+    def test_seller_sees_only_their_products(self):
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.get('/api/analytics/sales/', {'group_by': 'seller', 'seller': self.other.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{
+            'seller': {'id': self.seller.id, 'name': 'seller'},
+            'units': 2, 'gross': '20.00', 'refunds': '0.00', 'cancellations': 0, 'net': '20.00'
+        }])
 
-# Create your tests here.
+    def test_rejects_invalid_parameters(self):
+        self.client.force_authenticate(user=self.admin)
+        for params in ({'group_by': 'colour'}, {'group_by': 'day,month'}, {'start_date': 'yesterday'}):
+            response = self.client.get('/api/analytics/sales/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.data)
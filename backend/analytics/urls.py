@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import dashboard_stats
+from .views import dashboard_stats, sales
 
 urlpatterns = [
     path('dashboard/', dashboard_stats, name='dashboard-stats'),
+    path('sales/', sales, name='sales'),
 ]
\ No newline at end of file
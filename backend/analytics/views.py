@@ -1,18 +1,21 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Count
-from products.models import Product, Category, ProductView
-from django.db.models.functions import TruncDay
-from datetime import timedelta
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from products.models import Category, Product
+from .models import ProductViewDaily, SalesDaily
+from .sales import SALES_DIMENSIONS, TIME_DIMENSIONS, sales_report
+from datetime import date, timedelta
 from django.utils import timezone
 from permissions import IsSellerOrAdmin
 from rest_framework import serializers
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 
 # Create a serializer for the dashboard stats
 class DayViewsSerializer(serializers.Serializer):
-    day = serializers.DateTimeField()
+    day = serializers.DateField()
     count = serializers.IntegerField()
 
 class ProductStatsSerializer(serializers.Serializer):
@@ -41,69 +44,136 @@ def dashboard_stats(request):
     
     # Filter by seller if the user is a seller
     user = request.user
-    seller_filter = {}
-    if user.role == 'seller' and not user.is_staff:
-        seller_filter = {'product__seller': user}
+    is_seller = user.role == 'seller' and not user.is_staff
     
-    # Product views over time
-    views_by_day = ProductView.objects.filter(
-        timestamp__gte=start_date,
-        **seller_filter
-    ).annotate(
-        day=TruncDay('timestamp')
-    ).values('day').annotate(
-        count=Count('id')
-    ).order_by('day')
+    # Product views over time, read from the daily rollup
+    daily_views = ProductViewDaily.objects.filter(day__gte=start_date.date())
+    if is_seller:
+        daily_views = daily_views.filter(seller=user)
     
-    # Top products
-    if user.role == 'seller' and not user.is_staff:
-        # Sellers can only see their own products
-        top_products = Product.objects.filter(
-            seller=user
-        ).annotate(
-            view_count=Count('views')
-        ).order_by('-view_count')[:10].values('id', 'name')
-    else:
-        # Admins can see all products
-        top_products = Product.objects.annotate(
-            view_count=Count('views')
-        ).order_by('-view_count')[:10].values('id', 'name')
+    views_by_day = daily_views.values('day').annotate(
+        count=Sum('count')
+    ).order_by('day')
     
-    # Add view count to each product
-    for product in top_products:
-        product['view_count'] = ProductView.objects.filter(product_id=product['id']).count()
+    # Top products by views of all time, summed over their daily counters
+    products = Product.objects.filter(seller=user) if is_seller else Product.objects.all()
+    top_products = products.annotate(
+        view_count=Coalesce(Sum('daily_views__count'), 0)
+    ).order_by('-view_count', 'id').values('id', 'name', 'view_count')[:10]
     
     # Top categories
-    if user.role == 'seller' and not user.is_staff:
-        # Sellers can only see categories of their products
-        seller_product_categories = Product.objects.filter(seller=user).values_list('category', flat=True)
+    if is_seller:
+        # Sellers only see categories of their own products, counted over their products
         top_categories = Category.objects.filter(
-            id__in=seller_product_categories
+            products__seller=user
         ).annotate(
-            product_count=Count('products')
-        ).order_by('-product_count')[:10].values('id', 'name')
+            product_count=Count('products', filter=Q(products__seller=user))
+        )
     else:
         # Admins can see all categories
         top_categories = Category.objects.annotate(
             product_count=Count('products')
-        ).order_by('-product_count')[:10].values('id', 'name')
-    
-    # Add product count to each category
-    for category in top_categories:
-        if user.role == 'seller' and not user.is_staff:
-            # For sellers, only count their products
-            category['product_count'] = Product.objects.filter(
-                category_id=category['id'],
-                seller=user
-            ).count()
-        else:
-            # For admins, count all products
-            category['product_count'] = Product.objects.filter(
-                category_id=category['id']
-            ).count()
+        )
+    top_categories = top_categories.order_by('-product_count', 'id').values('id', 'name', 'product_count')[:10]
     
     return Response({
         'views_by_day': list(views_by_day),
         'top_products': list(top_products),
         'top_categories': list(top_categories),
-    })
\ No newline at end of file
+    })
+
+@extend_schema(
+    description="Sales totals from the daily sales facts, rolled up to the requested dimensions",
+    parameters=[
+        OpenApiParameter(
+            name='group_by',
+            description=(
+                'Comma-separated dimensions to group by, at most one of day, week or month plus any of '
+                'product, category and seller; omit for the grand total'
+            ),
+            required=False,
+            type=str,
+        ),
+        OpenApiParameter(
+            name='start_date',
+            description='First day to include (YYYY-MM-DD)',
+            required=False,
+            type=str,
+        ),
+        OpenApiParameter(
+            name='end_date',
+            description='Last day to include (YYYY-MM-DD)',
+            required=False,
+            type=str,
+        ),
+        OpenApiParameter(
+            name='product',
+            description='Only this product',
+            required=False,
+            type=int,
+        ),
+        OpenApiParameter(
+            name='category',
+            description='Only this category and its subcategories',
+            required=False,
+            type=int,
+        ),
+        OpenApiParameter(
+            name='seller',
+            description='Only this seller (admins only)',
+            required=False,
+            type=int,
+        ),
+    ],
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsSellerOrAdmin])
+def sales(request):
+    """Roll up and drill down into daily sales by day, week, month, product, category and seller"""
+    user = request.user
+    facts = SalesDaily.objects.all()
+    if not (user.is_staff or user.role == 'admin'):
+        facts = facts.filter(seller=user)
+    
+    # Validate the dimensions
+    dimensions = [name.strip() for name in request.query_params.get('group_by', '').split(',') if name.strip()]
+    unknown = [name for name in dimensions if name not in SALES_DIMENSIONS]
+    if unknown:
+        return Response(
+            {'error': f"Invalid group_by. Must be made of: {', '.join(SALES_DIMENSIONS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len([name for name in dimensions if name in TIME_DIMENSIONS]) > 1:
+        return Response(
+            {'error': f"Group by at most one of: {', '.join(TIME_DIMENSIONS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    dimensions = list(dict.fromkeys(dimensions))
+    
+    # Apply filters
+    try:
+        start_date = request.query_params.get('start_date')
+        if start_date:
+            facts = facts.filter(day__gte=date.fromisoformat(start_date))
+        end_date = request.query_params.get('end_date')
+        if end_date:
+            facts = facts.filter(day__lte=date.fromisoformat(end_date))
+        product = request.query_params.get('product')
+        if product:
+            facts = facts.filter(product_id=int(product))
+        category = request.query_params.get('category')
+        if category:
+            facts = facts.filter(category__ancestor_links__ancestor_id=int(category))
+        seller = request.query_params.get('seller')
+        if seller and (user.is_staff or user.role == 'admin'):
+            facts = facts.filter(seller_id=int(seller))
+    except ValueError:
+        return Response(
+            {'error': 'Dates must be YYYY-MM-DD and product, category and seller ids integers'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response({
+        'group_by': dimensions,
+        'results': sales_report(facts, dimensions),
+    })
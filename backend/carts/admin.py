@@ -1,6 +1,6 @@
 # cart/admin.py
 from django.contrib import admin
-from .models import Cart, CartItem
+from .models import Cart, CartItem, StockReservation
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
@@ -30,4 +30,9 @@ class CartItemAdmin(admin.ModelAdmin):
     
     def get_subtotal(self, obj):
         return obj.subtotal
-    get_subtotal.short_description = 'Subtotal'
\ No newline at end of file
+    get_subtotal.short_description = 'Subtotal'
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'cart', 'product', 'variant', 'quantity', 'expires_at')
+    list_filter = ('expires_at',)
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIClient
+
+from carts.models import Cart
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Send concurrent add-to-cart requests for one product and report throughput and oversell'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Number of add-to-cart requests, one customer each')
+        parser.add_argument('--stock', type=int, default=100, help='Stock of the contested product')
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Requests in flight at once; each needs its own database connection'
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the synthetic customers, carts and product instead of deleting them'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+
+        # Requests run on their own connections, so the data is committed up front
+        seller, _ = User.objects.get_or_create(
+            username='reservation-benchmark',
+            defaults={'email': 'reservation-benchmark@example.com', 'role': 'seller'}
+        )
+        product = Product.objects.create(
+            name='Reservation benchmark', description='Synthetic product', price='10.00',
+            stock=options['stock'], seller=seller
+        )
+        customers = User.objects.bulk_create([
+            User(username=f'reservation-benchmark-{product.id}-{index}', email=f'buyer{index}@example.com')
+            for index in range(options['requests'])
+        ])
+        Cart.objects.bulk_create([Cart(customer=customer) for customer in customers])
+
+        barrier = threading.Barrier(min(options['concurrency'], len(customers)))
+
+        def add_to_cart(customer):
+            client = APIClient()
+            client.force_authenticate(user=customer)
+            try:
+                barrier.wait(timeout=1)
+            except threading.BrokenBarrierError:
+                # Only the first wave starts together; later requests go as soon as a slot frees
+                pass
+            try:
+                return client.post('/api/cart/add_item/', {'product_id': product.id}).status_code
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            statuses = Counter(executor.map(add_to_cart, customers))
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        held = statuses.get(200, 0)
+        self.stdout.write(
+            f"{len(customers)} requests in {elapsed:.2f}s ({len(customers) / elapsed:.0f} req/s) "
+            f"with {options['concurrency']} in flight; responses: {dict(sorted(statuses.items()))}"
+        )
+        if held == product.reserved <= product.stock:
+            self.stdout.write(self.style.SUCCESS(
+                f"Held {product.reserved} of {product.stock} units with no oversell"
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"{held} successful adds but {product.reserved} units reserved of {product.stock}"
+            ))
+
+        if not options['keep']:
+            User.objects.filter(id__in=[customer.id for customer in customers]).delete()
+            product.delete()
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from carts.reservations import get_options, reap_expired, recount_reserved
+
+
+class Command(BaseCommand):
+    help = 'Give the stock held by expired cart reservations back to stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep running, reaping every INTERVAL seconds (run as a worker)'
+        )
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Recompute every reserved count from the holds table first'
+        )
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            recount_reserved()
+            self.stdout.write('Recounted reserved stock')
+
+        batch_size = get_options()['REAP_BATCH_SIZE']
+        while True:
+            # Reap in batches until a batch comes back short
+            reaped = 0
+            while True:
+                count = reap_expired(limit=batch_size)
+                reaped += count
+                if count < batch_size:
+                    break
+            self.stdout.write(self.style.SUCCESS(f'Released {reaped} expired stock reservations'))
+
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
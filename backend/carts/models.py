@@ -1,16 +1,42 @@
+import hashlib
+
 from django.db import models
 from django.conf import settings
+from products.cache import catalog_cache
 from products.models import Product, ProductVariant
 from django.db.models import Sum, F
+from django.utils import timezone
+from core.conditional import make_etag
 
 class Cart(models.Model):
     customer = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped on every change to the cart's items; part of the cart ETag
+    version = models.PositiveIntegerField(default=0)
     
     def __str__(self):
         return f"Cart for {self.customer.username}"
     
+    def get_etag(self):
+        """
+        Validator for the rendered cart, which also shows product prices,
+        stock and the sellers' shipping methods. Combines the cart version
+        with the catalog cache generations of the cart's products (bumped by
+        every product, variant, price or stock change; see products/cache.py)
+        and when each seller's shipping method last changed. Runs one query.
+        """
+        lines = sorted(set(self.items.values_list('product_id', 'product__seller__shipping_method__updated_at')))
+        generations = catalog_cache.get_generations(
+            ['catalog', *(f"product:{product_id}" for product_id in sorted({line[0] for line in lines}))]
+        )
+        digest = hashlib.sha1(repr((generations, lines)).encode('utf-8')).hexdigest()[:16]
+        return make_etag('cart', self.pk, self.version, digest)
+    
+    def bump_version(self):
+        """Record a change to the cart's items"""
+        Cart.objects.filter(pk=self.pk).update(version=F('version') + 1, updated_at=timezone.now())
+    
     @property
     def total_amount(self):
         """Calculate the total amount of the cart"""
@@ -46,4 +72,34 @@ class CartItem(models.Model):
         if self.variant:
             price += self.variant.price_adjustment
             
-        return price * self.quantity
\ No newline at end of file
+        return price * self.quantity
+
+
+class StockReservation(models.Model):
+    """
+    A hold on stock for one cart line until ``expires_at``.
+
+    The quantity is also counted in the ``reserved`` column of the product
+    and, for a variant line, of the variant; see carts/reservations.py.
+    """
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('cart', 'product', 'variant')
+        indexes = [
+            # The reaper scans expired holds oldest first
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+    
+    def __str__(self):
+        variant_info = f" ({self.variant.sku})" if self.variant else ""
+        return f"{self.quantity} x {self.product.name}{variant_info} held for cart {self.cart_id} until {self.expires_at}"
+    
+    @property
+    def is_active(self):
+        return self.expires_at > timezone.now()
@@ -0,0 +1,233 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from rest_framework import serializers
+
+from products.cache import invalidate_catalog, invalidate_products
+from products.inventory import give_back_to_shards, shard_stock, take_from_shards
+from products.models import Product, ProductVariant
+from .models import StockReservation
+
+DEFAULT_OPTIONS = {
+    'TTL': 15 * 60,
+    'REAP_BATCH_SIZE': 1000,
+}
+
+
+def get_options():
+    return {**DEFAULT_OPTIONS, **getattr(settings, 'STOCK_RESERVATIONS', {})}
+
+
+def stock_rows(product, variant):
+    """
+    The stock rows a cart line draws on, as (model, id, shard count):
+    its product and, if any, its variant
+    """
+    rows = [(Product, product.id, product.stock_shards)]
+    if variant:
+        rows.append((ProductVariant, variant.id, variant.stock_shards))
+    return rows
+
+
+def hold_stock(model, row_id, quantity):
+    """
+    Add ``quantity`` to a row's ``reserved`` count in one conditional
+    UPDATE that only matches while the unreserved stock still covers it.
+    Returns whether the row was updated.
+    """
+    return model.objects.filter(
+        id=row_id, stock_shards=0, stock__gte=F('reserved') + quantity
+    ).update(reserved=F('reserved') + quantity) == 1
+
+
+def hold_units(model, row_id, shards, quantity):
+    """
+    Hold ``quantity`` units of a row, all or nothing; returns whether it could.
+    Sharded rows (see products/inventory.py) give up the units from their shards.
+    """
+    if shards:
+        return take_from_shards(model, row_id, quantity)
+    return hold_stock(model, row_id, quantity)
+
+
+def release_stock(model, quantities):
+    """
+    Give held units ({id: n}) back in one UPDATE of ``reserved``, or into
+    a shard for each sharded row
+    """
+    quantities = {row_id: quantity for row_id, quantity in quantities.items() if row_id and quantity}
+    if not quantities:
+        return
+    sharded = dict(model.objects.filter(id__in=quantities, stock_shards__gt=0).values_list('id', 'stock_shards'))
+    for row_id, shards in sharded.items():
+        give_back_to_shards(model, row_id, shards, quantities.pop(row_id))
+    if not quantities:
+        return
+    model.objects.filter(id__in=quantities).update(
+        reserved=Greatest(F('reserved') - Case(
+            *(When(id=row_id, then=Value(quantity)) for row_id, quantity in quantities.items()),
+            output_field=IntegerField()
+        ), Value(0))
+    )
+
+
+def drop_holds(holds):
+    """
+    Delete locked holds, given as (id, product_id, variant_id, quantity)
+    rows, and give their units back to stock
+    """
+    if not holds:
+        return
+    product_quantities = Counter()
+    variant_quantities = Counter()
+    for _, product_id, variant_id, quantity in holds:
+        product_quantities[product_id] += quantity
+        if variant_id:
+            variant_quantities[variant_id] += quantity
+    StockReservation.objects.filter(id__in=[hold[0] for hold in holds]).delete()
+    release_stock(Product, product_quantities)
+    release_stock(ProductVariant, variant_quantities)
+    # Catalog responses show the stock that is not held
+    invalidate_products(*product_quantities)
+
+
+def reap_expired(limit=None, now=None, exclude_cart=None, **filters):
+    """
+    Release up to ``limit`` expired holds, oldest first; returns how many.
+
+    Holds locked by another transaction (a checkout converting them, or a
+    cart renewing them) are skipped rather than waited for. ``filters``
+    narrow the scan, e.g. to the holds on one product.
+    """
+    limit = limit or get_options()['REAP_BATCH_SIZE']
+    with transaction.atomic():
+        holds = StockReservation.objects.select_for_update(skip_locked=True).filter(
+            expires_at__lte=now or timezone.now(), **filters
+        )
+        if exclude_cart is not None:
+            holds = holds.exclude(cart=exclude_cart)
+        holds = list(holds.order_by('expires_at').values_list('id', 'product_id', 'variant_id', 'quantity')[:limit])
+        drop_holds(holds)
+    return len(holds)
+
+
+def available_to_cart(model, row_id, shards, held):
+    """
+    Units of a row the cart could hold: unreserved stock plus the cart's own hold
+    """
+    if shards:
+        return shard_stock(model, row_id) + held
+    stock, reserved = model.objects.filter(id=row_id).values_list('stock', 'reserved').get()
+    return max(stock - reserved + held, 0)
+
+
+def hold_line(cart, product, variant, quantity):
+    """
+    Make the cart's hold on a product (or variant) cover exactly
+    ``quantity`` units, renewing it for a full TTL. A quantity of 0
+    releases the hold.
+
+    Growing a hold takes the extra units with conditional UPDATEs on the
+    product and variant rows, so concurrent carts can never hold more than
+    is in stock; if the stock does not cover them, holds that expired since
+    the reaper last ran are released and the UPDATE is retried once before
+    ValidationError is raised. Sharded products and variants take the units
+    from their shards instead. Every path locks holds before stock rows,
+    the same order as the reaper and checkout, so they cannot deadlock.
+    """
+    with transaction.atomic():
+        hold = StockReservation.objects.select_for_update().filter(
+            cart=cart, product=product, variant=variant
+        ).first()
+        held = hold.quantity if hold else 0
+        delta = quantity - held
+
+        if delta > 0:
+            for model, row_id, shards in stock_rows(product, variant):
+                if hold_units(model, row_id, shards, delta):
+                    continue
+                # Holds that expired since the reaper last ran may be all that is in the way
+                row_filter = {'variant_id': row_id} if model is ProductVariant else {'product_id': row_id}
+                if reap_expired(exclude_cart=cart, **row_filter) and hold_units(model, row_id, shards, delta):
+                    continue
+                available = available_to_cart(model, row_id, shards, held)
+                if model is ProductVariant:
+                    raise serializers.ValidationError(f"Not enough stock for this variant. Only {available} available.")
+                raise serializers.ValidationError(f"Not enough stock. Only {available} available.")
+        elif delta < 0:
+            for model, row_id, _ in stock_rows(product, variant):
+                release_stock(model, {row_id: -delta})
+        if delta:
+            invalidate_products(product.id)
+
+        if quantity == 0:
+            if hold:
+                hold.delete()
+        elif hold:
+            hold.quantity = quantity
+            hold.expires_at = timezone.now() + timedelta(seconds=get_options()['TTL'])
+            hold.save(update_fields=['quantity', 'expires_at'])
+        else:
+            hold = StockReservation.objects.create(
+                cart=cart, product=product, variant=variant, quantity=quantity,
+                expires_at=timezone.now() + timedelta(seconds=get_options()['TTL'])
+            )
+    return hold
+
+
+def release_cart(cart):
+    """
+    Release every hold of a cart
+    """
+    with transaction.atomic():
+        drop_holds(list(StockReservation.objects.select_for_update().filter(cart=cart).order_by('id').values_list(
+            'id', 'product_id', 'variant_id', 'quantity'
+        )))
+
+
+def release_product(product):
+    """
+    Release every hold on a product, e.g. before it is deleted
+    """
+    with transaction.atomic():
+        drop_holds(list(StockReservation.objects.select_for_update().filter(product=product).order_by('id').values_list(
+            'id', 'product_id', 'variant_id', 'quantity'
+        )))
+
+def lock_cart_holds(cart):
+    """
+    Lock the cart's holds for checkout and return the quantities they hold
+    as ({product_id: n}, {variant_id: n}).
+
+    Expired holds that have not been reaped yet still count: their units
+    are still in ``reserved``, and converting them releases them too.
+    """
+    product_quantities = Counter()
+    variant_quantities = Counter()
+    for product_id, variant_id, quantity in StockReservation.objects.select_for_update().filter(
+        cart=cart
+    ).order_by('id').values_list('product_id', 'variant_id', 'quantity'):
+        product_quantities[product_id] += quantity
+        if variant_id:
+            variant_quantities[variant_id] += quantity
+    return product_quantities, variant_quantities
+
+
+def recount_reserved():
+    """
+    Recompute every ``reserved`` count from the holds table.
+
+    Only needed after holds were deleted outside this module, e.g. by a
+    cart being deleted along with its customer.
+    """
+    for model, column in [(Product, 'product'), (ProductVariant, 'variant')]:
+        held = StockReservation.objects.filter(**{column: OuterRef('pk')}).order_by().values(column).annotate(
+            total=Sum('quantity')
+        ).values('total')
+        model.objects.update(reserved=Coalesce(Subquery(held), Value(0)))
+    invalidate_catalog()
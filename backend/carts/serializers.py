@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Prefetch, prefetch_related_objects
 from .models import Cart, CartItem
 from collections import defaultdict
 from decimal import Decimal
@@ -7,6 +9,7 @@ from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 
 # Import ProductSerializer directly
+from products.models import ProductVariantOption
 from products.serializers import ProductSerializer, ProductVariantSerializer
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -35,8 +38,8 @@ class CartItemSerializer(serializers.ModelSerializer):
         return obj.subtotal
     
     def validate_product(self, value):
-        """Validate that the product exists and has stock"""
-        if value.stock <= 0:
+        """Validate that the product exists and has stock not held by other carts"""
+        if value.available_stock <= 0 and not (self.instance and self.instance.product_id == value.id):
             raise serializers.ValidationError(f"Product '{value.name}' is out of stock")
         return value
     
@@ -52,19 +55,18 @@ class CartItemSerializer(serializers.ModelSerializer):
         variant = data.get('variant')
         quantity = data.get('quantity', 1)
         
-        # If we're updating an existing cart item, we need to check the current quantity
-        if self.instance:
-            if variant:
-                if variant.stock < quantity:
-                    raise serializers.ValidationError(f"Not enough stock for this variant. Only {variant.stock} available.")
-            elif product.stock < quantity:
-                raise serializers.ValidationError(f"Not enough stock. Only {product.stock} available.")
+        # If we're updating an existing cart item, its own hold is available to it
+        held = 0
+        if self.instance and self.instance.product_id == product.id and self.instance.variant_id == getattr(variant, 'id', None):
+            held = self.instance.quantity
+        if variant:
+            available = variant.available_stock + held
+            if available < quantity:
+                raise serializers.ValidationError(f"Not enough stock for this variant. Only {available} available.")
         else:
-            if variant:
-                if variant.stock < quantity:
-                    raise serializers.ValidationError(f"Not enough stock for this variant. Only {variant.stock} available.")
-            elif product.stock < quantity:
-                raise serializers.ValidationError(f"Not enough stock. Only {product.stock} available.")
+            available = product.available_stock + held
+            if available < quantity:
+                raise serializers.ValidationError(f"Not enough stock. Only {available} available.")
         
         return data
 
@@ -76,83 +78,99 @@ class CartSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Cart
-        fields = ['id', 'customer', 'items', 'total_amount', 'item_count', 'shipping_info', 'created_at', 'updated_at']
-        read_only_fields = ['customer', 'created_at', 'updated_at']
+        fields = ['id', 'customer', 'items', 'total_amount', 'item_count', 'shipping_info', 'version', 'created_at', 'updated_at']
+        read_only_fields = ['customer', 'version', 'created_at', 'updated_at']
     
-    @extend_schema_field(OpenApiTypes.NUMBER)
-    def get_total_amount(self, obj) -> float:
-        return obj.total_amount
-    
-    @extend_schema_field(OpenApiTypes.INT)
-    def get_item_count(self, obj) -> int:
-        return obj.item_count
+    @staticmethod
+    def load_items(carts):
+        """
+        Load items, products, variants, sellers and shipping methods for the
+        given carts so rendering them costs the same number of queries for
+        any cart size
+        """
+        items = CartItem.objects.select_related(
+            'product__seller__shipping_method', 'variant__product'
+        ).prefetch_related(
+            Prefetch('variant__options', queryset=ProductVariantOption.objects.select_related('variant_type'))
+        ).order_by('id')
+        prefetch_related_objects(carts, Prefetch('items', queryset=items))
     
-    @extend_schema_field(OpenApiTypes.OBJECT)
-    def get_shipping_info(self, obj) -> Dict[str, Any]:
-        """Calculate shipping information for the cart"""
-        # Group cart items by seller
-        seller_items = defaultdict(list)
+    def get_summary(self, obj) -> Dict[str, Any]:
+        """
+        Compute totals and the per-seller shipping breakdown in one pass over the items
+        """
+        if not hasattr(self, '_summaries'):
+            self._summaries = {}
+        summaries = self._summaries
+        if obj.pk in summaries:
+            return summaries[obj.pk]
+        
+        total_amount = Decimal('0.00')
+        item_count = 0
+        sellers = {}
         seller_subtotals = defaultdict(Decimal)
         
         for cart_item in obj.items.all():
+            subtotal = Decimal(cart_item.subtotal)
+            total_amount += subtotal
+            item_count += cart_item.quantity
             seller = cart_item.product.seller
-            seller_items[seller.id].append(cart_item)
-            seller_subtotals[seller.id] += Decimal(cart_item.subtotal)
+            sellers[seller.id] = seller
+            seller_subtotals[seller.id] += subtotal
         
         # Calculate shipping costs for each seller
         shipping_details = []
         total_shipping = Decimal('0.00')
         
-        # Use a try/except block to handle the case where the ShippingMethod model doesn't exist
-        try:
-            from django.apps import apps
-            ShippingMethod = apps.get_model('shipping', 'ShippingMethod')
-            
-            for seller_id, subtotal in seller_subtotals.items():
-                try:
-                    shipping_method = ShippingMethod.objects.get(seller_id=seller_id)
-                    shipping_cost = shipping_method.calculate_shipping_cost(subtotal)
-                    
-                    # Get seller name
-                    seller_name = shipping_method.seller.username
-                    
-                    shipping_details.append({
-                        'seller_id': seller_id,
-                        'seller_name': seller_name,
-                        'subtotal': float(subtotal),
-                        'shipping_cost': float(shipping_cost),
-                        'shipping_type': shipping_method.shipping_type,
-                        'free_shipping_threshold': float(shipping_method.free_shipping_threshold),
-                        'qualifies_for_free_shipping': subtotal >= shipping_method.free_shipping_threshold if shipping_method.free_shipping_threshold > 0 else False
-                    })
-                    
-                    total_shipping += Decimal(shipping_cost)
-                except ShippingMethod.DoesNotExist:
-                    # No shipping method found, assume free shipping
-                    shipping_details.append({
-                        'seller_id': seller_id,
-                        'seller_name': 'Unknown',  # We don't have the seller object here
-                        'subtotal': float(subtotal),
-                        'shipping_cost': 0.00,
-                        'shipping_type': 'free',
-                        'free_shipping_threshold': 0.00,
-                        'qualifies_for_free_shipping': True
-                    })
-        except LookupError:
-            # ShippingMethod model doesn't exist, assume free shipping for all
-            for seller_id, subtotal in seller_subtotals.items():
+        for seller_id, subtotal in seller_subtotals.items():
+            seller = sellers[seller_id]
+            try:
+                shipping_method = seller.shipping_method
+            except ObjectDoesNotExist:
+                # No shipping method found, assume free shipping
                 shipping_details.append({
                     'seller_id': seller_id,
-                    'seller_name': 'Unknown',
+                    'seller_name': seller.username,
                     'subtotal': float(subtotal),
                     'shipping_cost': 0.00,
                     'shipping_type': 'free',
                     'free_shipping_threshold': 0.00,
                     'qualifies_for_free_shipping': True
                 })
+                continue
+            
+            shipping_cost = shipping_method.calculate_shipping_cost(subtotal)
+            shipping_details.append({
+                'seller_id': seller_id,
+                'seller_name': seller.username,
+                'subtotal': float(subtotal),
+                'shipping_cost': float(shipping_cost),
+                'shipping_type': shipping_method.shipping_type,
+                'free_shipping_threshold': float(shipping_method.free_shipping_threshold),
+                'qualifies_for_free_shipping': subtotal >= shipping_method.free_shipping_threshold if shipping_method.free_shipping_threshold > 0 else False
+            })
+            total_shipping += Decimal(shipping_cost)
         
-        return {
-            'shipping_details': shipping_details,
-            'total_shipping': float(total_shipping),
-            'grand_total': float(obj.total_amount + total_shipping)
-        }
\ No newline at end of file
+        summaries[obj.pk] = {
+            'total_amount': total_amount,
+            'item_count': item_count,
+            'shipping_info': {
+                'shipping_details': shipping_details,
+                'total_shipping': float(total_shipping),
+                'grand_total': float(total_amount + total_shipping)
+            }
+        }
+        return summaries[obj.pk]
+    
+    @extend_schema_field(OpenApiTypes.NUMBER)
+    def get_total_amount(self, obj) -> float:
+        return self.get_summary(obj)['total_amount']
+    
+    @extend_schema_field(OpenApiTypes.INT)
+    def get_item_count(self, obj) -> int:
+        return self.get_summary(obj)['item_count']
+    
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_shipping_info(self, obj) -> Dict[str, Any]:
+        """Calculate shipping information for the cart"""
+        return self.get_summary(obj)['shipping_info']
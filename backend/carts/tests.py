@@ -1,3 +1,272 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from products.models import Product, ProductVariant, ProductVariantOption, ProductVariantType
+from shipping.models import ShippingMethod
+from .models import Cart, CartItem, StockReservation
+from .reservations import reap_expired
+
+User = get_user_model()
+
+
+class CartReadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        self.sellers = [
+            User.objects.create_user(f'seller{i}', f'seller{i}@test.com', 'password123', role='seller')
+            for i in range(3)
+        ]
+        ShippingMethod.objects.create(
+            seller=self.sellers[0], shipping_type='flat_rate', flat_rate_amount='4.00', free_shipping_threshold='50.00'
+        )
+        ShippingMethod.objects.create(seller=self.sellers[1], shipping_type='free')
+        size = ProductVariantType.objects.create(name='Size')
+        self.large = ProductVariantOption.objects.create(variant_type=size, value='L')
+        self.cart = Cart.objects.create(customer=self.customer)
+        self.client.force_authenticate(user=self.customer)
+
+    def fill_cart(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                name=f'Cart Product {i}', description='d', price='10.00', stock=10,
+                seller=self.sellers[i % len(self.sellers)]
+            )
+            variant = ProductVariant.objects.create(
+                product=product, sku=f'CART-{self.cart.items.count()}-{i}', price_adjustment='1.00', stock=5
+            )
+            variant.options.add(self.large)
+            CartItem.objects.create(cart=self.cart, product=product, variant=variant, quantity=2)
+
+    def test_my_cart_query_count_is_independent_of_cart_size(self):
+        self.fill_cart(2)
+        # Cart, ETag lines, items with products/variants/sellers/shipping methods, variant options
+        with self.assertNumQueries(4):
+            self.client.get('/api/cart/my_cart/')
+        self.fill_cart(10)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/cart/my_cart/')
+        self.assertEqual(len(response.data['items']), 12)
+        self.assertEqual(response.data['item_count'], 24)
+        self.assertEqual(response.data['items'][0]['variant_details']['name'], 'Cart Product 0 - Size: L')
+
+    def test_totals_and_shipping_breakdown(self):
+        self.fill_cart(3)
+        response = self.client.get('/api/cart/my_cart/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_amount'], 66)
+
+        shipping = {detail['seller_id']: detail for detail in response.data['shipping_info']['shipping_details']}
+        self.assertEqual(shipping[self.sellers[0].id]['shipping_cost'], 4.0)
+        self.assertEqual(shipping[self.sellers[1].id]['shipping_type'], 'free')
+        self.assertEqual(shipping[self.sellers[2].id]['seller_name'], 'seller2')
+        self.assertEqual(response.data['shipping_info']['total_shipping'], 4.0)
+        self.assertEqual(response.data['shipping_info']['grand_total'], 70.0)
+
+    def test_shipping_costs_matches_cart(self):
+        self.fill_cart(4)
+        cart = self.client.get('/api/cart/my_cart/')
+        cache.clear()
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/cart/shipping_costs/')
+        self.assertEqual(response.data, cart.data['shipping_info'])
+
+    def test_mutations_return_reloaded_cart(self):
+        product = Product.objects.create(name='Added', description='d', price='3.00', stock=5, seller=self.sellers[2])
+        response = self.client.post('/api/cart/add_item/', {'product_id': product.id, 'quantity': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['item_count'], 2)
+        response = self.client.post('/api/cart/remove_item/', {'item_id': response.data['items'][0]['id']})
+        self.assertEqual(response.data['items'], [])
+
+
+class CartETagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.product = Product.objects.create(name='Tagged', description='d', price='3.00', stock=5, seller=seller)
+        self.client.force_authenticate(user=self.customer)
+
+    def test_unchanged_cart_returns_304_without_loading_items(self):
+        etag = self.client.get('/api/cart/my_cart/')['ETag']
+        # The cart row and the ETag lines
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cart/my_cart/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_every_mutation_changes_the_etag(self):
+        etags = [self.client.get('/api/cart/my_cart/')['ETag']]
+        response = self.client.post('/api/cart/add_item/', {'product_id': self.product.id})
+        etags.append(response['ETag'])
+        item_id = response.data['items'][0]['id']
+        etags.append(self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': 3})['ETag'])
+        etags.append(self.client.post('/api/cart/remove_item/', {'item_id': item_id})['ETag'])
+        etags.append(self.client.post('/api/cart/clear/')['ETag'])
+        self.assertEqual(len(set(etags)), 5)
+
+        response = self.client.get('/api/cart/my_cart/', HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], etags[-1])
+
+    def test_product_and_shipping_changes_change_the_etag(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/cart/add_item/', {'product_id': self.product.id})
+        etag = self.client.get('/api/cart/my_cart/')['ETag']
+        response = self.client.get('/api/cart/shipping_costs/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = '4.00'
+            self.product.save()
+        response = self.client.get('/api/cart/my_cart/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['total_amount'], 4.0)
+        etag = response['ETag']
+
+        ShippingMethod.objects.create(seller=self.product.seller, shipping_type='flat_rate', flat_rate_amount='2.50')
+        response = self.client.get('/api/cart/shipping_costs/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['grand_total'], 6.5)
+
+    def test_shipping_costs_reuses_breakdown_for_etag(self):
+        self.client.post('/api/cart/add_item/', {'product_id': self.product.id})
+        # Only the cart row and the ETag lines are read; the breakdown comes from the cache
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cart/shipping_costs/')
+        self.assertEqual(response.data['total_shipping'], 0.0)
+        self.assertEqual(response.data['grand_total'], 3.0)
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cart/shipping_costs/', HTTP_IF_NONE_MATCH=f'W/{response["ETag"]}')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+@override_settings(STOCK_RESERVATIONS={'TTL': 600})
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.product = Product.objects.create(name='Limited', description='d', price='3.00', stock=5, seller=seller)
+        self.variant = ProductVariant.objects.create(product=self.product, sku='LIMITED-L', stock=2)
+        self.customers = [
+            User.objects.create_user(f'customer{i}', f'customer{i}@test.com', 'password123')
+            for i in range(2)
+        ]
+
+    def add(self, customer, quantity, **params):
+        self.client.force_authenticate(user=customer)
+        return self.client.post('/api/cart/add_item/', {'product_id': self.product.id, 'quantity': quantity, **params})
+
+    def assert_reserved(self, product, variant=0):
+        self.product.refresh_from_db()
+        self.variant.refresh_from_db()
+        self.assertEqual((self.product.reserved, self.variant.reserved), (product, variant))
+
+    def test_holds_reduce_stock_available_to_other_carts(self):
+        self.assertEqual(self.add(self.customers[0], 3).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.add(self.customers[0], 1).status_code, status.HTTP_200_OK)
+        self.assert_reserved(4)
+        hold = StockReservation.objects.get()
+        self.assertEqual(hold.quantity, 4)
+        self.assertGreater(hold.expires_at, timezone.now() + timedelta(seconds=590))
+
+        response = self.add(self.customers[1], 2)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Not enough stock. Only 1 available.')
+        self.assertFalse(CartItem.objects.filter(cart__customer=self.customers[1]).exists())
+        self.assert_reserved(4)
+
+    @mock.patch('products.views.record_product_view')
+    def test_catalog_shows_stock_not_held_by_carts(self, record_product_view):
+        self.client.force_authenticate(user=self.customers[1])
+        self.client.get(f'/api/products/{self.product.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add(self.customers[0], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add(self.customers[0], 2, variant_id=self.variant.id)
+
+        # The cached detail response was retired by the holds
+        response = self.client.get(f'/api/products/{self.product.id}/')
+        self.assertEqual((response.data['stock'], response.data['available_stock']), (5, 0))
+        self.assertEqual(response.data['variant_index']['']['available_stock'], 0)
+        self.client.force_authenticate(user=self.product.seller)
+        response = self.client.get('/api/products/variants/by-product/', {'product_id': self.product.id})
+        self.assertEqual([variant['available_stock'] for variant in response.data], [0])
+
+        response = self.client.get('/api/products/', {'in_stock': 'true', 'facets': 'true'})
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['facets']['in_stock'], 0)
+        response = self.client.get('/api/products/', {'in_stock': 'false'})
+        self.assertEqual([item['available_stock'] for item in response.data['results']], [0])
+
+    def test_deleting_a_held_product_releases_its_holds(self):
+        self.add(self.customers[0], 2)
+        self.add(self.customers[1], 1, variant_id=self.variant.id)
+        self.client.force_authenticate(user=self.product.seller)
+        response = self.client.delete(f'/api/products/{self.product.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Product.objects.filter(id=self.product.id).exists())
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+
+        self.client.force_authenticate(user=self.customers[0])
+        response = self.client.get('/api/cart/my_cart/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items'], [])
+
+    def test_variant_lines_hold_the_variant_and_product(self):
+        self.assertEqual(self.add(self.customers[0], 2, variant_id=self.variant.id).status_code, status.HTTP_200_OK)
+        self.assert_reserved(2, 2)
+        response = self.add(self.customers[1], 1, variant_id=self.variant.id)
+        self.assertEqual(response.data['error'], 'Not enough stock for this variant. Only 0 available.')
+        self.assert_reserved(2, 2)
+
+    def test_update_remove_and_clear_resize_holds(self):
+        response = self.add(self.customers[0], 1)
+        item_id = response.data['items'][0]['id']
+        self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': 5})
+        self.assert_reserved(5)
+        response = self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': 6})
+        self.assertEqual(response.data['error'], 'Not enough stock. Only 5 available.')
+        self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': 2})
+        self.assert_reserved(2)
+        self.client.post('/api/cart/remove_item/', {'item_id': item_id})
+        self.assert_reserved(0)
+        self.assertFalse(StockReservation.objects.exists())
+
+        self.add(self.customers[0], 1, variant_id=self.variant.id)
+        self.add(self.customers[0], 2)
+        self.client.post('/api/cart/clear/')
+        self.assert_reserved(0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_holds_are_reaped(self):
+        self.add(self.customers[0], 2)
+        self.add(self.customers[1], 1, variant_id=self.variant.id)
+        StockReservation.objects.filter(cart__customer=self.customers[0]).update(expires_at=timezone.now())
+        out = StringIO()
+        call_command('reap_stock_reservations', stdout=out)
+        self.assertIn('Released 1 expired stock reservations', out.getvalue())
+        self.assert_reserved(1, 1)
+        self.assertEqual(reap_expired(), 0)
+
+    def test_expired_holds_give_way_to_new_carts_before_the_reaper_runs(self):
+        self.add(self.customers[0], 5)
+        StockReservation.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.add(self.customers[1], 4).status_code, status.HTTP_200_OK)
+        self.assert_reserved(4)
+        self.assertEqual(StockReservation.objects.get().cart.customer, self.customers[1])
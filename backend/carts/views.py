@@ -1,20 +1,32 @@
 # cart/views.py
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, serializers, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from .models import Cart, CartItem
+from .reservations import hold_line, release_cart
 from .serializers import CartSerializer, CartItemSerializer
 from products.models import Product, ProductVariant
 from shipping.models import ShippingMethod
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample
 from drf_spectacular.types import OpenApiTypes
 from permissions import IsCartOwner
+from core.conditional import etag_matches, not_modified, with_etag
+from django.core.cache import cache
 import logging
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
+# Cached shipping breakdowns are keyed by the cart ETag, which changes with
+# the cart, its products' prices and stock and its sellers' shipping methods
+SHIPPING_CACHE_TIMEOUT = 60 * 60
+
+
+def shipping_cache_key(cart, etag):
+    return f"cart:{cart.pk}:{etag}:shipping"
+
 class CartViewSet(viewsets.GenericViewSet):
     """
     Cart API - only exposes specific actions, not the full ModelViewSet
@@ -28,15 +40,37 @@ class CartViewSet(viewsets.GenericViewSet):
             return Cart.objects.all()
         return Cart.objects.filter(customer=self.request.user)
     
+    def get_cart(self, load_items=True):
+        """Get or create the user's cart, with everything the serializer reads prefetched"""
+        cart, created = Cart.objects.get_or_create(customer=self.request.user)
+        if load_items:
+            CartSerializer.load_items([cart])
+        return cart
+    
+    def cart_response(self, cart, etag=None):
+        """Serialize the cart, remembering its shipping breakdown for this ETag"""
+        etag = etag or cart.get_etag()
+        serializer = self.get_serializer(cart)
+        data = serializer.data
+        cache.set(shipping_cache_key(cart, etag), data['shipping_info'], SHIPPING_CACHE_TIMEOUT)
+        return with_etag(Response(data), etag)
+    
+    @extend_schema(
+        description="Get the user's cart. Send the last ETag in If-None-Match to get 304 while the cart is unchanged."
+    )
     @action(detail=False, methods=['get'])
     def my_cart(self, request):
         """Get or create the user's cart"""
-        cart, created = Cart.objects.get_or_create(customer=request.user)
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+        cart = self.get_cart(load_items=False)
+        etag = cart.get_etag()
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
+        CartSerializer.load_items([cart])
+        return self.cart_response(cart, etag)
     
     @extend_schema(
-        description='Calculate shipping costs for the current cart',
+        description='Calculate shipping costs for the current cart. Supports If-None-Match like my_cart.',
         responses={200: {
             'type': 'object',
             'properties': {
@@ -63,10 +97,18 @@ class CartViewSet(viewsets.GenericViewSet):
     @action(detail=False, methods=['get'])
     def shipping_costs(self, request):
         """Calculate shipping costs for the current cart"""
-        cart, created = Cart.objects.get_or_create(customer=request.user)
-        serializer = self.get_serializer(cart)
-        shipping_info = serializer.data.get('shipping_info', {})
-        return Response(shipping_info)
+        cart = self.get_cart(load_items=False)
+        etag = cart.get_etag()
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
+        # Reuse the breakdown computed for this ETag if there is one
+        shipping_info = cache.get(shipping_cache_key(cart, etag))
+        if shipping_info is None:
+            CartSerializer.load_items([cart])
+            shipping_info = self.get_serializer(cart).get_shipping_info(cart)
+            cache.set(shipping_cache_key(cart, etag), shipping_info, SHIPPING_CACHE_TIMEOUT)
+        return with_etag(Response(shipping_info), etag)
     
     @extend_schema(
         request=OpenApiTypes.OBJECT,
@@ -144,55 +186,36 @@ class CartViewSet(viewsets.GenericViewSet):
                         {"error": f"Variant with ID {variant_id} does not exist for this product"},
                         status=status.HTTP_404_NOT_FOUND
                     )
-                
-                # Check if variant is in stock
-                if variant.stock < quantity:
-                    return Response(
-                        {"error": f"Not enough stock for this variant. Only {variant.stock} available."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-            else:
-                # Check if product is in stock
-                if product.stock < quantity:
-                    return Response(
-                        {"error": f"Not enough stock. Only {product.stock} available."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
             
-            # Check if item already exists in cart
+            # Hold stock for the line's new quantity and save it together, so a
+            # line is never in the cart without the stock reserved for it
+            cart_item = CartItem.objects.filter(cart=cart, product=product, variant=variant).first()
             try:
-                cart_item = CartItem.objects.get(cart=cart, product=product, variant=variant)
-                # Update quantity 
-                cart_item.quantity += quantity
-                # Validate stock again
-                if variant:
-                    if variant.stock < cart_item.quantity:
-                        return Response(
-                            {"error": f"Not enough stock for this variant. Only {variant.stock} available."},
-                            status=status.HTTP_400_BAD_REQUEST
+                with transaction.atomic():
+                    if cart_item:
+                        hold_line(cart, product, variant, cart_item.quantity + quantity)
+                        # Update quantity 
+                        cart_item.quantity += quantity
+                        cart_item.save()
+                        logger.info(f"Updated cart item: {cart_item.id}, product: {product.id}, variant: {variant.id if variant else None}, quantity: {cart_item.quantity}")
+                    else:
+                        hold_line(cart, product, variant, quantity)
+                        # Create new cart item
+                        cart_item = CartItem.objects.create(
+                            cart=cart,
+                            product=product,
+                            variant=variant,
+                            quantity=quantity
                         )
-                elif product.stock < cart_item.quantity:
-                    return Response(
-                        {"error": f"Not enough stock. Only {product.stock} available."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                cart_item.save()
-                logger.info(f"Updated cart item: {cart_item.id}, product: {product.id}, variant: {variant.id if variant else None}, quantity: {cart_item.quantity}")
-            except CartItem.DoesNotExist:
-                # Create new cart item
-                cart_item = CartItem.objects.create(
-                    cart=cart,
-                    product=product,
-                    variant=variant,
-                    quantity=quantity
-                )
-                logger.info(f"Created new cart item: {cart_item.id}, product: {product.id}, variant: {variant.id if variant else None}, quantity: {quantity}")
+                        logger.info(f"Created new cart item: {cart_item.id}, product: {product.id}, variant: {variant.id if variant else None}, quantity: {quantity}")
+            except serializers.ValidationError as e:
+                return Response({"error": e.detail[0]}, status=status.HTTP_400_BAD_REQUEST)
             
+            cart.bump_version()
             
             # Return updated cart
-            cart.refresh_from_db()  # Refresh to ensure we get the latest data
-            serializer = self.get_serializer(cart)
-            return Response(serializer.data)
+            cart = self.get_cart()  # Reload with the latest items and version
+            return self.cart_response(cart)
             
         except Exception as e:
             logger.error(f"Error adding item to cart: {str(e)}")
@@ -252,28 +275,20 @@ class CartViewSet(viewsets.GenericViewSet):
             except CartItem.DoesNotExist:
                 return Response({"error": f"Cart item with ID {item_id} does not exist"}, status=status.HTTP_404_NOT_FOUND)
             
-            # Check if product is in stock
-            if cart_item.variant:
-                if cart_item.variant.stock < quantity:
-                    return Response(
-                        {"error": f"Not enough stock for this variant. Only {cart_item.variant.stock} available."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-            elif cart_item.product.stock < quantity:
-                return Response(
-                    {"error": f"Not enough stock. Only {cart_item.product.stock} available."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Update quantity
-            cart_item.quantity = quantity
-            cart_item.save()
+            # Resize the line's stock hold along with its quantity
+            try:
+                with transaction.atomic():
+                    hold_line(cart, cart_item.product, cart_item.variant, quantity)
+                    cart_item.quantity = quantity
+                    cart_item.save()
+            except serializers.ValidationError as e:
+                return Response({"error": e.detail[0]}, status=status.HTTP_400_BAD_REQUEST)
+            cart.bump_version()
             logger.info(f"Updated cart item: {cart_item.id}, quantity: {quantity}")
             
             # Return updated cart
-            cart.refresh_from_db()  # Refresh to ensure we get the latest data
-            serializer = self.get_serializer(cart)
-            return Response(serializer.data)
+            cart = self.get_cart()  # Reload with the latest items and version
+            return self.cart_response(cart)
             
         except Exception as e:
             logger.error(f"Error updating cart item: {str(e)}")
@@ -315,15 +330,17 @@ class CartViewSet(viewsets.GenericViewSet):
             # Get and delete the cart item
             try:
                 cart_item = CartItem.objects.get(id=item_id, cart=cart)
-                cart_item.delete()
+                with transaction.atomic():
+                    hold_line(cart, cart_item.product, cart_item.variant, 0)
+                    cart_item.delete()
+                cart.bump_version()
                 logger.info(f"Removed cart item: {item_id}")
             except CartItem.DoesNotExist:
                 return Response({"error": f"Cart item with ID {item_id} does not exist"}, status=status.HTTP_404_NOT_FOUND)
             
             # Return updated cart
-            cart.refresh_from_db()  # Refresh to ensure we get the latest data
-            serializer = self.get_serializer(cart)
-            return Response(serializer.data)
+            cart = self.get_cart()  # Reload with the latest items and version
+            return self.cart_response(cart)
             
         except Exception as e:
             logger.error(f"Error removing cart item: {str(e)}")
@@ -334,13 +351,15 @@ class CartViewSet(viewsets.GenericViewSet):
         """Clear all items from the cart"""
         try:
             cart = get_object_or_404(Cart, customer=request.user)
-            cart.items.all().delete()
+            with transaction.atomic():
+                release_cart(cart)
+                cart.items.all().delete()
+            cart.bump_version()
             logger.info(f"Cleared cart for user: {request.user.id}")
             
             # Return empty cart
-            cart.refresh_from_db()  # Refresh to ensure we get the latest data
-            serializer = self.get_serializer(cart)
-            return Response(serializer.data)
+            cart = self.get_cart()  # Reload with the latest items and version
+            return self.cart_response(cart)
             
         except Exception as e:
             logger.error(f"Error clearing cart: {str(e)}")
@@ -0,0 +1,40 @@
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """
+    Build a strong ETag from the given parts, e.g. make_etag('cart', 4, 17) -> "cart-4-17"
+    """
+    return quote_etag('-'.join(str(part) for part in parts))
+
+
+def etag_matches(request, etag):
+    """
+    Check the request's If-None-Match header against ``etag``.
+
+    Uses the weak comparison RFC 9110 prescribes for If-None-Match, so a
+    W/ prefix added by an intermediary still matches.
+    """
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    return any(candidate.removeprefix('W/') == etag for candidate in etags)
+
+
+def with_etag(response, etag, public=False):
+    """
+    Attach ``etag`` to the response and ask clients to revalidate before reuse.
+    Only ``public`` responses, the same for every user, may be stored by shared caches.
+    """
+    response['ETag'] = etag
+    response['Cache-Control'] = f"{'public' if public else 'private'}, no-cache"
+    return response
+
+
+def not_modified(etag, public=False):
+    return with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag, public=public)
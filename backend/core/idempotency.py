@@ -0,0 +1,170 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+DEFAULT_OPTIONS = {
+    'TTL': 24 * 60 * 60,
+    'WAIT_TIMEOUT': 10,
+    'POLL_INTERVAL': 0.1,
+    'LOCK_TIMEOUT': 60,
+}
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def get_options():
+    return {**DEFAULT_OPTIONS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def request_fingerprint(request):
+    """
+    Hash of the method, path and parsed body, so a key reused for a
+    different request can be told apart from a retry
+    """
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = sorted(data.lists())
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def claim(user, endpoint, key, fingerprint, options):
+    """
+    Insert an in-progress record for the key; returns (record, created).
+    The record is None if a conflicting one disappeared in the meantime.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user, endpoint=endpoint, key=key, fingerprint=fingerprint,
+                locked_at=now, expires_at=now + timedelta(seconds=options['TTL'])
+            )
+        return record, True
+    except IntegrityError:
+        return IdempotencyKey.objects.filter(user=user, endpoint=endpoint, key=key).first(), False
+
+
+def take_over(record, options):
+    """
+    Claim an in-progress record whose request has held it longer than
+    LOCK_TIMEOUT, presumably because its worker died; returns whether it did
+    """
+    now = timezone.now()
+    return IdempotencyKey.objects.filter(
+        pk=record.pk, status='in_progress', locked_at=record.locked_at,
+        locked_at__lte=now - timedelta(seconds=options['LOCK_TIMEOUT'])
+    ).update(locked_at=now, expires_at=now + timedelta(seconds=options['TTL'])) == 1
+
+
+def replay(record):
+    response = HttpResponse(
+        record.response_body, status=record.response_status, content_type=record.response_content_type
+    )
+    if record.response_location:
+        response['Location'] = record.response_location
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(method):
+    """
+    Decorate a viewset method so requests sent with an Idempotency-Key
+    header run at most once per user, endpoint and key.
+
+    The first request claims the key by inserting an in-progress record,
+    then runs the view and stores its rendered response in the same
+    transaction as the view's own writes. A retry with the same key gets
+    the stored response back, marked with an Idempotent-Replayed header,
+    without running the view again; a retry that arrives while the first
+    request is still running waits for its response instead of running in
+    parallel. Reusing a key for a different request is rejected with 422.
+    Server errors and raised exceptions release the key, so the request
+    can be retried. Requests without the header are not affected.
+    """
+    @functools.wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        options = get_options()
+        endpoint = f"{view.__class__.__name__}.{method.__name__}"
+        fingerprint = request_fingerprint(request)
+        deadline = time.monotonic() + options['WAIT_TIMEOUT']
+        record, created = claim(request.user, endpoint, key, fingerprint, options)
+        while not created:
+            if record is None or record.expires_at <= timezone.now():
+                # A released or expired key counts as unused
+                if record is not None:
+                    IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+                record, created = claim(request.user, endpoint, key, fingerprint, options)
+                continue
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {'error': f'This {HEADER} was already used for a different request'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.status == 'completed':
+                return replay(record)
+            if take_over(record, options):
+                break
+            if time.monotonic() >= deadline:
+                return Response(
+                    {'error': f'A request with this {HEADER} is still being processed, please retry later'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            # Wait for the request holding the key to finish
+            time.sleep(options['POLL_INTERVAL'])
+            record = IdempotencyKey.objects.filter(pk=record.pk).first()
+
+        try:
+            with transaction.atomic():
+                response = method(view, request, *args, **kwargs)
+                if response.status_code >= 500 or not hasattr(response, 'data'):
+                    IdempotencyKey.objects.filter(pk=record.pk).delete()
+                    return response
+                content = request.accepted_renderer.render(
+                    response.data,
+                    request.accepted_media_type,
+                    {'request': request, 'response': response, 'view': view}
+                )
+                IdempotencyKey.objects.filter(pk=record.pk).update(
+                    status='completed',
+                    response_status=response.status_code,
+                    response_body=content.decode('utf-8'),
+                    response_content_type=request.accepted_renderer.media_type,
+                    response_location=response.get('Location', ''),
+                )
+                return response
+        except Exception:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+            raise
+
+    return wrapper
+
+
+def purge_expired(now=None):
+    """
+    Delete expired keys; returns how many
+    """
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
@@ -0,0 +1,220 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a compound, unique ordering.
+
+    Instead of OFFSET scans, each page is fetched with a WHERE clause that
+    seeks past the last row of the previous page, so deep pages cost the
+    same as the first one. The cursor is an opaque base64 token holding the
+    ordering values of the boundary row and the paging direction.
+
+    The ordering is taken from ``view.get_keyset_ordering()`` or
+    ``view.keyset_ordering`` when set, otherwise
+    from the model's ``Meta.ordering`` (falling back to ``-created_at``) with
+    ``id`` appended as a tie-breaker. Ordering fields must be non-null
+    local model fields or annotations on the queryset, and part of the
+    rows when paginating a ``values()`` queryset. Cursor values are stored
+    as strings, so an annotation must be of a type that round-trips exactly
+    (e.g. a DecimalField rather than a float).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'PAGE_SIZE', 20)
+        self.max_page_size = getattr(settings, 'MAX_PAGE_SIZE', 100)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.limit = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+
+        cursor = self.decode_cursor(request, queryset)
+        self.reverse = cursor['reverse'] if cursor else False
+        self.has_cursor = cursor is not None
+
+        queryset = queryset.order_by(*self.get_order_by(reverse=self.reverse))
+        if cursor:
+            queryset = queryset.filter(self.seek_filter(cursor['position'], reverse=self.reverse))
+
+        # Fetch one extra row to find out whether another page follows
+        rows = list(queryset[:self.limit + 1])
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+
+        if self.reverse:
+            rows.reverse()
+            self.has_previous = has_more
+            self.has_next = self.has_cursor
+        else:
+            self.has_next = has_more
+            self.has_previous = self.has_cursor
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset, view):
+        """
+        Return the ordering as a tuple of (field_name, descending) pairs,
+        always ending on the primary key so the sort is unique.
+        """
+        if hasattr(view, 'get_keyset_ordering'):
+            ordering = view.get_keyset_ordering()
+        else:
+            ordering = getattr(view, 'keyset_ordering', None)
+        if not ordering:
+            ordering = list(queryset.model._meta.ordering) or ['-created_at']
+            try:
+                queryset.model._meta.get_field(ordering[0].lstrip('-'))
+            except FieldDoesNotExist:
+                ordering = []
+
+        pairs = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        if not any(name in ('id', 'pk') for name, _ in pairs):
+            pairs.append(('id', False))
+        return tuple(pairs)
+
+    def get_order_by(self, reverse=False):
+        return [
+            f"{'-' if descending != reverse else ''}{name}"
+            for name, descending in self.ordering
+        ]
+
+    def seek_filter(self, position, reverse=False):
+        """
+        Build the row-comparison predicate that selects rows strictly after
+        ``position`` in the (possibly reversed) ordering.
+        """
+        condition = Q()
+        for index, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending != reverse else 'gt'
+            clause = Q(**{f'{name}__{lookup}': position[index]})
+            for prior_index, (prior_name, _) in enumerate(self.ordering[:index]):
+                clause &= Q(**{prior_name: position[prior_index]})
+            condition |= clause
+        return condition
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            values = payload['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                self.to_python(queryset, name, value)
+                for (name, _), value in zip(self.ordering, values)
+            ]
+            return {'position': position, 'reverse': bool(payload.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def to_python(queryset, name, value):
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # An annotation such as a search rank, converted by its output field
+            annotation = queryset.query.annotations.get(name)
+            if annotation is None:
+                return value
+            field = annotation.output_field
+        return field.to_python(value)
+
+    def encode_cursor(self, row, reverse):
+        values = []
+        for name, _ in self.ordering:
+            # Rows are model instances, or dicts for values() querysets
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        payload = {'p': values}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Seeking backwards past an empty page; restart from the top
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                    'example': 'http://api.example.org/accounts/?{cursor}=cD00ODY%3D'.format(
+                        cursor=self.cursor_query_param)
+                },
+                'previous': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                    'example': 'http://api.example.org/accounts/?{cursor}=cj0xJnA9NDg3'.format(
+                        cursor=self.cursor_query_param)
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Number of results to return per page (max {self.max_page_size}).',
+                'schema': {'type': 'integer'},
+            },
+        ]
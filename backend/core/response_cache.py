@@ -0,0 +1,190 @@
+import functools
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+DEFAULT_OPTIONS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCK_TIMEOUT': 10,
+    'LOCK_POLL_INTERVAL': 0.05,
+    'ENABLED': True,
+}
+
+
+class ResponseCache:
+    """
+    Cache of rendered JSON responses for anonymous GET requests.
+
+    Entries are keyed on the view, its URL kwargs, the normalized query
+    string and the current generation of every scope the response depends
+    on. Invalidating a scope bumps its generation, so all entries built
+    from it stop being addressable at once and simply age out; nothing has
+    to be enumerated or deleted. Only operations available on every Django
+    cache backend (get/set/add/incr/get_many/delete) are used, so the
+    local-memory default and Redis behave the same.
+
+    A miss takes a short-lived lock with ``cache.add`` before recomputing,
+    and concurrent requests for the same key wait for the winner's result
+    instead of all hitting the database (single-flight).
+    """
+
+    def __init__(self, prefix, settings_name):
+        self.prefix = prefix
+        self.settings_name = settings_name
+
+    @property
+    def options(self):
+        return {**DEFAULT_OPTIONS, **getattr(settings, self.settings_name, {})}
+
+    @property
+    def cache(self):
+        return caches[self.options['ALIAS']]
+
+    def generation_key(self, scope):
+        return f"{self.prefix}:gen:{scope}"
+
+    def get_generations(self, scopes):
+        keys = [self.generation_key(scope) for scope in scopes]
+        generations = self.cache.get_many(keys)
+        for key in keys:
+            if key not in generations:
+                # Seed from the clock so an evicted counter never repeats an old value
+                self.cache.add(key, time.time_ns(), None)
+                generations[key] = self.cache.get(key)
+        return [generations[key] for key in keys]
+
+    def invalidate(self, *scopes):
+        """
+        Bump the generation of each scope once the current transaction commits
+        """
+        def bump():
+            for scope in scopes:
+                key = self.generation_key(scope)
+                try:
+                    self.cache.incr(key)
+                except ValueError:
+                    self.cache.set(key, time.time_ns(), None)
+
+        transaction.on_commit(bump)
+
+    def make_key(self, name, request, kwargs, scopes):
+        query = sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+            if value != ''
+        )
+        parts = [
+            name,
+            urlencode(sorted((key, str(value)) for key, value in kwargs.items())),
+            urlencode(query),
+            ':'.join(str(generation) for generation in self.get_generations(scopes)),
+        ]
+        digest = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+        return f"{self.prefix}:resp:{digest}"
+
+    def count(self, outcome):
+        key = f"{self.prefix}:stats:{outcome}"
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            if not self.cache.add(key, 1, None):
+                self.cache.incr(key)
+
+    def stats(self):
+        counters = self.cache.get_many([f"{self.prefix}:stats:hit", f"{self.prefix}:stats:miss"])
+        hits = counters.get(f"{self.prefix}:stats:hit", 0)
+        misses = counters.get(f"{self.prefix}:stats:miss", 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+
+    def is_cacheable(self, request):
+        renderer = getattr(request, 'accepted_renderer', None)
+        return (
+            self.options['ENABLED']
+            and request.method == 'GET'
+            and not request.user.is_authenticated
+            and renderer is not None
+            and renderer.format == 'json'
+        )
+
+    def cached(self, scopes, on_hit=None):
+        """
+        Decorate a viewset method so anonymous JSON responses are cached.
+
+        ``scopes`` is a callable ``(view, request, kwargs) -> list`` naming
+        the invalidation scopes the response depends on. ``on_hit`` is
+        called with the same arguments when a response is served from the
+        cache, for side effects the view must still perform.
+        """
+        def decorator(method):
+            @functools.wraps(method)
+            def wrapper(view, request, *args, **kwargs):
+                if not self.is_cacheable(request):
+                    return method(view, request, *args, **kwargs)
+
+                name = f"{view.__class__.__name__}.{method.__name__}"
+                key = self.make_key(name, request, kwargs, scopes(view, request, kwargs))
+                media_type = request.accepted_renderer.media_type
+
+                lock_key = f"{key}:lock"
+                locked = False
+                content = self.cache.get(key)
+                if content is None:
+                    # Become the one request that recomputes, or wait for the one that is
+                    locked = self.cache.add(lock_key, 1, self.options['LOCK_TIMEOUT'])
+                    if not locked:
+                        content = self.wait_for_leader(key)
+                if content is not None:
+                    self.count('hit')
+                    if on_hit is not None:
+                        on_hit(view, request, kwargs)
+                    return self.build_response(content, media_type, 'HIT')
+
+                self.count('miss')
+                try:
+                    response = method(view, request, *args, **kwargs)
+                    if response.status_code != 200 or not hasattr(response, 'data'):
+                        return response
+                    content = request.accepted_renderer.render(
+                        response.data,
+                        request.accepted_media_type,
+                        {'request': request, 'response': response, 'view': view}
+                    )
+                    self.cache.set(key, content, self.options['TIMEOUT'])
+                    return self.build_response(content, media_type, 'MISS')
+                finally:
+                    if locked:
+                        self.cache.delete(lock_key)
+
+            return wrapper
+        return decorator
+
+    def wait_for_leader(self, key):
+        """
+        If another request is already computing ``key``, wait for its result
+        """
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + self.options['LOCK_TIMEOUT']
+        while self.cache.get(lock_key) is not None and time.monotonic() < deadline:
+            time.sleep(self.options['LOCK_POLL_INTERVAL'])
+            content = self.cache.get(key)
+            if content is not None:
+                return content
+        # The leader finished (or gave up); use its result if it left one
+        return self.cache.get(key)
+
+    @staticmethod
+    def build_response(content, media_type, outcome):
+        response = HttpResponse(content, content_type=media_type)
+        response['X-Cache'] = outcome
+        return response
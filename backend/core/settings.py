@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 from datetime import timedelta
 import environ
+from corsheaders.defaults import default_headers
 
 env = environ.Env()
 environ.Env.read_env()
@@ -95,6 +96,7 @@ USE_I18N = True
 USE_TZ = True
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
@@ -122,6 +124,73 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Default and upper bound for the ?page_size= query parameter on the list
+# endpoints that paginate (see core/pagination.py)
+PAGE_SIZE = env.int('PAGE_SIZE', default=20)
+MAX_PAGE_SIZE = env.int('MAX_PAGE_SIZE', default=100)
+
+# Batched product view tracking (see products/view_buffer.py and core/write_buffer.py)
+PRODUCT_VIEW_BUFFER = {
+    'BATCH_SIZE': env.int('PRODUCT_VIEW_BATCH_SIZE', default=500),
+    'FLUSH_INTERVAL': env.float('PRODUCT_VIEW_FLUSH_INTERVAL', default=5.0),
+    'MAX_PENDING': env.int('PRODUCT_VIEW_MAX_PENDING', default=10000),
+    'BACKGROUND': env.bool('PRODUCT_VIEW_BUFFER_BACKGROUND', default=True),
+}
+
+# Batched user activity tracking, e.g. search events (see analytics/activity_buffer.py)
+USER_ACTIVITY_BUFFER = {
+    'BATCH_SIZE': env.int('USER_ACTIVITY_BATCH_SIZE', default=500),
+    'FLUSH_INTERVAL': env.float('USER_ACTIVITY_FLUSH_INTERVAL', default=5.0),
+    'MAX_PENDING': env.int('USER_ACTIVITY_MAX_PENDING', default=10000),
+    'BACKGROUND': env.bool('USER_ACTIVITY_BUFFER_BACKGROUND', default=True),
+}
+
+# Bulk product imports (see products/importer.py)
+PRODUCT_IMPORT = {
+    'CHUNK_SIZE': env.int('PRODUCT_IMPORT_CHUNK_SIZE', default=1000),
+    'BACKGROUND': env.bool('PRODUCT_IMPORT_BACKGROUND', default=True),
+    'MAX_REPORTED_ERRORS': env.int('PRODUCT_IMPORT_MAX_REPORTED_ERRORS', default=1000),
+}
+
+# Cart stock holds (see carts/reservations.py); run the reap_stock_reservations
+# command as a worker to give expired holds back to stock
+STOCK_RESERVATIONS = {
+    'TTL': env.int('STOCK_RESERVATION_TTL', default=15 * 60),
+    'REAP_BATCH_SIZE': env.int('STOCK_RESERVATION_REAP_BATCH_SIZE', default=1000),
+}
+
+# Idempotency-Key handling for order and payment creation (see core/idempotency.py)
+IDEMPOTENCY = {
+    'TTL': env.int('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60),
+    'WAIT_TIMEOUT': env.float('IDEMPOTENCY_WAIT_TIMEOUT', default=10),
+    'POLL_INTERVAL': env.float('IDEMPOTENCY_POLL_INTERVAL', default=0.1),
+    'LOCK_TIMEOUT': env.int('IDEMPOTENCY_LOCK_TIMEOUT', default=60),
+}
+
+# Local memory by default; set CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# and CACHE_LOCATION=redis://host:6379/0 to share the cache between workers
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', default='fyp-default'),
+    }
+}
+
+# Anonymous catalog response cache (see core/response_cache.py and products/cache.py)
+CATALOG_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': env.int('CATALOG_CACHE_TIMEOUT', default=300),
+    'LOCK_TIMEOUT': env.int('CATALOG_CACHE_LOCK_TIMEOUT', default=10),
+    'ENABLED': env.bool('CATALOG_CACHE_ENABLED', default=True),
+}
+
+# Cached order analytics reports (see orders/analytics.py)
+ORDER_ANALYTICS_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': env.int('ORDER_ANALYTICS_CACHE_TIMEOUT', default=300),
+    'ENABLED': env.bool('ORDER_ANALYTICS_CACHE_ENABLED', default=True),
+}
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -0,0 +1,193 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBuffer:
+    """
+    In-process buffer that takes append-only inserts off the request path.
+
+    Unsaved ``model`` instances are queued in memory and written with
+    bulk_create by a background thread once ``batch_size`` rows are pending
+    or ``flush_interval`` seconds have passed. At most ``max_pending`` rows
+    are held; rows added beyond that are dropped and counted instead of
+    blocking the request. A batch that fails to write because the database
+    is unavailable is queued again for the next flush within the same
+    bound; rows the database rejects (e.g. an IntegrityError) are split out
+    of the batch and dropped. Pending rows are flushed when the worker
+    process exits.
+
+    The worker of a process is started by the first row it buffers, so
+    processes that never record anything (management commands, tests that
+    patch the recorder) run no thread and flush nothing at exit.
+
+    Subclasses set ``model`` and ``settings_name``, the name of a settings
+    dict with BATCH_SIZE, FLUSH_INTERVAL, MAX_PENDING and BACKGROUND keys.
+    """
+    model = None
+    settings_name = None
+
+    def __init__(self, batch_size=500, flush_interval=5.0, max_pending=10000, background=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.background = background
+
+        self.pending = []
+        self.dropped = 0
+        self.written = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.worker = None
+        self.hooks_registered = False
+
+    @classmethod
+    def from_settings(cls):
+        options = getattr(settings, cls.settings_name, {}) if cls.settings_name else {}
+        return cls(
+            batch_size=options.get('BATCH_SIZE', 500),
+            flush_interval=options.get('FLUSH_INTERVAL', 5.0),
+            max_pending=options.get('MAX_PENDING', 10000),
+            background=options.get('BACKGROUND', True),
+        )
+
+    def add(self, instance):
+        """
+        Queue an unsaved instance; returns False if it was dropped because the buffer is full
+        """
+        with self.lock:
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.pending.append(instance)
+            batch_ready = len(self.pending) >= self.batch_size
+
+        if self.background and self.worker is None:
+            self.start()
+        if batch_ready:
+            self.wakeup.set()
+        return True
+
+    def flush(self):
+        """
+        Write all pending rows; returns the number of rows written
+        """
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return 0
+
+            written, rejected, unwritten = self.write(batch)
+            if rejected:
+                logger.warning(f"Dropped {rejected} {self.model._meta.verbose_name_plural} the database rejected")
+            with self.lock:
+                self.written += written
+                self.dropped += rejected
+                if unwritten:
+                    # Put the rest back ahead of the rows added since, dropping
+                    # the oldest rows if that overfills the buffer
+                    self.pending = unwritten + self.pending
+                    overflow = len(self.pending) - self.max_pending
+                    if overflow > 0:
+                        del self.pending[:overflow]
+                        self.dropped += overflow
+            return written
+
+    def write(self, batch):
+        """
+        Insert a batch, bisecting it to isolate the rows the database rejects.
+
+        Returns (written, rejected, unwritten): the number of rows inserted,
+        the number rejected, and the rows left unwritten because the database
+        could not be reached, to be retried.
+        """
+        written = rejected = 0
+        chunks = [batch]
+        while chunks:
+            rows = chunks.pop()
+            try:
+                # A savepoint keeps a rejected chunk from breaking an outer transaction
+                with transaction.atomic():
+                    self.model.objects.bulk_create(rows, batch_size=self.batch_size)
+            except (OperationalError, InterfaceError):
+                unwritten = rows + [row for chunk in reversed(chunks) for row in chunk]
+                logger.exception(f"Failed to write {len(unwritten)} {self.model._meta.verbose_name_plural}, retrying")
+                return written, rejected, unwritten
+            except DatabaseError:
+                if len(rows) == 1:
+                    rejected += 1
+                else:
+                    middle = len(rows) // 2
+                    chunks += [rows[middle:], rows[:middle]]
+            else:
+                written += len(rows)
+        return written, rejected, []
+
+    def start(self):
+        """
+        Start the background worker of this process, unless the buffer is
+        flushed by hand (``background`` off) or the worker already runs
+        """
+        if not self.background:
+            return
+        with self.lock:
+            if self.worker is not None and self.worker.is_alive():
+                return
+            self.stopping.clear()
+            self.worker = threading.Thread(
+                target=self.run, name=f'{self.model._meta.model_name}-buffer', daemon=True
+            )
+            self.worker.start()
+            if not self.hooks_registered:
+                atexit.register(self.stop)
+                os.register_at_fork(after_in_child=self.after_fork)
+                self.hooks_registered = True
+
+    def after_fork(self):
+        # Threads do not survive a fork, so a forked worker process starts its
+        # own worker with its first row; the rows it inherited are still the
+        # parent's to write
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.pending = []
+        self.worker = None
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # The worker thread owns its own database connection
+                close_old_connections()
+
+    def stop(self, timeout=10):
+        """
+        Stop the background worker and flush whatever is still pending
+        """
+        self.stopping.set()
+        self.wakeup.set()
+        if self.worker is not None and self.worker is not threading.current_thread():
+            self.worker.join(timeout)
+        self.worker = None
+        self.flush()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'pending': len(self.pending),
+                'written': self.written,
+                'dropped': self.dropped,
+            }
@@ -1,11 +1,16 @@
 from django.contrib import admin
-from .models import Order, OrderItem, OrderStatusHistory
+from .models import Order, OrderItem, OrderSeller, OrderStatusHistory
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
     readonly_fields = ['product', 'variant', 'quantity', 'price']
 
+class OrderSellerInline(admin.TabularInline):
+    model = OrderSeller
+    extra = 0
+    readonly_fields = ['seller', 'subtotal', 'item_count', 'created_at']
+
 class OrderStatusHistoryInline(admin.TabularInline):
     model = OrderStatusHistory
     extra = 0
@@ -17,7 +22,7 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ['status', 'payment_status', 'cancelled_by_role']
     search_fields = ['id', 'user__username', 'tracking_number']
     readonly_fields = ['cancelled_at', 'cancelled_by', 'cancelled_by_role']
-    inlines = [OrderItemInline, OrderStatusHistoryInline]
+    inlines = [OrderItemInline, OrderSellerInline, OrderStatusHistoryInline]
     fieldsets = (
         ('Order Information', {
             'fields': ('user', 'status', 'total_price', 'created_at', 'updated_at')
@@ -0,0 +1,125 @@
+import hashlib
+from decimal import Decimal
+
+from django.db.models import Case, CharField, Count, DateField, Q, Sum, When
+from django.db.models.functions import Trunc
+
+from core.response_cache import ResponseCache
+
+order_analytics_cache = ResponseCache('order-analytics', 'ORDER_ANALYTICS_CACHE')
+
+# Statuses whose order totals count as revenue
+REVENUE_STATUSES = ('processing', 'shipped', 'delivered')
+
+# Values of the ``interval`` query parameter, as Trunc kinds
+INTERVALS = ('day', 'week', 'month')
+
+
+def _add(counts, key, count):
+    counts[key] = counts.get(key, 0) + count
+
+
+def build_report(orders, interval=None):
+    """
+    Compute the order analytics report for a queryset in one grouped query.
+
+    Orders are grouped by status, payment status, who cancelled them and
+    why (for cancelled orders only), plus the ``interval`` period they
+    were placed in when a time series is requested. Each group carries
+    its order count and a revenue sum filtered to REVENUE_STATUSES; the
+    breakdowns are all folded together from those few rows.
+    """
+    dimensions = {
+        'reason': Case(
+            When(status='cancelled', then='cancellation_reason'),
+            output_field=CharField()
+        ),
+    }
+    if interval:
+        dimensions['period'] = Trunc('created_at', interval, output_field=DateField())
+    rows = orders.annotate(**dimensions).values(
+        'status', 'payment_status', 'cancelled_by_role', *dimensions
+    ).annotate(
+        count=Count('id'),
+        revenue=Sum('total_price', filter=Q(status__in=REVENUE_STATUSES)),
+    ).order_by()
+
+    report = {
+        'total_orders': 0,
+        'total_revenue': Decimal('0'),
+        'status_breakdown': {},
+        'payment_status_breakdown': {},
+        'cancellation': {
+            'total_cancelled': 0,
+            'by_role': {},
+            'reasons': {},
+        },
+    }
+    series = {}
+    cancellation = report['cancellation']
+    for row in rows:
+        count, revenue = row['count'], row['revenue'] or Decimal('0')
+        report['total_orders'] += count
+        report['total_revenue'] += revenue
+        _add(report['status_breakdown'], row['status'], count)
+        _add(report['payment_status_breakdown'], row['payment_status'], count)
+        if row['status'] == 'cancelled':
+            cancellation['total_cancelled'] += count
+            _add(cancellation['by_role'], row['cancelled_by_role'] or 'unknown', count)
+            if row['reason']:
+                _add(cancellation['reasons'], row['reason'], count)
+        if interval:
+            bucket = series.setdefault(row['period'], {'orders': 0, 'revenue': Decimal('0'), 'cancelled': 0})
+            bucket['orders'] += count
+            bucket['revenue'] += revenue
+            if row['status'] == 'cancelled':
+                bucket['cancelled'] += count
+
+    if interval:
+        report['interval'] = interval
+        report['series'] = [
+            {'period': period.isoformat(), **bucket} for period, bucket in sorted(series.items())
+        ]
+    return report
+
+
+def analytics_scopes(user):
+    """
+    Invalidation scopes of a user's report: all orders for admins, the
+    orders with their items for a seller
+    """
+    if user.is_staff or user.role == 'admin':
+        return ['orders']
+    return [f"seller:{user.id}"]
+
+
+def get_report(user, orders, start_date=None, end_date=None, interval=None):
+    """
+    Get a user's report for a date range from the cache, building it with
+    build_report on a miss.
+
+    Entries are keyed by the user, the range and the generations of the
+    user's scopes, which order changes bump (see invalidate_order_analytics).
+    """
+    if not order_analytics_cache.options['ENABLED']:
+        return build_report(orders, interval)
+
+    generations = order_analytics_cache.get_generations(analytics_scopes(user))
+    parts = '|'.join(str(part or '') for part in (start_date, end_date, interval))
+    key = (
+        f"order-analytics:report:{':'.join(str(generation) for generation in generations)}:{user.id}:"
+        f"{hashlib.sha1(parts.encode('utf-8')).hexdigest()}"
+    )
+    report = order_analytics_cache.cache.get(key)
+    if report is None:
+        report = build_report(orders, interval)
+        order_analytics_cache.cache.set(key, report, order_analytics_cache.options['TIMEOUT'])
+    return report
+
+
+def invalidate_order_analytics(*seller_ids):
+    """
+    Drop cached reports covering an order: the admins' and those of the
+    sellers with items in it
+    """
+    order_analytics_cache.invalidate('orders', *(f"seller:{seller_id}" for seller_id in seller_ids))
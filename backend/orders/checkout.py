@@ -0,0 +1,164 @@
+from collections import Counter
+
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from rest_framework import serializers
+
+from carts.models import CartItem, StockReservation
+from carts.reservations import lock_cart_holds, release_stock
+from products.cache import invalidate_products
+from products.inventory import take_from_shards
+from products.models import Product, ProductVariant
+from .models import OrderItem
+from .sellers import record_order_sellers
+from .signals import order_placed
+
+
+def lock_rows(model, ids):
+    """
+    Lock the given rows with SELECT ... FOR UPDATE and return them by id.
+
+    Rows are always locked in id order so concurrent checkouts over
+    overlapping carts acquire their locks in the same order and cannot
+    deadlock each other.
+    """
+    if not ids:
+        return {}
+    rows = model.objects.select_for_update().filter(id__in=ids).order_by('id')
+    return {row.id: row for row in rows}
+
+
+def decrement_stock(model, quantities, held=None):
+    """
+    Subtract ``quantities`` ({id: n}) from ``stock`` in one conditional UPDATE,
+    converting the units the cart ``held`` ({id: n}) from ``reserved``.
+
+    Each row only matches while its stock, less what other carts have
+    reserved, still covers the requested quantity, so a short row leaves
+    the update count below the number of ids; the caller's transaction is
+    then rolled back by the raised error.
+    """
+    if not quantities:
+        return
+    held = held or {}
+    condition = Q()
+    for row_id, quantity in quantities.items():
+        condition |= Q(id=row_id, stock_shards=0, stock__gte=F('reserved') - held.get(row_id, 0) + quantity)
+
+    changes = {
+        'stock': F('stock') - Case(
+            *(When(id=row_id, then=Value(quantity)) for row_id, quantity in quantities.items()),
+            output_field=IntegerField()
+        )
+    }
+    held = {row_id: quantity for row_id, quantity in held.items() if row_id in quantities}
+    if held:
+        changes['reserved'] = F('reserved') - Case(
+            *(When(id=row_id, then=Value(quantity)) for row_id, quantity in held.items()),
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    updated = model.objects.filter(condition).update(**changes)
+    if updated != len(quantities):
+        raise serializers.ValidationError("Stock changed during checkout, please try again")
+
+
+def take_sharded(model, row_id, quantity, held, label):
+    """
+    Check out ``quantity`` units of a sharded row: the units the cart held
+    already left the shards, so only the rest is taken from them
+    """
+    if quantity > held and not take_from_shards(model, row_id, quantity - held):
+        raise serializers.ValidationError(f"Not enough stock for {label}")
+    if held > quantity:
+        release_stock(model, {row_id: held - quantity})
+
+
+def without(quantities, row_ids):
+    return {row_id: quantity for row_id, quantity in quantities.items() if row_id not in row_ids}
+
+
+def checkout_cart(order, cart):
+    """
+    Move the cart's items into ``order`` and take them out of stock,
+    converting the cart's stock reservations into the decrement.
+
+    Runs a fixed number of queries regardless of cart size: lock the cart's
+    holds, read the cart, lock products and variants, decrement each table
+    with one UPDATE, insert the order items and their seller rows, empty the cart, drop its holds
+    and bump its version. Sharded items add a few queries each to take
+    their units from the shards. Must be called inside a transaction.
+    """
+    # Holds are locked before stock rows, the same order as carts/reservations.py
+    held_products, held_variants = lock_cart_holds(cart)
+    cart_items = list(CartItem.objects.filter(cart=cart).select_related('product', 'variant').order_by('id'))
+
+    product_quantities = Counter()
+    variant_quantities = Counter()
+    for cart_item in cart_items:
+        product_quantities[cart_item.product_id] += cart_item.quantity
+        if cart_item.variant_id:
+            variant_quantities[cart_item.variant_id] += cart_item.quantity
+
+    # Sharded products and variants are never locked as a whole; their
+    # units are taken from the shards (see products/inventory.py)
+    products = {cart_item.product_id: cart_item.product for cart_item in cart_items}
+    variants = {cart_item.variant_id: cart_item.variant for cart_item in cart_items if cart_item.variant_id}
+    sharded_products = {row_id for row_id, product in products.items() if product.stock_shards}
+    sharded_variants = {row_id for row_id, variant in variants.items() if variant.stock_shards}
+
+    # Lock products before variants, each in id order
+    products.update(lock_rows(Product, sorted(set(product_quantities) - sharded_products)))
+    variants.update(lock_rows(ProductVariant, sorted(set(variant_quantities) - sharded_variants)))
+
+    # Validate against the locked rows; the cart's own holds count as available to it
+    for product_id, quantity in product_quantities.items():
+        product = products[product_id]
+        if product_id in sharded_products:
+            take_sharded(Product, product_id, quantity, held_products[product_id], product.name)
+        elif product.stock - product.reserved + held_products[product_id] < quantity:
+            raise serializers.ValidationError(f"Not enough stock for {product.name}")
+    for variant_id, quantity in variant_quantities.items():
+        variant = variants[variant_id]
+        if variant_id in sharded_variants:
+            take_sharded(ProductVariant, variant_id, quantity, held_variants[variant_id], f"variant {variant.sku}")
+        elif variant.stock - variant.reserved + held_variants[variant_id] < quantity:
+            raise serializers.ValidationError(f"Not enough stock for variant {variant.sku}")
+
+    order_items = []
+    for cart_item in cart_items:
+        product = products[cart_item.product_id]
+        variant = variants.get(cart_item.variant_id)
+
+        # Calculate the price
+        price = product.discount_price if product.discount_price else product.price
+        if variant:
+            # Apply variant price adjustment
+            price += variant.price_adjustment
+
+        order_items.append(OrderItem(
+            order=order,
+            product=product,
+            variant=variant,
+            quantity=cart_item.quantity,
+            price=price
+        ))
+
+    decrement_stock(Product, without(product_quantities, sharded_products), held_products)
+    decrement_stock(ProductVariant, without(variant_quantities, sharded_variants), held_variants)
+    # Holds left without a cart line are given back rather than converted
+    release_stock(Product, {row_id: n for row_id, n in held_products.items() if row_id not in product_quantities})
+    release_stock(ProductVariant, {row_id: n for row_id, n in held_variants.items() if row_id not in variant_quantities})
+    # Stock changed through UPDATE, which sends no model signals
+    invalidate_products(*product_quantities)
+    OrderItem.objects.bulk_create(order_items)
+    # bulk_create sends no signals, so the seller rows are recorded here
+    record_order_sellers(order, order_items)
+    order_placed.send(sender=order.__class__, order=order, items=order_items)
+
+    # Clear the cart
+    CartItem.objects.filter(id__in=[cart_item.id for cart_item in cart_items]).delete()
+    if held_products:
+        StockReservation.objects.filter(cart=cart).delete()
+    cart.bump_version()
+
+    return order_items
@@ -0,0 +1,67 @@
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders.export import stream_orders
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Export synthetic orders through the streaming exporter and report time and peak memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000000, help='Number of synthetic orders')
+        parser.add_argument('--format', default='csv', choices=['csv', 'tsv', 'ndjson'])
+        parser.add_argument('--gzip', action='store_true', help='Compress the export')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per bulk insert')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the synthetic orders instead of rolling them back'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+
+        with transaction.atomic():
+            customer, _ = User.objects.get_or_create(
+                username='export-benchmark',
+                defaults={'email': 'export-benchmark@example.com'}
+            )
+
+            # Insert the synthetic orders in batches
+            remaining = options['orders']
+            while remaining > 0:
+                batch = min(remaining, options['batch_size'])
+                Order.objects.bulk_create([
+                    Order(
+                        user=customer,
+                        shipping_address='1 Benchmark Road',
+                        billing_address='1 Benchmark Road',
+                        payment_method='card',
+                        total_price='19.99'
+                    )
+                    for _ in range(batch)
+                ])
+                remaining -= batch
+
+            orders = Order.objects.filter(user=customer)
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            size = 0
+            for chunk in stream_orders(orders, export_format=options['format'], gzip=options['gzip']):
+                size += len(chunk)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {options['orders']} orders ({size / 1024 / 1024:.1f} MiB) "
+            f"in {elapsed:.1f}s, peak traced memory {peak / 1024 / 1024:.1f} MiB"
+        ))
@@ -0,0 +1,85 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from orders.models import Order, OrderItem
+from products.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Compare response size and time of the detail, sparse and summary views of my_orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000, help='Number of synthetic orders')
+        parser.add_argument('--items', type=int, default=5, help='Line items per order')
+        parser.add_argument('--page-size', type=int, default=100, help='Orders per page')
+        parser.add_argument('--repeat', type=int, default=5, help='Times each page is fetched')
+        parser.add_argument(
+            '--fields', default='id,status,total_price,created_at,payment_status',
+            help='Fields requested in the sparse detail run'
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the synthetic orders instead of rolling them back'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+
+        with transaction.atomic():
+            seller, _ = User.objects.get_or_create(
+                username='order-list-benchmark-seller',
+                defaults={'email': 'order-list-benchmark-seller@example.com', 'role': 'seller'}
+            )
+            customer, _ = User.objects.get_or_create(
+                username='order-list-benchmark',
+                defaults={'email': 'order-list-benchmark@example.com'}
+            )
+            products = Product.objects.bulk_create([
+                Product(
+                    name=f'Order list benchmark {index}', description='Synthetic product ' * 20,
+                    price='9.99', stock=0, seller=seller
+                )
+                for index in range(options['items'])
+            ])
+            ProductImage.objects.bulk_create([
+                ProductImage(product=product, file=f'products/benchmark-{product.id}.jpg') for product in products
+            ])
+            orders = Order.objects.bulk_create([
+                Order(
+                    user=customer, shipping_address='1 Benchmark Road', billing_address='1 Benchmark Road',
+                    payment_method='card', total_price='49.95'
+                )
+                for _ in range(options['orders'])
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, price='9.99')
+                for order in orders
+                for product in products
+            ], batch_size=5000)
+
+            client = APIClient()
+            client.force_authenticate(user=customer)
+            runs = [
+                ('detail', {}),
+                ('sparse', {'fields': options['fields']}),
+                ('summary', {'view': 'summary'}),
+            ]
+            for label, params in runs:
+                params = {**params, 'page_size': options['page_size']}
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    response = client.get('/api/orders/my_orders/', params)
+                    timings.append(time.perf_counter() - started)
+                timings.sort()
+                self.stdout.write(
+                    f"{label}: {len(response.content) / 1024:.1f} KiB per page of {options['page_size']}, "
+                    f"median {timings[len(timings) // 2] * 1000:.1f}ms over {options['repeat']} requests"
+                )
+
+            if not options['keep']:
+                transaction.set_rollback(True)
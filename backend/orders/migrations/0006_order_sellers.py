@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def build_order_sellers(apps, schema_editor):
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    OrderSeller = apps.get_model('orders', 'OrderSeller')
+    rows = OrderItem.objects.values(
+        'order_id', 'order__created_at', seller_id=F('product__seller_id')
+    ).annotate(subtotal=Sum(F('price') * F('quantity')), item_count=Sum('quantity')).order_by()
+    OrderSeller.objects.bulk_create((
+        OrderSeller(order_id=row['order_id'], seller_id=row['seller_id'], subtotal=row['subtotal'],
+                    item_count=row['item_count'], created_at=row['order__created_at'])
+        for row in rows.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_order_created_id_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSeller',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sellers', to='orders.order')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seller_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', '-created_at', 'order'], name='order_seller_created_idx')],
+                'unique_together': {('order', 'seller')},
+            },
+        ),
+        migrations.RunPython(build_order_sellers, migrations.RunPython.noop),
+    ]
@@ -32,9 +32,24 @@ class Order(models.Model):
     cancelled_by_role = models.CharField(max_length=20, blank=True, null=True)  # Role of user who cancelled
     cancellation_reason = models.TextField(blank=True, null=True)  # Reason for cancellation
     
+    class Meta:
+        indexes = [
+            # Match the keyset pagination order (-created_at, id)
+            models.Index(fields=['-created_at', 'id'], name='order_created_id_idx'),
+            models.Index(fields=['user', '-created_at', 'id'], name='order_user_created_idx'),
+        ]
+    
     def __str__(self):
         return f"Order {self.id} - {self.user.username}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so a transition can be detected after save
+        if 'status' in instance.__dict__:
+            instance._loaded_status = instance.status
+        return instance
+    
     def save(self, *args, **kwargs):
         # If status is changed to cancelled and cancelled_at is not set, set it now
         if self.status == 'cancelled' and not self.cancelled_at:
@@ -69,4 +84,26 @@ class OrderItem(models.Model):
     
     def __str__(self):
         variant_info = f" - {self.variant.sku}" if self.variant else ""
-        return f"{self.product.name}{variant_info} x {self.quantity}"
\ No newline at end of file
+        return f"{self.product.name}{variant_info} x {self.quantity}"
+
+class OrderSeller(models.Model):
+    """
+    One row per seller with items in an order, kept in step with the
+    order's items (see orders/sellers.py), so seller-scoped order queries
+    and permission checks read one indexed table instead of joining
+    orders through their items to products
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='sellers')
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='seller_orders')
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # The seller's share of the order
+    item_count = models.PositiveIntegerField(default=0)  # Units of the seller's products in the order
+    created_at = models.DateTimeField()  # Copied from the order
+
+    class Meta:
+        unique_together = ('order', 'seller')
+        indexes = [
+            models.Index(fields=['seller', '-created_at', 'order'], name='order_seller_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id} - seller {self.seller_id}"
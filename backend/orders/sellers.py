@@ -0,0 +1,60 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import F, Sum
+
+from .analytics import invalidate_order_analytics
+from .models import Order, OrderItem, OrderSeller
+
+
+def record_order_sellers(order, order_items):
+    """
+    Insert the seller rows of a new order from its items, in one query.
+    The items' products must be loaded.
+    """
+    totals = defaultdict(lambda: [Decimal('0'), 0])
+    for order_item in order_items:
+        seller_totals = totals[order_item.product.seller_id]
+        seller_totals[0] += order_item.price * order_item.quantity
+        seller_totals[1] += order_item.quantity
+    OrderSeller.objects.bulk_create([
+        OrderSeller(order=order, seller_id=seller_id, subtotal=subtotal, item_count=item_count,
+                    created_at=order.created_at)
+        for seller_id, (subtotal, item_count) in totals.items()
+    ])
+    invalidate_order_analytics(*totals)
+
+
+def sync_order_sellers(*order_ids):
+    """
+    Rebuild the seller rows of the given orders from their items, e.g.
+    after items were added, changed or removed
+    """
+    order_ids = [order_id for order_id in order_ids if order_id]
+    if not order_ids:
+        return
+    rows = OrderItem.objects.filter(order_id__in=order_ids).values(
+        'order_id', 'order__created_at', seller_id=F('product__seller_id')
+    ).annotate(subtotal=Sum(F('price') * F('quantity')), item_count=Sum('quantity')).order_by()
+    sellers = OrderSeller.objects.filter(order_id__in=order_ids)
+    invalidate_order_analytics(*sellers.values_list('seller_id', flat=True), *(row['seller_id'] for row in rows))
+    sellers.delete()
+    OrderSeller.objects.bulk_create([
+        OrderSeller(order_id=row['order_id'], seller_id=row['seller_id'], subtotal=row['subtotal'],
+                    item_count=row['item_count'], created_at=row['order__created_at'])
+        for row in rows
+    ])
+
+
+def orders_for_seller(seller):
+    """
+    Orders with items from ``seller``; each order appears once, since a
+    seller has one row per order. Annotated with the seller row's copy of
+    the order time, ``seller_created_at``, which seller lists page on so
+    the (seller, -created_at, order) index serves them.
+    """
+    return Order.objects.filter(sellers__seller=seller).annotate(seller_created_at=F('sellers__created_at'))
+
+
+def is_order_seller(order, user):
+    return OrderSeller.objects.filter(order=order, seller=user).exists()
@@ -1,15 +1,20 @@
 from rest_framework import serializers
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from typing import Dict, Any, Optional, List, Union
 from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 from decimal import Decimal
 
+from .checkout import checkout_cart
 from .models import Order, OrderItem, OrderStatusHistory
-from products.models import Product, ProductVariant
+from products.models import Product, ProductVariant, ProductVariantOption
 from products.serializers import ProductSerializer, ProductVariantSerializer
-from carts.models import Cart, CartItem
+from carts.models import Cart
+from payments.serializers import PaymentSerializer
 
 
 class OrderStatusHistorySerializer(serializers.ModelSerializer):
@@ -55,27 +60,87 @@ class OrderSerializer(serializers.ModelSerializer):
             'cancelled_by', 'cancelled_by_role', 'status_history', 'payment_details'
         ]
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sparse fieldsets: drop every field not named in ?fields=
+        fields = self.requested_fields(self.context.get('request'))
+        if fields:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+    @staticmethod
+    def requested_fields(request):
+        """
+        The field names listed in the ``fields`` query parameter of a GET
+        request, e.g. ?fields=id,status,items, or None to render them all
+        """
+        if request is None or request.method != 'GET':
+            return None
+        fields = {name.strip() for name in request.query_params.get('fields', '').split(',') if name.strip()}
+        return fields or None
+
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None):
+        """
+        Load everything the serializer renders for a page of orders in a
+        fixed number of queries: the orders with their user and payment,
+        then one query each for the items with their products and
+        variants, the variants' options and the status history. Usernames
+        of who cancelled each order are loaded in one more query when
+        rendered, see get_cancelled_by_usernames.
+
+        With a set of ``fields`` (see requested_fields) only the relations
+        those fields render are loaded.
+        """
+        def wanted(name):
+            return fields is None or name in fields
+
+        related = [name for field, name in [('user_username', 'user'), ('payment_details', 'payment')] if wanted(field)]
+        if related:
+            queryset = queryset.select_related(*related)
+        if wanted('items'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'items',
+                queryset=OrderItem.objects.select_related('product', 'variant__product').defer(
+                    'product__search_vector', 'variant__product__search_vector'
+                ).prefetch_related(
+                    Prefetch('variant__options', queryset=ProductVariantOption.objects.select_related('variant_type'))
+                )
+            ))
+        if wanted('status_history'):
+            queryset = queryset.prefetch_related(
+                Prefetch('status_history', queryset=OrderStatusHistory.objects.select_related('updated_by'))
+            )
+        return queryset
+
+    def get_cancelled_by_usernames(self):
+        """
+        Map the ``cancelled_by`` ids of all orders in the list being
+        serialized to usernames, loaded once per list
+        """
+        if not hasattr(self, '_cancelled_by_usernames'):
+            user_ids = {order.cancelled_by for order in self.parent.instance if order.cancelled_by}
+            self._cancelled_by_usernames = dict(
+                get_user_model().objects.filter(id__in=user_ids).values_list('id', 'username')
+            ) if user_ids else {}
+        return self._cancelled_by_usernames
+
     @extend_schema_field(OpenApiTypes.STR)
     def get_cancelled_by_username(self, obj) -> Optional[str]:
-        if obj.cancelled_by:
-            # Try to get the username of the user who cancelled the order
-            User = self.context['request'].user.__class__
-            try:
-                user = User.objects.get(id=obj.cancelled_by)
-                return user.username
-            except User.DoesNotExist:
-                return None
-        return None
+        if not obj.cancelled_by:
+            return None
+        if isinstance(self.parent, serializers.ListSerializer):
+            return self.get_cancelled_by_usernames().get(obj.cancelled_by)
+        return get_user_model().objects.filter(id=obj.cancelled_by).values_list('username', flat=True).first()
     
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_payment_details(self, obj) -> Optional[Dict[str, Any]]:
         # Get payment details if available
         try:
             payment = obj.payment
-            from payments.serializers import PaymentSerializer
-            return PaymentSerializer(payment).data
-        except:
+        except ObjectDoesNotExist:
             return None
+        return PaymentSerializer(payment).data
 
 
 class OrderCreateSerializer(serializers.ModelSerializer):
@@ -112,46 +177,11 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             pass
         
         # Get the user's cart
-        cart = Cart.objects.filter(user=user).first()
+        cart = Cart.objects.filter(customer=user).first()
         if not cart:
             raise serializers.ValidationError("User has no cart")
         
-        # Create order items from cart items
-        for cart_item in cart.items.all():
-            # Check if the product is still available
-            product = cart_item.product
-            if product.stock < cart_item.quantity:
-                raise serializers.ValidationError(f"Not enough stock for {product.name}")
-            
-            # Check if variant is available if selected
-            variant = cart_item.variant
-            if variant and variant.stock < cart_item.quantity:
-                raise serializers.ValidationError(f"Not enough stock for variant {variant.sku}")
-            
-            # Calculate the price
-            price = product.discount_price if product.discount_price else product.price
-            if variant:
-                # Apply variant price adjustment
-                price += variant.price_adjustment
-            
-            # Create the order item
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                variant=variant,
-                quantity=cart_item.quantity,
-                price=price
-            )
-            
-            # Update stock
-            product.stock -= cart_item.quantity
-            product.save()
-            
-            if variant:
-                variant.stock -= cart_item.quantity
-                variant.save()
-        
-        # Clear the cart
-        cart.items.all().delete()
+        # Lock stock rows, create the order items and empty the cart
+        checkout_cart(order, cart)
         
         return order
\ No newline at end of file
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .analytics import invalidate_order_analytics
+from .models import Order, OrderItem
+from .sellers import sync_order_sellers
+
+# Sent by checkout with ``order`` and its ``items`` once they are inserted;
+# the items are bulk created, so they send no post_save signals of their own
+order_placed = Signal()
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def sync_item_sellers(sender, instance, **kwargs):
+    """
+    Keep the order's seller rows in step with items edited one at a time,
+    e.g. through the order items API or the admin. Checkout inserts items
+    in bulk and records its seller rows itself.
+    """
+    sync_order_sellers(instance.order_id)
+
+
+@receiver(post_save, sender=Order)
+def invalidate_analytics(sender, instance, created, **kwargs):
+    """
+    Status, payment and cancellation changes alter the analytics of the
+    order's sellers. A new order has no seller rows yet; recording them
+    invalidates its sellers' reports instead.
+    """
+    if created:
+        invalidate_order_analytics()
+    else:
+        invalidate_order_analytics(*instance.sellers.values_list('seller_id', flat=True))
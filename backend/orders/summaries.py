@@ -0,0 +1,65 @@
+from django.core.files.storage import default_storage
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from rest_framework import serializers
+
+from products.models import ProductImage
+from .models import OrderItem
+
+SUMMARY_FIELDS = (
+    'id', 'status', 'payment_status', 'created_at', 'total_price', 'tracking_number', 'cancelled_at'
+)
+
+# Values of the ``view`` query parameter accepted by the order list endpoints
+ORDER_VIEWS = ('detail', 'summary')
+
+_datetime_field = serializers.DateTimeField()
+_decimal_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+def summarize_orders(orders, seller=None):
+    """
+    Project an order queryset onto the compact summary shown in order
+    lists: the order header, its item count and the first image of its
+    first product. Returns a ``values()`` queryset, so no models are built.
+
+    For a ``seller`` the item count and a ``subtotal`` cover only their
+    items, read from the OrderSeller row the queryset (see
+    orders_for_seller) is already joined to.
+    """
+    first_product = OrderItem.objects.filter(order=OuterRef('pk')).order_by('id').values('product_id')[:1]
+    thumbnail = ProductImage.objects.filter(
+        product=OuterRef('first_product_id'), file_type='image'
+    ).order_by('created_at', 'id').values('file')[:1]
+
+    # Seller lists are paginated on seller_created_at, so their rows carry it
+    seek_fields = ['seller_created_at'] if seller is not None else []
+    if seller is not None:
+        counts = {'item_count': F('sellers__item_count'), 'subtotal': F('sellers__subtotal')}
+    else:
+        units = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+            units=Sum('quantity')
+        ).values('units')
+        counts = {'item_count': Coalesce(Subquery(units), 0)}
+
+    return orders.annotate(
+        first_product_id=Subquery(first_product), **counts
+    ).annotate(thumbnail=Subquery(thumbnail)).values(*SUMMARY_FIELDS, *counts, 'thumbnail', *seek_fields)
+
+
+def summary_data(rows):
+    """
+    Format summary rows the way OrderSerializer formats the same fields
+    """
+    data = []
+    for row in rows:
+        row = dict(row)
+        row.pop('seller_created_at', None)
+        row['created_at'] = _datetime_field.to_representation(row['created_at'])
+        row['cancelled_at'] = _datetime_field.to_representation(row['cancelled_at']) if row['cancelled_at'] else None
+        row['total_price'] = _decimal_field.to_representation(row['total_price'])
+        if 'subtotal' in row:
+            row['subtotal'] = _decimal_field.to_representation(row['subtotal'])
+        row['thumbnail'] = default_storage.url(row['thumbnail']) if row['thumbnail'] else None
+        data.append(row)
+    return data
@@ -1,3 +1,659 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import threading
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from carts.models import Cart, CartItem, StockReservation
+from core.idempotency import request_fingerprint
+from core.models import IdempotencyKey
+from payments.models import Payment
+from products.models import (
+    Category, Product, ProductImage, ProductVariant, ProductVariantOption, ProductVariantType
+)
+from .checkout import checkout_cart, lock_rows
+from .models import Order, OrderItem, OrderSeller, OrderStatusHistory
+
+User = get_user_model()
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        self.admin = User.objects.create_user('admin', 'admin@test.com', 'password123', role='admin', is_staff=True)
+        category = Category.objects.create(name='Export')
+        self.product = Product.objects.create(
+            name='Exported', description='d', price='5.00', stock=10, category=category, seller=self.seller
+        )
+        self.orders = []
+        for i in range(5):
+            order = Order.objects.create(
+                user=self.customer, shipping_address=f'{i} Export Street', billing_address='b',
+                payment_method='card', total_price='10.00'
+            )
+            OrderItem.objects.create(order=order, product=self.product, quantity=2, price='5.00')
+            self.orders.append(order)
+        # An order the seller has no items in
+        Order.objects.create(
+            user=self.customer, shipping_address='elsewhere', billing_address='b',
+            payment_method='card', total_price='1.00'
+        )
+        cancelled = self.orders[0]
+        cancelled.status = 'cancelled'
+        cancelled.cancelled_by = self.customer.id
+        cancelled.cancelled_by_role = 'customer'
+        cancelled.save()
+
+    def export(self, user, **params):
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/orders/export/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, b''.join(response.streaming_content)
+
+    def test_seller_csv_export_streams_own_orders(self):
+        response, content = self.export(self.seller)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8'))))
+        self.assertEqual(rows[0][:2], ['Order ID', 'Customer'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [order.id for order in self.orders])
+        self.assertEqual(rows[1][1], 'customer')
+        self.assertEqual(rows[1][7], 'customer')
+
+    def test_export_query_count_does_not_grow_with_orders(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/api/orders/export/')
+        with self.assertNumQueries(1):
+            b''.join(response.streaming_content)
+
+    def test_gzip_tsv_export(self):
+        response, content = self.export(self.admin, export_format='tsv', gzip='true')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('orders.tsv.gz', response['Content-Disposition'])
+        lines = gzip.decompress(content).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(lines[0].split('\t')[0], 'Order ID')
+
+    def test_ndjson_export(self):
+        _, content = self.export(self.admin, export_format='ndjson', status='cancelled')
+        records = [json.loads(line) for line in content.decode('utf-8').splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['id'], self.orders[0].id)
+        self.assertEqual(records[0]['cancelled_by_username'], 'customer')
+        self.assertEqual(records[0]['total_price'], '10.00')
+
+    def test_invalid_format_is_rejected(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/api/orders/export/', {'export_format': 'xlsx'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OrderListQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        staff = [
+            User.objects.create_user(f'staff{i}', f'staff{i}@test.com', 'password123', role='admin')
+            for i in range(3)
+        ]
+        product = Product.objects.create(name='Listed', description='d', price='10.00', stock=5, seller=seller)
+        size = ProductVariantType.objects.create(name='Size')
+        colour = ProductVariantType.objects.create(name='Colour')
+        variant = ProductVariant.objects.create(product=product, sku='LISTED-L-RED', price_adjustment='1.00', stock=5)
+        variant.options.set([
+            ProductVariantOption.objects.create(variant_type=size, value='L'),
+            ProductVariantOption.objects.create(variant_type=colour, value='Red'),
+        ])
+
+        # Bulk inserts keep 500 orders quick to set up
+        orders = Order.objects.bulk_create([
+            Order(
+                user=self.customer, shipping_address='a', billing_address='b', payment_method='card',
+                total_price='21.00', status='cancelled' if i % 5 == 0 else 'pending',
+                cancelled_by=staff[i % 3].id if i % 5 == 0 else None
+            )
+            for i in range(500)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, variant=item_variant, quantity=1, price=price)
+            for order in orders
+            for item_variant, price in [(None, '10.00'), (variant, '11.00')]
+        ])
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(order=order, status='pending', updated_by=staff[0]) for order in orders
+        ])
+        Payment.objects.bulk_create([
+            Payment(order=order, amount='21.00', transaction_id=f'txn-{order.id}') for order in orders[::2]
+        ])
+        self.client.force_authenticate(user=self.customer)
+
+    def test_my_orders_query_count_does_not_grow_with_page(self):
+        # Orders with users and payments, items with products and variants,
+        # variant options, status history, cancelled-by usernames
+        for params in [{'page_size': 1, 'status': 'cancelled'}, {'page_size': 100}]:
+            with self.assertNumQueries(5):
+                response = self.client.get('/api/orders/my_orders/', params)
+            self.assertEqual(len(response.data['results']), params['page_size'])
+
+    def test_walking_all_orders_costs_the_same_per_page(self):
+        url, pages, seen = '/api/orders/my_orders/?page_size=100', 0, 0
+        while url:
+            with self.assertNumQueries(5):
+                response = self.client.get(url)
+            seen += len(response.data['results'])
+            pages += 1
+            url = response.data['next']
+        self.assertEqual((pages, seen), (5, 500))
+
+    def test_prefetched_orders_render_the_same_details(self):
+        response = self.client.get('/api/orders/my_orders/', {'status': 'cancelled', 'page_size': 1})
+        order = response.data['results'][0]
+        self.assertIn(order['cancelled_by_username'], {'staff0', 'staff1', 'staff2'})
+        variant_item = next(item for item in order['items'] if item['variant'])
+        self.assertEqual(variant_item['variant_details']['name'], 'Listed - Size: L, Colour: Red')
+        self.assertEqual(order['status_history'][0]['updated_by_username'], 'staff0')
+        self.assertEqual(order['payment_details'] is None, Payment.objects.filter(order_id=order['id']).count() == 0)
+
+        detail = self.client.get(f"/api/orders/{order['id']}/")
+        self.assertEqual(detail.data['cancelled_by_username'], order['cancelled_by_username'])
+        self.assertEqual(detail.data['items'], order['items'])
+
+
+class OrderSummaryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        other_seller = User.objects.create_user('other', 'other@test.com', 'password123', role='seller')
+        self.customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        pictured = Product.objects.create(name='Pictured', description='d', price='10.00', stock=5, seller=self.seller)
+        ProductImage.objects.create(product=pictured, file='products/pictured.jpg')
+        ProductImage.objects.create(product=pictured, file='products/pictured.glb', file_type='model')
+        plain = Product.objects.create(name='Plain', description='d', price='4.00', stock=5, seller=other_seller)
+
+        self.orders = []
+        for products in [[pictured, plain], [plain]]:
+            order = Order.objects.create(
+                user=self.customer, shipping_address='a', billing_address='b', payment_method='card',
+                total_price='18.00'
+            )
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=2, price=product.price)
+            self.orders.append(order)
+        self.client.force_authenticate(user=self.customer)
+
+    def test_customer_summary(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/my_orders/', {'view': 'summary'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        newest, oldest = response.data['results']
+        self.assertEqual(set(oldest), {
+            'id', 'status', 'payment_status', 'created_at', 'total_price', 'tracking_number',
+            'cancelled_at', 'item_count', 'thumbnail'
+        })
+        self.assertEqual((oldest['id'], oldest['item_count'], oldest['total_price']), (self.orders[0].id, 4, '18.00'))
+        self.assertEqual(oldest['thumbnail'], '/media/products/pictured.jpg')
+        self.assertIsNone(newest['thumbnail'])
+
+    def test_seller_summary_counts_only_their_items(self):
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.get('/api/orders/seller_orders/', {'view': 'summary'})
+        [summary] = response.data['results']
+        self.assertEqual(
+            (summary['id'], summary['item_count'], summary['subtotal']), (self.orders[0].id, 2, '20.00')
+        )
+
+    def test_summary_pages(self):
+        response = self.client.get('/api/orders/my_orders/', {'view': 'summary', 'page_size': 1})
+        self.assertEqual(response.data['results'][0]['id'], self.orders[1].id)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'][0]['id'], self.orders[0].id)
+        self.assertIsNone(response.data['next'])
+
+    def test_sparse_fieldsets(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/my_orders/', {'fields': 'id,status,total_price'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'status', 'total_price'})
+
+        response = self.client.get(f'/api/orders/{self.orders[0].id}/', {'fields': 'id,items'})
+        self.assertEqual(set(response.data), {'id', 'items'})
+        self.assertEqual(len(response.data['items']), 2)
+
+    def test_invalid_view_is_rejected(self):
+        response = self.client.get('/api/orders/my_orders/', {'view': 'tiny'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OrderAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        other_seller = User.objects.create_user('other', 'other@test.com', 'password123', role='seller')
+        self.admin = User.objects.create_user('admin', 'admin@test.com', 'password123', role='admin', is_staff=True)
+        customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        mine = Product.objects.create(name='Mine', description='d', price='10.00', stock=5, seller=self.seller)
+        theirs = Product.objects.create(name='Theirs', description='d', price='10.00', stock=5, seller=other_seller)
+
+        self.orders = []
+        placed = [
+            ('delivered', 'completed', None, None, '2026-01-05'),
+            ('shipped', 'completed', None, None, '2026-01-06'),
+            ('pending', 'pending', None, None, '2026-01-20'),
+            ('cancelled', 'refunded', 'customer', 'Too slow', '2026-02-02'),
+            ('cancelled', 'pending', 'seller', '', '2026-02-03'),
+        ]
+        for order_status, payment_status, role, reason, day in placed:
+            order = Order.objects.create(
+                user=customer, shipping_address='a', billing_address='b', payment_method='card',
+                total_price='10.00', status=order_status, payment_status=payment_status,
+                cancelled_by_role=role, cancellation_reason=reason
+            )
+            OrderItem.objects.create(order=order, product=mine, quantity=1, price='10.00')
+            Order.objects.filter(id=order.id).update(created_at=f'{day}T12:00:00Z')
+            self.orders.append(order)
+        # Only in the admin's report
+        other = Order.objects.create(
+            user=customer, shipping_address='a', billing_address='b', payment_method='card', total_price='99.00'
+        )
+        OrderItem.objects.create(order=other, product=theirs, quantity=1, price='99.00')
+
+    def analytics(self, user, **params):
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/orders/analytics/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    @override_settings(ORDER_ANALYTICS_CACHE={'ENABLED': False})
+    def test_report_is_one_grouped_query(self):
+        self.client.force_authenticate(user=self.seller)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/analytics/')
+        report = response.data
+        self.assertEqual(report['total_orders'], 5)
+        self.assertEqual(report['total_revenue'], Decimal('20.00'))
+        self.assertEqual(report['status_breakdown'], {'delivered': 1, 'shipped': 1, 'pending': 1, 'cancelled': 2})
+        self.assertEqual(report['payment_status_breakdown'], {'completed': 2, 'pending': 2, 'refunded': 1})
+        self.assertEqual(report['cancellation'], {
+            'total_cancelled': 2, 'by_role': {'customer': 1, 'seller': 1}, 'reasons': {'Too slow': 1}
+        })
+        self.assertNotIn('series', report)
+
+        self.assertEqual(self.analytics(self.admin)['total_orders'], 6)
+        self.assertEqual(self.analytics(self.seller, start_date='2026-02-01')['total_orders'], 2)
+
+    @override_settings(ORDER_ANALYTICS_CACHE={'ENABLED': False})
+    def test_time_series(self):
+        report = self.analytics(self.seller, interval='month')
+        self.assertEqual(report['series'], [
+            {'period': '2026-01-01', 'orders': 3, 'revenue': Decimal('20.00'), 'cancelled': 0},
+            {'period': '2026-02-01', 'orders': 2, 'revenue': Decimal('0'), 'cancelled': 2},
+        ])
+        weeks = self.analytics(self.seller, interval='week')['series']
+        self.assertEqual([week['period'] for week in weeks], ['2026-01-05', '2026-01-19', '2026-02-02'])
+        days = self.analytics(self.seller, interval='day')['series']
+        self.assertEqual(len(days), 5)
+
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.get('/api/orders/analytics/', {'interval': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_report_is_cached_until_an_order_changes(self):
+        self.assertEqual(self.analytics(self.seller)['status_breakdown']['pending'], 1)
+        self.client.force_authenticate(user=self.seller)
+        with self.assertNumQueries(0):
+            self.client.get('/api/orders/analytics/')
+        # Other ranges are cached separately
+        self.assertEqual(self.analytics(self.seller, end_date='2026-01-31')['total_orders'], 3)
+
+        self.client.force_authenticate(user=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/orders/{self.orders[2].id}/update_status/', {'status': 'processing'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        report = self.analytics(self.seller)
+        self.assertNotIn('pending', report['status_breakdown'])
+        self.assertEqual(report['total_revenue'], Decimal('30.00'))
+        self.assertEqual(self.analytics(self.admin)['status_breakdown']['processing'], 1)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        self.products = [
+            Product.objects.create(
+                name=f'Stocked {i}', description='d', price='10.00', stock=5, seller=self.seller
+            )
+            for i in range(3)
+        ]
+        self.variant = ProductVariant.objects.create(
+            product=self.products[0], sku='STOCKED-0-L', price_adjustment='2.50', stock=2
+        )
+        self.cart = Cart.objects.create(customer=self.customer)
+        self.client.force_authenticate(user=self.customer)
+
+    def place_order(self):
+        return self.client.post('/api/orders/', {
+            'shipping_address': 'a', 'billing_address': 'b', 'payment_method': 'card', 'total_price': '0.00'
+        })
+
+    def test_checkout_moves_cart_into_order_and_decrements_stock(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], variant=self.variant, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=1)
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=4)
+
+        response = self.place_order()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        order = Order.objects.get(user=self.customer)
+        items = {(item.product_id, item.variant_id): item for item in order.items.all()}
+        self.assertEqual(items[(self.products[0].id, self.variant.id)].price, Decimal('12.50'))
+        self.assertEqual(items[(self.products[1].id, None)].quantity, 4)
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list('stock', flat=True)), [2, 1, 5]
+        )
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 0)
+        self.assertFalse(self.cart.items.exists())
+
+    def test_stock_sold_between_lock_and_update_fails_checkout(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=1)
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=4)
+
+        def lock_then_sell_elsewhere(model, ids):
+            rows = lock_rows(model, ids)
+            if model is Product:
+                # Another writer takes units after the rows were read, so the
+                # validation passes on stale rows and only the UPDATE can notice
+                Product.objects.filter(id=self.products[1].id).update(stock=F('stock') - 3)
+            return rows
+
+        with mock.patch('orders.checkout.lock_rows', side_effect=lock_then_sell_elsewhere):
+            response = self.place_order()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+        # The whole checkout rolled back, the first product's decrement included
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 5)
+        self.assertEqual(self.cart.items.count(), 2)
+
+    def test_checkout_query_count_does_not_grow_with_cart(self):
+        for product in self.products:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=self.products[0], variant=self.variant, quantity=1)
+        order = Order.objects.create(
+            user=self.customer, shipping_address='a', billing_address='b', payment_method='card', total_price='0'
+        )
+        # Lock holds, read cart, lock products, lock variants, two stock updates,
+        # insert items, insert seller rows, clear cart, bump version, read sales facts
+        # and insert them in a savepoint
+        with transaction.atomic(), self.assertNumQueries(14):
+            checkout_cart(order, self.cart)
+
+    def test_checkout_converts_stock_holds(self):
+        other = User.objects.create_user('other', 'other@test.com', 'password123')
+        self.client.force_authenticate(user=other)
+        self.client.post('/api/cart/add_item/', {'product_id': self.products[0].id, 'quantity': 2})
+        self.client.force_authenticate(user=self.customer)
+        self.client.post('/api/cart/add_item/', {
+            'product_id': self.products[0].id, 'variant_id': self.variant.id, 'quantity': 2
+        })
+        self.client.post('/api/cart/add_item/', {'product_id': self.products[0].id, 'quantity': 1})
+
+        response = self.place_order()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        product = Product.objects.get(id=self.products[0].id)
+        self.assertEqual((product.stock, product.reserved), (2, 2))
+        self.variant.refresh_from_db()
+        self.assertEqual((self.variant.stock, self.variant.reserved), (0, 0))
+        self.assertEqual(StockReservation.objects.get().cart.customer, other)
+
+    def test_checkout_cannot_take_stock_held_by_other_carts(self):
+        other = User.objects.create_user('other', 'other@test.com', 'password123')
+        self.client.force_authenticate(user=other)
+        self.client.post('/api/cart/add_item/', {'product_id': self.products[1].id, 'quantity': 3})
+        self.client.force_authenticate(user=self.customer)
+        # Added before holds existed, so the line holds nothing
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=3)
+
+        response = self.place_order()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Product.objects.get(id=self.products[1].id).stock, 5)
+
+    def test_insufficient_stock_rolls_back_checkout(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=1)
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=6)
+
+        response = self.place_order()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 5)
+        self.assertEqual(self.cart.items.count(), 2)
+
+
+class OrderSellerTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.other_seller = User.objects.create_user('other', 'other@test.com', 'password123', role='seller')
+        self.customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        self.products = [
+            Product.objects.create(name=f'Mine {i}', description='d', price='10.00', stock=5, seller=self.seller)
+            for i in range(2)
+        ]
+        self.foreign = Product.objects.create(
+            name='Theirs', description='d', price='4.00', stock=5, seller=self.other_seller
+        )
+        cart = Cart.objects.create(customer=self.customer)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=2)
+        CartItem.objects.create(cart=cart, product=self.products[1], quantity=1)
+        CartItem.objects.create(cart=cart, product=self.foreign, quantity=3)
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.post('/api/orders/', {
+            'shipping_address': 'a', 'billing_address': 'b', 'payment_method': 'card', 'total_price': '0.00'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.order = Order.objects.get(user=self.customer)
+
+    def test_checkout_records_each_sellers_share(self):
+        rows = {row.seller_id: row for row in OrderSeller.objects.filter(order=self.order)}
+        self.assertEqual(set(rows), {self.seller.id, self.other_seller.id})
+        self.assertEqual((rows[self.seller.id].subtotal, rows[self.seller.id].item_count), (Decimal('30.00'), 3))
+        self.assertEqual((rows[self.other_seller.id].subtotal, rows[self.other_seller.id].item_count), (Decimal('12.00'), 3))
+        self.assertEqual(rows[self.seller.id].created_at, self.order.created_at)
+
+    def test_item_changes_update_seller_rows(self):
+        item = self.order.items.get(product=self.foreign)
+        item.quantity = 1
+        item.save()
+        self.assertEqual(OrderSeller.objects.get(order=self.order, seller=self.other_seller).subtotal, Decimal('4.00'))
+
+        item.delete()
+        self.assertFalse(OrderSeller.objects.filter(order=self.order, seller=self.other_seller).exists())
+
+    def test_seller_sees_each_order_once(self):
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.get('/api/orders/seller_orders/')
+        self.assertEqual([order['id'] for order in response.data['results']], [self.order.id])
+
+        response = self.client.get(f'/api/orders/{self.order.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_seller_lists_page_on_the_seller_rows(self):
+        orders = [self.order]
+        for _ in range(4):
+            order = Order.objects.create(
+                user=self.customer, shipping_address='a', billing_address='b', payment_method='card', total_price='10.00'
+            )
+            OrderItem.objects.create(order=order, product=self.products[0], quantity=1, price='10.00')
+            orders.append(order)
+        Order.objects.filter(id__in=[order.id for order in orders[1:3]]).update(created_at=self.order.created_at)
+        OrderSeller.objects.filter(order__in=orders[1:3]).update(created_at=self.order.created_at)
+        expected = list(OrderSeller.objects.filter(seller=self.seller).order_by('-created_at', 'order_id').values_list(
+            'order_id', flat=True
+        ))
+        self.assertEqual(len(expected), 5)
+
+        self.client.force_authenticate(user=self.seller)
+        for params in [{}, {'view': 'summary'}]:
+            ids, url = [], '/api/orders/seller_orders/'
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {**params, 'page_size': 2})
+            # One join to the seller rows, sorted on their created_at rather than the order's
+            sql = queries[0]['sql']
+            self.assertIn('"orders_orderseller"."created_at" AS "seller_created_at"', sql)
+            self.assertNotIn('ORDER BY "orders_order"."created_at"', sql)
+            self.assertEqual(sql.count('JOIN "orders_orderseller"'), 1)
+            while True:
+                ids.extend(order['id'] for order in response.data['results'])
+                if not response.data['next']:
+                    break
+                response = self.client.get(response.data['next'])
+            self.assertEqual(ids, expected)
+
+    def test_seller_without_items_cannot_see_order(self):
+        outsider = User.objects.create_user('outsider', 'outsider@test.com', 'password123', role='seller')
+        self.client.force_authenticate(user=outsider)
+        self.assertEqual(self.client.get('/api/orders/seller_orders/').data['results'], [])
+        response = self.client.get(f'/api/orders/{self.order.id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class IdempotentCheckoutTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        self.product = Product.objects.create(
+            name='Stocked', description='d', price='10.00', stock=5, seller=self.seller
+        )
+        self.cart = Cart.objects.create(customer=self.customer)
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+        self.client.force_authenticate(user=self.customer)
+
+    def order_data(self, address):
+        return {
+            'shipping_address': address, 'billing_address': 'b', 'payment_method': 'card', 'total_price': '0.00'
+        }
+
+    def place_order(self, key, address='a'):
+        return self.client.post('/api/orders/', self.order_data(address), format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self.place_order('order-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        retry = self.place_order('order-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(json.loads(retry.content), first.data)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(id=self.product.id).stock, 3)
+
+    def test_keys_are_scoped_to_the_user(self):
+        self.place_order('order-1')
+        other = User.objects.create_user('other', 'other@test.com', 'password123')
+        CartItem.objects.create(cart=Cart.objects.create(customer=other), product=self.product, quantity=1)
+        self.client.force_authenticate(user=other)
+
+        response = self.place_order('order-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reused_for_different_request_is_rejected(self):
+        self.place_order('order-1')
+        response = self.place_order('order-1', address='elsewhere')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY={'WAIT_TIMEOUT': 0})
+    def test_request_in_progress_is_not_run_twice(self):
+        self.claim()
+        response = self.place_order('order-1')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Order.objects.exists())
+
+    def test_stale_claim_is_taken_over(self):
+        self.claim(locked_at=timezone.now() - timedelta(minutes=5))
+        response = self.place_order('order-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(IdempotencyKey.objects.get().status, 'completed')
+
+    def test_failed_request_releases_key(self):
+        with mock.patch('orders.serializers.checkout_cart', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.place_order('order-1')
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        response = self.place_order('order-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def claim(self, **fields):
+        # A claim on 'order-1' left by a request for the same order that is still running
+        return IdempotencyKey.objects.create(
+            user=self.customer, endpoint='OrderViewSet.create', key='order-1',
+            fingerprint=request_fingerprint(SimpleNamespace(
+                method='POST', path='/api/orders/', data=self.order_data('a')
+            )),
+            expires_at=timezone.now() + timedelta(hours=1), **fields
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Row locking needs a server database')
+class CheckoutConcurrencyTests(TransactionTestCase):
+    def test_concurrent_checkouts_never_oversell(self):
+        seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        product = Product.objects.create(name='Hot', description='d', price='1.00', stock=5, seller=seller)
+        customers = []
+        for i in range(20):
+            customer = User.objects.create_user(f'buyer{i}', f'buyer{i}@test.com', 'password123')
+            cart = Cart.objects.create(customer=customer)
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            customers.append(customer)
+
+        barrier = threading.Barrier(len(customers))
+        results = []
+
+        def buy(customer):
+            client = APIClient()
+            client.force_authenticate(user=customer)
+            barrier.wait()
+            try:
+                response = client.post('/api/orders/', {
+                    'shipping_address': 'a', 'billing_address': 'b',
+                    'payment_method': 'card', 'total_price': '1.00'
+                })
+                results.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(customer,)) for customer in customers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(results.count(status.HTTP_201_CREATED), 5)
+        self.assertEqual(results.count(status.HTTP_400_BAD_REQUEST), 15)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), 5)
@@ -4,13 +4,20 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Q, Count, Sum
+from django.db.models import Q
 from django.utils import timezone
 from django.db import transaction
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
 
+from core.idempotency import idempotent
+from core.pagination import KeysetPagination
+from .analytics import INTERVALS, get_report
+from .export import EXPORT_FORMATS, stream_orders
 from .models import Order, OrderItem, OrderStatusHistory
+from .sellers import is_order_seller, orders_for_seller
+from .summaries import ORDER_VIEWS, summarize_orders, summary_data
 from .serializers import OrderSerializer, OrderItemSerializer, OrderCreateSerializer
 from permissions import IsSellerOrAdmin
 
@@ -39,7 +46,7 @@ class IsOrderSeller(permissions.BasePermission):
             return True
         
         # Allow if user is a seller with products in this order
-        return obj.items.filter(product__seller=request.user).exists()
+        return is_order_seller(obj, request.user)
 
 
 class OrderViewSet(viewsets.ModelViewSet):
@@ -48,6 +55,7 @@ class OrderViewSet(viewsets.ModelViewSet):
     """
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    pagination_class = KeysetPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -63,6 +71,18 @@ class OrderViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsSellerOrAdmin()]
         return [IsAuthenticated()]
     
+    def get_keyset_ordering(self):
+        """
+        Seller-scoped lists page on the seller rows' copy of the order time
+        (see orders_for_seller); every other list uses the model's ordering
+        """
+        user = self.request.user
+        if self.action == 'seller_orders' or (
+            self.action == 'list' and user.role == 'seller' and not user.is_staff
+        ):
+            return ['-seller_created_at', 'id']
+        return None
+    
     def get_queryset(self):
         user = self.request.user
         
@@ -71,7 +91,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             queryset = Order.objects.all()
         # Seller can see orders for their products
         elif user.role == 'seller':
-            queryset = Order.objects.filter(items__product__seller=user).distinct()
+            queryset = orders_for_seller(user)
         # Customer can see their own orders
         else:
             queryset = Order.objects.filter(user=user)
@@ -105,6 +125,11 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         if end_date:
             queryset = queryset.filter(created_at__lte=end_date)
+        
+        if self.action in ['list', 'retrieve']:
+            queryset = OrderSerializer.setup_eager_loading(
+                queryset, OrderSerializer.requested_fields(self.request)
+            )
             
         return queryset
     
@@ -150,6 +175,12 @@ class OrderViewSet(viewsets.ModelViewSet):
                 required=False,
                 type=str,
             ),
+            OpenApiParameter(
+                name='fields',
+                description='Comma-separated order fields to render, e.g. id,status,items',
+                required=False,
+                type=str,
+            ),
         ],
     )
     def list(self, request, *args, **kwargs):
@@ -158,6 +189,21 @@ class OrderViewSet(viewsets.ModelViewSet):
         """
         return super().list(request, *args, **kwargs)
     
+    @extend_schema(
+        description="Check out the user's cart into a new order. Send a unique Idempotency-Key header "
+                    "to make retries safe: a repeated request gets the first response back instead of "
+                    "creating another order.",
+        parameters=[
+            OpenApiParameter(
+                name='Idempotency-Key',
+                description='Client-generated key identifying this order attempt, e.g. a UUID',
+                required=False,
+                type=str,
+                location=OpenApiParameter.HEADER
+            ),
+        ],
+    )
+    @idempotent
     def create(self, request, *args, **kwargs):
         """
         Create a new order
@@ -171,6 +217,38 @@ class OrderViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
     
+    def order_list_response(self, orders, seller=None):
+        """
+        Paginated response for an order list in the requested ``view``:
+        full orders (optionally with sparse ``fields``), or compact
+        summaries projected straight from the database
+        """
+        view = self.request.query_params.get('view', 'detail')
+        if view not in ORDER_VIEWS:
+            return Response(
+                {'error': f"Invalid view. Must be one of: {', '.join(ORDER_VIEWS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if view == 'summary':
+            rows = summarize_orders(orders, seller=seller)
+            page = self.paginate_queryset(rows)
+            if page is not None:
+                return self.get_paginated_response(summary_data(page))
+            return Response(summary_data(rows))
+        
+        # Load only the relations the requested fields render, for the whole page up front
+        orders = OrderSerializer.setup_eager_loading(orders, OrderSerializer.requested_fields(self.request))
+        
+        # Paginate results
+        page = self.paginate_queryset(orders)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = self.get_serializer(orders, many=True)
+        return Response(serializer.data)
+    
     @extend_schema(
         description="Get orders for products sold by the authenticated seller",
         parameters=[
@@ -213,6 +291,19 @@ class OrderViewSet(viewsets.ModelViewSet):
                 required=False,
                 type=str,
             ),
+            OpenApiParameter(
+                name='view',
+                description='detail (default) for full orders, or summary for a compact header, item count and thumbnail per order',
+                required=False,
+                type=str,
+                enum=['detail', 'summary']
+            ),
+            OpenApiParameter(
+                name='fields',
+                description='Comma-separated order fields to render in the detail view, e.g. id,status,items',
+                required=False,
+                type=str,
+            ),
         ],
     )
     @action(detail=False, methods=['get'])
@@ -230,7 +321,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             )
         
         # Get orders for products sold by the current user
-        orders = Order.objects.filter(items__product__seller=user).distinct()
+        orders = orders_for_seller(user)
         
         # Filter by cancelled_by and cancelled_by_role if provided
         cancelled_by = request.query_params.get('cancelled_by')
@@ -262,8 +353,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         if end_date:
             orders = orders.filter(created_at__lte=end_date)
         
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+        return self.order_list_response(orders, seller=user)
     
     @extend_schema(
         description="Get orders for the authenticated customer",
@@ -307,6 +397,19 @@ class OrderViewSet(viewsets.ModelViewSet):
                 required=False,
                 type=str,
             ),
+            OpenApiParameter(
+                name='view',
+                description='detail (default) for full orders, or summary for a compact header, item count and thumbnail per order',
+                required=False,
+                type=str,
+                enum=['detail', 'summary']
+            ),
+            OpenApiParameter(
+                name='fields',
+                description='Comma-separated order fields to render in the detail view, e.g. id,status,items',
+                required=False,
+                type=str,
+            ),
         ],
     )
     @action(detail=False, methods=['get'])
@@ -349,8 +452,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         if end_date:
             orders = orders.filter(created_at__lte=end_date)
         
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+        return self.order_list_response(orders)
     
     @extend_schema(
         description="Update the status of an order",
@@ -479,6 +581,13 @@ class OrderViewSet(viewsets.ModelViewSet):
                 required=False,
                 type=str,
             ),
+            OpenApiParameter(
+                name='interval',
+                description='Add a time series of orders, revenue and cancellations per day, week or month',
+                required=False,
+                type=str,
+                enum=['day', 'week', 'month']
+            ),
         ],
     )
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsSellerOrAdmin])
@@ -492,7 +601,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         if user.is_staff or user.role == 'admin':
             orders = Order.objects.all()
         elif user.role == 'seller':
-            orders = Order.objects.filter(items__product__seller=user).distinct()
+            orders = orders_for_seller(user)
         else:
             return Response(
                 {'error': 'Only sellers and admins can access analytics'},
@@ -509,58 +618,32 @@ class OrderViewSet(viewsets.ModelViewSet):
         if end_date:
             orders = orders.filter(created_at__lte=end_date)
         
-        # Calculate analytics
-        total_orders = orders.count()
-        total_revenue = orders.filter(status__in=['processing', 'shipped', 'delivered']).aggregate(
-            total=Sum('total_price')
-        )['total'] or 0
-        
-        # Status breakdown
-        status_counts = orders.values('status').annotate(count=Count('id'))
-        status_breakdown = {item['status']: item['count'] for item in status_counts}
-        
-        # Payment status breakdown
-        payment_status_counts = orders.values('payment_status').annotate(count=Count('id'))
-        payment_status_breakdown = {item['payment_status']: item['count'] for item in payment_status_counts}
-        
-        # Cancellation analytics
-        cancelled_orders = orders.filter(status='cancelled')
-        total_cancelled = cancelled_orders.count()
-        
-        # Cancellation by role
-        cancellation_by_role = cancelled_orders.values('cancelled_by_role').annotate(count=Count('id'))
-        cancellation_role_breakdown = {
-            item['cancelled_by_role'] or 'unknown': item['count'] 
-            for item in cancellation_by_role
-        }
+        interval = request.query_params.get('interval')
+        if interval and interval not in INTERVALS:
+            return Response(
+                {'error': f"Invalid interval. Must be one of: {', '.join(INTERVALS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Cancellation reasons (if the field exists)
-        try:
-            cancellation_reasons = cancelled_orders.exclude(cancellation_reason__isnull=True).exclude(
-                cancellation_reason=''
-            ).values('cancellation_reason').annotate(count=Count('id'))
-            reason_breakdown = {
-                item['cancellation_reason']: item['count'] 
-                for item in cancellation_reasons
-            }
-        except:
-            reason_breakdown = {}
-        
-        return Response({
-            'total_orders': total_orders,
-            'total_revenue': total_revenue,
-            'status_breakdown': status_breakdown,
-            'payment_status_breakdown': payment_status_breakdown,
-            'cancellation': {
-                'total_cancelled': total_cancelled,
-                'by_role': cancellation_role_breakdown,
-                'reasons': reason_breakdown
-            }
-        })
+        # One grouped query, cached per user and range until an order changes
+        return Response(get_report(user, orders, start_date, end_date, interval))
     
     @extend_schema(
-        description="Export orders as CSV",
+        description="Export orders as CSV, TSV or NDJSON, streamed row by row",
         parameters=[
+            OpenApiParameter(
+                name='export_format',
+                description='Output format (default csv)',
+                required=False,
+                type=str,
+                enum=['csv', 'tsv', 'ndjson']
+            ),
+            OpenApiParameter(
+                name='gzip',
+                description='Compress the export with gzip',
+                required=False,
+                type=bool,
+            ),
             OpenApiParameter(
                 name='status',
                 description='Filter by order status',
@@ -599,18 +682,15 @@ class OrderViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsSellerOrAdmin])
     def export(self, request):
         """
-        Export orders as CSV
+        Export orders as CSV, TSV or NDJSON, optionally gzip-compressed
         """
-        import csv
-        from django.http import HttpResponse
-        
         user = request.user
         
         # Determine which orders to export based on user role
         if user.is_staff or user.role == 'admin':
             orders = Order.objects.all()
         elif user.role == 'seller':
-            orders = Order.objects.filter(items__product__seller=user).distinct()
+            orders = orders_for_seller(user)
         else:
             return Response(
                 {'error': 'Only sellers and admins can export orders'},
@@ -638,55 +718,26 @@ class OrderViewSet(viewsets.ModelViewSet):
         if cancelled_by_role:
             orders = orders.filter(cancelled_by_role=cancelled_by_role)
         
-        # Create CSV response
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="orders.csv"'
-        
-        writer = csv.writer(response)
-        
-        # Write header row
-        writer.writerow([
-            'Order ID', 'Customer', 'Status', 'Payment Status', 'Created At', 'Total Price',
-            'Cancelled At', 'Cancelled By', 'Cancelled By Role', 'Cancellation Reason',
-            'Shipping Address', 'Tracking Number'
-        ])
-        
-        # Write data rows
-        for order in orders:
-            # Get customer username
-            try:
-                customer_username = order.user.username
-            except:
-                customer_username = f"User {order.user_id}"
-            
-            # Get cancelled by username
-            cancelled_by_username = ""
-            if order.cancelled_by:
-                try:
-                    User = request.user.__class__
-                    cancelled_user = User.objects.get(id=order.cancelled_by)
-                    cancelled_by_username = cancelled_user.username
-                except:
-                    cancelled_by_username = f"User {order.cancelled_by}"
-            
-            # Get cancellation reason if it exists
-            cancellation_reason = getattr(order, 'cancellation_reason', '')
-            
-            writer.writerow([
-                order.id,
-                customer_username,
-                order.status,
-                order.payment_status,
-                order.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                order.total_price,
-                order.cancelled_at.strftime('%Y-%m-%d %H:%M:%S') if order.cancelled_at else '',
-                cancelled_by_username,
-                order.cancelled_by_role or '',
-                cancellation_reason,
-                order.shipping_address,
-                order.tracking_number or ''
-            ])
-        
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"Invalid export_format. Must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        use_gzip = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+        
+        # Stream the rows instead of building the whole file in memory
+        content_type, extension = EXPORT_FORMATS[export_format]
+        filename = f"orders.{extension}"
+        if use_gzip:
+            content_type = 'application/gzip'
+            filename += '.gz'
+        
+        response = StreamingHttpResponse(
+            stream_orders(orders, export_format=export_format, gzip=use_gzip),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
 
 
@@ -5,6 +5,7 @@ from django.utils import timezone
 from django.db import transaction
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
+from core.idempotency import idempotent
 from .models import Payment
 from .serializers import PaymentSerializer
 from orders.models import Order
@@ -39,11 +40,29 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return Payment.objects.all()
         elif user.role == 'seller':
             # Sellers can see payments for orders containing their products
-            return Payment.objects.filter(order__items__product__seller=user).distinct()
+            return Payment.objects.filter(order__sellers__seller=user)
         else:
             # Regular users can only see their own payments
             return Payment.objects.filter(order__user=user)
 
+    @extend_schema(
+        description="Record a payment for one of the user's orders. Send a unique Idempotency-Key header "
+                    "to make retries safe: a repeated request gets the first response back instead of "
+                    "recording the payment twice.",
+        parameters=[
+            OpenApiParameter(
+                name='Idempotency-Key',
+                description='Client-generated key identifying this payment attempt, e.g. a UUID',
+                required=False,
+                type=str,
+                location=OpenApiParameter.HEADER
+            ),
+        ],
+    )
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         # Ensure the user can only create payments for their own orders
         order_id = self.request.data.get('order')
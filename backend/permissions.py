@@ -50,7 +50,7 @@ class IsOrderCustomer(permissions.BasePermission):
             
         # Sellers can view orders that contain their products
         if request.user.role == 'seller':
-            return obj.items.filter(product__seller=request.user).exists()
+            return obj.sellers.filter(seller=request.user).exists()
             
         # Customers can only view their own orders
         return request.user.is_authenticated and obj.customer == request.user
@@ -0,0 +1,50 @@
+from core.response_cache import ResponseCache
+
+catalog_cache = ResponseCache('catalog', 'CATALOG_CACHE')
+
+# Every catalog entry also depends on the 'catalog' scope, which is bumped
+# by bulk operations that cannot name the rows they touched
+
+
+def product_list_scopes(view, request, kwargs):
+    return ['catalog', 'products']
+
+
+def product_detail_scopes(view, request, kwargs):
+    return ['catalog', f"product:{kwargs.get('pk')}"]
+
+
+def category_scopes(view, request, kwargs):
+    return ['catalog', 'categories']
+
+
+def category_products_scopes(view, request, kwargs):
+    return ['catalog', 'categories', 'products']
+
+
+def category_tree_scopes(view=None, request=None, kwargs=None):
+    # Only the category tree and which category each product is in
+    return ['catalog', 'category_tree']
+
+
+def invalidate_products(*product_ids):
+    """
+    Drop cached listings and the detail responses of the given products
+    """
+    catalog_cache.invalidate('products', *(f"product:{product_id}" for product_id in product_ids))
+
+
+def invalidate_categories():
+    # Product listings embed category details, so they go too
+    catalog_cache.invalidate('categories', 'products', 'category_tree')
+
+
+def invalidate_category_tree():
+    """
+    Rebuild the category tree snapshot, whose product counts changed
+    """
+    catalog_cache.invalidate('category_tree')
+
+
+def invalidate_catalog():
+    catalog_cache.invalidate('catalog')
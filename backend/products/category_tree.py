@@ -0,0 +1,74 @@
+import threading
+from collections import Counter, defaultdict, namedtuple
+
+from django.db.models import Count
+
+from core.conditional import make_etag
+from .cache import catalog_cache, category_tree_scopes
+from .models import Category, Product
+
+CategoryTreeSnapshot = namedtuple('CategoryTreeSnapshot', ['version', 'etag', 'tree'])
+
+_snapshot = None
+_rebuild_lock = threading.Lock()
+
+
+def get_tree_version():
+    """
+    Current version of the category tree, shared by every process through
+    the cache generations of its invalidation scopes
+    """
+    return '.'.join(str(generation) for generation in catalog_cache.get_generations(category_tree_scopes()))
+
+
+def build_tree():
+    """
+    Build the nested category tree with direct and subtree product counts.
+    Runs two queries however deep or wide the tree is.
+    """
+    categories = list(Category.objects.order_by('name').values_list('id', 'name', 'parent_id'))
+    direct_counts = Counter(dict(
+        Product.objects.filter(category__isnull=False).order_by().values('category_id').annotate(
+            count=Count('id')
+        ).values_list('category_id', 'count')
+    ))
+
+    children = defaultdict(list)
+    known = {category_id for category_id, _, _ in categories}
+    for category_id, name, parent_id in categories:
+        # A dangling parent would hide the node, so show it as a root instead
+        children[parent_id if parent_id in known else None].append((category_id, name))
+
+    def build(category_id, name, parent_id):
+        nodes = tuple(build(child_id, child_name, category_id) for child_id, child_name in children[category_id])
+        return {
+            'id': category_id,
+            'name': name,
+            'parent': parent_id,
+            'product_count': direct_counts[category_id],
+            'total_product_count': direct_counts[category_id] + sum(node['total_product_count'] for node in nodes),
+            'children': nodes,
+        }
+
+    return tuple(build(category_id, name, None) for category_id, name in children[None])
+
+
+def get_category_tree():
+    """
+    Get the current tree snapshot, rebuilding it if the tree has changed.
+
+    A snapshot is never modified once built; a rebuild swaps in a new one,
+    so readers can serialize it without copying or locking.
+    """
+    global _snapshot
+    version = get_tree_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _rebuild_lock:
+        # Another thread may have rebuilt it while this one waited
+        if _snapshot is not None and _snapshot.version == version:
+            return _snapshot
+        _snapshot = CategoryTreeSnapshot(version, make_etag('category-tree', version), build_tree())
+        return _snapshot
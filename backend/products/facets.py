@@ -0,0 +1,229 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import CharField, Count, Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Concat
+
+from .models import SALE_PRICE, CategoryClosure, Product, ProductVariant, ProductVariantOption, available_stock_value
+
+# Price facet buckets as (min, max) on the sale price; max is exclusive, None is open
+PRICE_BUCKETS = (
+    (Decimal('0'), Decimal('25')),
+    (Decimal('25'), Decimal('50')),
+    (Decimal('50'), Decimal('100')),
+    (Decimal('100'), Decimal('250')),
+    (Decimal('250'), None),
+)
+
+RATING_FLOORS = (4, 3, 2, 1)
+
+# Most values returned for each of the category, seller and option facets
+FACET_VALUE_LIMIT = 50
+
+
+def parse_ids(value):
+    """
+    Parse a comma-separated list of ids, skipping anything that is not one
+    """
+    ids = []
+    for part in (value or '').split(','):
+        try:
+            ids.append(int(part))
+        except ValueError:
+            continue
+    return ids
+
+
+def parse_decimal(value):
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return None
+
+
+def parse_bool(value):
+    if value is None or value == '':
+        return None
+    return value.lower() == 'true'
+
+
+def category_subtree_ids(category_id):
+    """
+    Subquery of the id of a category and all of its descendants
+    """
+    return CategoryClosure.objects.filter(ancestor_id=category_id).values('descendant_id')
+
+
+class ProductFacets:
+    """
+    Faceted filtering and facet counts for a product queryset.
+
+    Every active filter is kept as a separate condition. Facet counts are
+    disjunctive: the counts for one facet apply every filter except that
+    facet's own, so selecting a seller still shows how many products the
+    other sellers have. Fixed buckets (price ranges, rating floors, stock,
+    sale) come from a single aggregate with one conditional COUNT per
+    bucket; the open-ended facets (categories, sellers, option values) are
+    grouped counts combined with UNION ALL into a second query.
+    """
+
+    def __init__(self, query_params):
+        self.conditions = {}
+
+        min_price = parse_decimal(query_params.get('min_price'))
+        max_price = parse_decimal(query_params.get('max_price'))
+        if min_price is not None or max_price is not None:
+            price = Q()
+            if min_price is not None:
+                price &= Q(sale_price_value__gte=min_price)
+            if max_price is not None:
+                price &= Q(sale_price_value__lte=max_price)
+            self.conditions['price'] = price
+
+        category_id = parse_ids(query_params.get('category'))[:1]
+        if category_id:
+            self.conditions['category'] = Q(category_id__in=category_subtree_ids(category_id[0]))
+
+        seller_ids = parse_ids(query_params.get('seller'))
+        if seller_ids:
+            self.conditions['seller'] = Q(seller_id__in=seller_ids)
+
+        in_stock = parse_bool(query_params.get('in_stock'))
+        if in_stock is not None:
+            # Units held in other carts are not in stock
+            self.conditions['in_stock'] = Q(available_units__gt=0) if in_stock else Q(available_units=0)
+
+        on_sale = parse_bool(query_params.get('on_sale'))
+        if on_sale is not None:
+            if on_sale:
+                self.conditions['on_sale'] = Q(discount_price__lt=F('price'))
+            else:
+                self.conditions['on_sale'] = Q(discount_price__isnull=True) | Q(discount_price__gte=F('price'))
+
+        min_rating = parse_decimal(query_params.get('min_rating'))
+        if min_rating is not None:
+            self.conditions['rating'] = Q(rating_average__gte=min_rating)
+
+        option_ids = parse_ids(query_params.get('options'))
+        if option_ids:
+            self.conditions['options'] = self.option_condition(option_ids)
+
+    @staticmethod
+    def option_condition(option_ids):
+        """
+        Options of the same variant type are alternatives (red or blue),
+        different types must all be available (red and large)
+        """
+        by_type = defaultdict(list)
+        for option_id, variant_type_id in ProductVariantOption.objects.filter(
+            id__in=option_ids
+        ).values_list('id', 'variant_type_id'):
+            by_type[variant_type_id].append(option_id)
+        if not by_type:
+            # None of the options exist, so nothing can match
+            return Q(pk__in=[])
+
+        condition = Q()
+        for type_option_ids in by_type.values():
+            condition &= Q(Exists(ProductVariant.objects.filter(
+                product=OuterRef('pk'), is_active=True, options__in=type_option_ids
+            )))
+        return condition
+
+    def where(self, exclude=None):
+        """
+        Combine the active filter conditions, leaving out the ``exclude`` facet
+        """
+        condition = Q()
+        for name, facet_condition in self.conditions.items():
+            if name != exclude:
+                condition &= facet_condition
+        return condition
+
+    @staticmethod
+    def prepare(queryset):
+        return queryset.alias(sale_price_value=SALE_PRICE, available_units=available_stock_value(Product))
+
+    def apply(self, queryset):
+        """
+        Filter ``queryset`` by every active facet
+        """
+        if not self.conditions:
+            return queryset
+        return self.prepare(queryset).filter(self.where())
+
+    def counts(self, queryset):
+        """
+        Count the products in each facet value of ``queryset``, which must not
+        be filtered by the facets already. Runs two queries.
+        """
+        queryset = self.prepare(queryset).order_by()
+        facets = self.bucket_counts(queryset)
+        facets.update(self.value_counts(queryset))
+        return facets
+
+    def bucket_counts(self, queryset):
+        aggregates = {
+            'in_stock': Count('id', filter=self.where('in_stock') & Q(available_units__gt=0)),
+            'on_sale': Count('id', filter=self.where('on_sale') & Q(discount_price__lt=F('price'))),
+        }
+        for index, (low, high) in enumerate(PRICE_BUCKETS):
+            bucket = Q(sale_price_value__gte=low)
+            if high is not None:
+                bucket &= Q(sale_price_value__lt=high)
+            aggregates[f'price_{index}'] = Count('id', filter=self.where('price') & bucket)
+        for floor in RATING_FLOORS:
+            aggregates[f'rating_{floor}'] = Count('id', filter=self.where('rating') & Q(rating_average__gte=floor))
+
+        totals = queryset.aggregate(**aggregates)
+        return {
+            'in_stock': totals['in_stock'],
+            'on_sale': totals['on_sale'],
+            'price': [
+                {'min': low, 'max': high, 'count': totals[f'price_{index}']}
+                for index, (low, high) in enumerate(PRICE_BUCKETS)
+            ],
+            'rating': [
+                {'min': floor, 'count': totals[f'rating_{floor}']}
+                for floor in RATING_FLOORS
+            ],
+        }
+
+    def value_counts(self, queryset):
+        def grouped(rows, facet, key, label, product):
+            return rows.order_by().values(
+                facet=Value(facet, output_field=CharField()),
+                key=F(key),
+                label=label,
+            ).annotate(count=Count(product, distinct=True))
+
+        categories = grouped(
+            queryset.filter(self.where('category'), category__isnull=False),
+            'categories', 'category_id', F('category__name'), 'id'
+        )
+        sellers = grouped(
+            queryset.filter(self.where('seller')),
+            'sellers', 'seller_id', F('seller__username'), 'id'
+        )
+        options = grouped(
+            ProductVariant.options.through.objects.filter(
+                productvariant__is_active=True,
+                productvariant__product__in=queryset.filter(self.where('options')).values('id')
+            ),
+            'options', 'productvariantoption_id',
+            Concat(
+                'productvariantoption__variant_type__name', Value(': '), 'productvariantoption__value',
+                output_field=CharField()
+            ),
+            'productvariant__product'
+        )
+
+        facets = {'categories': [], 'sellers': [], 'options': []}
+        for row in categories.union(sellers, options, all=True):
+            facets[row['facet']].append({'id': row['key'], 'name': row['label'], 'count': row['count']})
+        for name, values in facets.items():
+            values.sort(key=lambda value: (-value['count'], value['name']))
+            facets[name] = values[:FACET_VALUE_LIMIT]
+        return facets
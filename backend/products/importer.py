@@ -0,0 +1,235 @@
+import csv
+import io
+import json
+import logging
+import threading
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache import invalidate_catalog, invalidate_category_tree
+from .models import Category, Product, ProductImportJob, ProductVariant, ProductVariantOption
+from .serializers import ProductImportSerializer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    'CHUNK_SIZE': 1000,
+    'BACKGROUND': True,
+    'MAX_REPORTED_ERRORS': 1000,
+}
+
+
+def get_options():
+    return {**DEFAULT_OPTIONS, **getattr(settings, 'PRODUCT_IMPORT', {})}
+
+
+def read_rows(file, file_format):
+    """
+    Stream ``(row_number, data, errors)`` triples from a binary file object.
+
+    Only one line is held at a time. A row that cannot be parsed is yielded
+    with ``data`` None and its ``errors`` instead of stopping the import.
+    """
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        for row_number, row in enumerate(reader, start=2):
+            # Blank cells mean "not given", the same as a missing JSON key
+            data = {key: value for key, value in row.items() if key and value not in ('', None)}
+            if 'variants' in data:
+                try:
+                    data['variants'] = json.loads(data['variants'])
+                except ValueError:
+                    yield row_number, None, {'variants': ['Must be a JSON list of variants']}
+                    continue
+            yield row_number, data, None
+    else:
+        for row_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                yield row_number, None, {'non_field_errors': ['Invalid JSON']}
+                continue
+            if not isinstance(data, dict):
+                yield row_number, None, {'non_field_errors': ['Each line must be a JSON object']}
+                continue
+            yield row_number, data, None
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_chunk(rows, context, seen_skus):
+    """
+    Validate a chunk of rows; returns (valid rows, per-row errors).
+
+    Field rules come from ProductImportSerializer. SKUs are checked against
+    the earlier rows of the file and the database with one query per chunk.
+    """
+    # One serializer validates every row, so its fields are built once rather than per row
+    serializer = ProductImportSerializer(context=context)
+    valid = []
+    errors = []
+    for row_number, data, parse_errors in rows:
+        if parse_errors:
+            errors.append({'row': row_number, 'errors': parse_errors})
+            continue
+        try:
+            valid.append((row_number, serializer.run_validation(data)))
+        except serializers.ValidationError as e:
+            errors.append({'row': row_number, 'errors': e.detail})
+
+    skus = [variant['sku'] for _, data in valid for variant in data.get('variants', [])]
+    taken = set(ProductVariant.objects.filter(sku__in=skus).values_list('sku', flat=True)) if skus else set()
+
+    accepted = []
+    for row_number, data in valid:
+        row_skus = [variant['sku'] for variant in data.get('variants', [])]
+        duplicates = sorted(
+            sku for sku in set(row_skus)
+            if sku in taken or sku in seen_skus or row_skus.count(sku) > 1
+        )
+        if duplicates:
+            errors.append({'row': row_number, 'errors': {'variants': [f"SKU already exists: {', '.join(duplicates)}"]}})
+            continue
+        seen_skus.update(row_skus)
+        accepted.append((row_number, data))
+    return accepted, errors
+
+
+def save_chunk(seller, rows):
+    """
+    Insert a chunk of validated rows with one bulk insert per table.
+
+    Runs in its own savepoint, so a failing chunk is rolled back on its own
+    without losing the chunks already imported.
+    """
+    with transaction.atomic():
+        products = Product.objects.bulk_create([
+            Product(
+                seller=seller,
+                category_id=data.get('category'),
+                **{key: value for key, value in data.items() if key not in ('category', 'variants', 'dimensions')}
+            )
+            for _, data in rows
+        ])
+
+        variants = []
+        variant_options = []
+        for product, (_, data) in zip(products, rows):
+            for variant_data in data.get('variants', []):
+                variant_data = dict(variant_data)
+                option_ids = variant_data.pop('options', [])
+                variants.append(ProductVariant(product=product, **variant_data))
+                variant_options.append(option_ids)
+        variants = ProductVariant.objects.bulk_create(variants)
+
+        Through = ProductVariant.options.through
+        Through.objects.bulk_create([
+            Through(productvariant_id=variant.id, productvariantoption_id=option_id)
+            for variant, option_ids in zip(variants, variant_options)
+            for option_id in set(option_ids)
+        ])
+    return len(products)
+
+
+def import_products(file, file_format, seller, chunk_size=None, on_progress=None):
+    """
+    Import products for ``seller`` from an open binary ``file``.
+
+    Rows are read, validated and inserted one chunk at a time, so memory
+    use does not grow with the file. ``on_progress`` is called after every
+    chunk with the running totals and that chunk's row errors. Returns the
+    final totals.
+    """
+    options = get_options()
+    chunk_size = chunk_size or options['CHUNK_SIZE']
+    context = {
+        'category_ids': set(Category.objects.values_list('id', flat=True)),
+        'option_ids': set(ProductVariantOption.objects.values_list('id', flat=True)),
+    }
+    seen_skus = set()
+    totals = {'processed_rows': 0, 'created_count': 0, 'error_count': 0}
+
+    try:
+        for chunk in chunked(read_rows(file, file_format), chunk_size):
+            rows, errors = validate_chunk(chunk, context, seen_skus)
+            if rows:
+                try:
+                    totals['created_count'] += save_chunk(seller, rows)
+                except DatabaseError as e:
+                    # Typically a SKU taken by a concurrent writer since validation
+                    errors.extend(
+                        {'row': row_number, 'errors': {'non_field_errors': [f"Could not be saved: {e}"]}}
+                        for row_number, _ in rows
+                    )
+            errors.sort(key=lambda error: error['row'])
+            totals['processed_rows'] += len(chunk)
+            totals['error_count'] += len(errors)
+            if on_progress is not None:
+                on_progress(totals, errors)
+    finally:
+        if totals['created_count']:
+            # bulk_create sends no model signals
+            invalidate_catalog()
+            invalidate_category_tree()
+    return totals
+
+
+def run_import(job_id):
+    """
+    Process a ProductImportJob, recording progress on it after every chunk
+    """
+    job = ProductImportJob.objects.select_related('seller').get(pk=job_id)
+    ProductImportJob.objects.filter(pk=job.pk).update(status='running', started_at=timezone.now())
+    max_errors = get_options()['MAX_REPORTED_ERRORS']
+    reported = []
+
+    def record_progress(totals, errors):
+        reported.extend(errors[:max_errors - len(reported)])
+        ProductImportJob.objects.filter(pk=job.pk).update(errors=reported, **totals)
+
+    try:
+        with job.file.open('rb') as file:
+            import_products(file, job.file_format, job.seller, on_progress=record_progress)
+    except Exception as e:
+        logger.exception(f"Product import {job.pk} failed")
+        ProductImportJob.objects.filter(pk=job.pk).update(
+            status='failed', message=str(e), finished_at=timezone.now()
+        )
+    else:
+        ProductImportJob.objects.filter(pk=job.pk).update(status='completed', finished_at=timezone.now())
+
+
+def _run_in_thread(job_id):
+    try:
+        run_import(job_id)
+    finally:
+        # The thread owns its own database connection
+        close_old_connections()
+
+
+def start_import(job):
+    """
+    Process ``job`` once the transaction that created it commits, in a
+    background thread unless PRODUCT_IMPORT['BACKGROUND'] is off
+    """
+    def start():
+        if get_options()['BACKGROUND']:
+            threading.Thread(target=_run_in_thread, args=(job.pk,), name=f'product-import-{job.pk}', daemon=True).start()
+        else:
+            run_import(job.pk)
+
+    transaction.on_commit(start)
@@ -0,0 +1,138 @@
+import random
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import InventoryShard, Product, ProductVariant
+
+# Most counter rows one product or variant can be split across
+MAX_STOCK_SHARDS = 64
+
+
+def shard_filter(model, row_id):
+    """
+    Filter kwargs selecting the shards of a product or variant row
+    """
+    if model is ProductVariant:
+        return {'variant_id': row_id}
+    return {'product_id': row_id, 'variant__isnull': True}
+
+
+def held_units(model, row_id):
+    """
+    Units of a product or variant held by cart reservations
+    """
+    return model.objects.filter(id=row_id).aggregate(total=Sum('reservations__quantity'))['total'] or 0
+
+
+def shard_stock(model, row_id):
+    """
+    Unreserved stock of a sharded row: the sum of its shards
+    """
+    return InventoryShard.objects.filter(**shard_filter(model, row_id)).aggregate(total=Sum('stock'))['total'] or 0
+
+
+def split(total, shards):
+    """
+    Spread ``total`` units as evenly as possible over ``shards`` counters
+    """
+    base, extra = divmod(total, shards)
+    return [base + (1 if index < extra else 0) for index in range(shards)]
+
+
+def take_from_shards(model, row_id, quantity):
+    """
+    Take ``quantity`` units from the shards of a row; returns whether it could.
+
+    Each step locks one random non-empty shard with SKIP LOCKED, so
+    concurrent sales of the same item spread over its shards instead of
+    queueing on one row. Only when every shard with stock left is locked
+    does it wait for one, in shard order. If the shards cannot cover the
+    quantity, nothing is taken. Must be called inside a transaction.
+    """
+    shards = InventoryShard.objects.filter(**shard_filter(model, row_id), stock__gt=0)
+    savepoint = transaction.savepoint()
+    taken = []
+    remaining = quantity
+    while remaining:
+        shard = shards.exclude(id__in=taken).select_for_update(skip_locked=True).order_by('?').first()
+        if shard is None:
+            # Every shard with stock left is busy; wait for the next one
+            shard = shards.exclude(id__in=taken).select_for_update().order_by('shard').first()
+        if shard is None:
+            transaction.savepoint_rollback(savepoint)
+            return False
+        units = min(remaining, shard.stock)
+        InventoryShard.objects.filter(id=shard.id).update(stock=F('stock') - units)
+        taken.append(shard.id)
+        remaining -= units
+    transaction.savepoint_commit(savepoint)
+    return True
+
+
+def give_back_to_shards(model, row_id, shard_count, quantity):
+    """
+    Return ``quantity`` units to a random shard of a row with one UPDATE
+    """
+    InventoryShard.objects.filter(**shard_filter(model, row_id), shard=random.randrange(shard_count)).update(
+        stock=F('stock') + quantity
+    )
+
+
+def rebalance(model, row_id, total=None):
+    """
+    Spread a sharded row's unreserved stock evenly over its shards again,
+    and refresh the row's ``stock`` and ``reserved`` columns from them.
+
+    ``total`` sets the row's stock, held units included, instead of
+    keeping what the shards hold; it is how stock edits reach the shards.
+    """
+    with transaction.atomic():
+        shards = list(InventoryShard.objects.select_for_update().filter(**shard_filter(model, row_id)).order_by('shard'))
+        if not shards:
+            return
+        held = held_units(model, row_id)
+        available = sum(shard.stock for shard in shards) if total is None else max(total - held, 0)
+        InventoryShard.objects.filter(id__in=[shard.id for shard in shards]).update(stock=Case(
+            *(When(id=shard.id, then=Value(stock)) for shard, stock in zip(shards, split(available, len(shards)))),
+            output_field=IntegerField()
+        ))
+        model.objects.filter(id=row_id).update(stock=available + held, reserved=held)
+
+
+def rebalance_all():
+    """
+    Rebalance every sharded product and variant; returns how many
+    """
+    count = 0
+    for model in (Product, ProductVariant):
+        for row_id in model.objects.filter(stock_shards__gt=0).values_list('id', flat=True):
+            rebalance(model, row_id)
+            count += 1
+    return count
+
+
+def set_stock_shards(model, row_id, shards):
+    """
+    Move a row's stock into ``shards`` counter rows, re-split it over a new
+    number of shards, or with 0 move it back into the row's stock column.
+    """
+    if not 0 <= shards <= MAX_STOCK_SHARDS:
+        raise ValueError(f'shards must be between 0 and {MAX_STOCK_SHARDS}')
+    with transaction.atomic():
+        row = model.objects.select_for_update().get(id=row_id)
+        existing = InventoryShard.objects.select_for_update().filter(**shard_filter(model, row_id))
+        held = held_units(model, row_id)
+        if row.stock_shards:
+            available = sum(existing.values_list('stock', flat=True))
+        else:
+            available = max(row.stock - row.reserved, 0)
+
+        existing.delete()
+        product_id = row.product_id if model is ProductVariant else row.id
+        variant_id = row.id if model is ProductVariant else None
+        InventoryShard.objects.bulk_create([
+            InventoryShard(product_id=product_id, variant_id=variant_id, shard=index, stock=stock)
+            for index, stock in enumerate(split(available, shards) if shards else [])
+        ])
+        model.objects.filter(id=row_id).update(stock_shards=shards, stock=available + held, reserved=held)
@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from rest_framework import serializers
+
+from orders.checkout import decrement_stock, lock_rows
+from products.inventory import set_stock_shards, take_from_shards
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent sales of one product kept in a single stock row and in sharded counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=32, help='Concurrent sellers, one connection each')
+        parser.add_argument('--sales', type=int, default=100, help='One-unit sales per worker')
+        parser.add_argument('--shards', type=int, default=16, help='Shards for the sharded run')
+        parser.add_argument(
+            '--work-ms', type=float, default=5.0,
+            help='Time each sale keeps its transaction open after taking stock, like a checkout writing its order'
+        )
+
+    def run(self, product, sell, options):
+        def worker(_):
+            sold = failed = 0
+            try:
+                for _ in range(options['sales']):
+                    try:
+                        with transaction.atomic():
+                            sell(product.id)
+                            time.sleep(options['work_ms'] / 1000)
+                        sold += 1
+                    except (DatabaseError, serializers.ValidationError):
+                        failed += 1
+            finally:
+                connection.close()
+            return sold, failed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = list(executor.map(worker, range(options['workers'])))
+        elapsed = time.perf_counter() - started
+        return sum(sold for sold, _ in results), sum(failed for _, failed in results), elapsed
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        seller, _ = User.objects.get_or_create(
+            username='inventory-benchmark',
+            defaults={'email': 'inventory-benchmark@example.com', 'role': 'seller'}
+        )
+        stock = options['workers'] * options['sales']
+
+        def sell_single_row(product_id):
+            # The checkout path for an unsharded product
+            lock_rows(Product, [product_id])
+            decrement_stock(Product, {product_id: 1})
+
+        def sell_sharded(product_id):
+            if not take_from_shards(Product, product_id, 1):
+                raise serializers.ValidationError('Out of stock')
+
+        for label, sell, shards in [('single row', sell_single_row, 0), ('sharded', sell_sharded, options['shards'])]:
+            # Workers use their own connections, so the product is committed up front
+            product = Product.objects.create(
+                name='Inventory benchmark', description='Synthetic product', price='10.00', stock=stock, seller=seller
+            )
+            if shards:
+                set_stock_shards(Product, product.id, shards)
+            try:
+                sold, failed, elapsed = self.run(product, sell, options)
+            finally:
+                product.delete()
+            self.stdout.write(
+                f"{label}: {sold} sales in {elapsed:.2f}s ({sold / elapsed:.0f}/s), {failed} failed, "
+                f"{options['workers']} workers, {options['work_ms']}ms per transaction"
+            )
@@ -0,0 +1,69 @@
+import io
+import json
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.importer import import_products
+from products.models import ProductVariantOption, ProductVariantType
+
+
+class Command(BaseCommand):
+    help = 'Import synthetic products through the bulk importer and report time and peak memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Number of synthetic products')
+        parser.add_argument('--variants', type=int, default=2, help='Variants per product')
+        parser.add_argument('--chunk-size', type=int, help='Rows validated and inserted together')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the imported products instead of rolling them back'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+
+        with transaction.atomic():
+            seller, _ = User.objects.get_or_create(
+                username='import-benchmark',
+                defaults={'email': 'import-benchmark@example.com', 'role': 'seller'}
+            )
+            variant_type, _ = ProductVariantType.objects.get_or_create(name='Benchmark size')
+            option_ids = [
+                ProductVariantOption.objects.get_or_create(variant_type=variant_type, value=str(size))[0].id
+                for size in range(options['variants'])
+            ]
+
+            # Build the NDJSON file in memory; it is the import that is measured
+            file = io.BytesIO()
+            run = time.time_ns()
+            for row in range(options['rows']):
+                file.write(json.dumps({
+                    'name': f'Benchmark product {row}',
+                    'description': 'Synthetic product for the import benchmark',
+                    'price': '19.99',
+                    'stock': 10,
+                    'variants': [
+                        {'sku': f'bench-{run}-{row}-{index}', 'stock': 5, 'options': [option_id]}
+                        for index, option_id in enumerate(option_ids)
+                    ],
+                }).encode('utf-8') + b'\n')
+            file.seek(0)
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            totals = import_products(file, 'ndjson', seller, chunk_size=options['chunk_size'])
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['created_count']} of {totals['processed_rows']} rows in {elapsed:.1f}s "
+            f"({totals['processed_rows'] / elapsed:.0f} rows/s), peak traced memory {peak / 1024 / 1024:.1f} MiB"
+        ))
@@ -0,0 +1,52 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from products.models import Product, ProductVariantOption, ProductVariantType
+from products.variants import generate_variants
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic variant matrix and report time and query count'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', type=int, default=3, help='Number of variant types')
+        parser.add_argument('--options', type=int, default=10, help='Options per variant type')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the generated variants instead of rolling them back'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+
+        with transaction.atomic():
+            seller, _ = User.objects.get_or_create(
+                username='variant-benchmark',
+                defaults={'email': 'variant-benchmark@example.com', 'role': 'seller'}
+            )
+            product = Product.objects.create(
+                name='Variant benchmark', description='Synthetic product', price='10.00', seller=seller
+            )
+            option_groups = []
+            for type_index in range(options['types']):
+                variant_type = ProductVariantType.objects.create(name=f'Benchmark type {type_index}')
+                option_groups.append([
+                    ProductVariantOption.objects.create(variant_type=variant_type, value=str(value)).id
+                    for value in range(options['options'])
+                ])
+
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                variants = list(generate_variants(product, option_groups, f'bench-{time.time_ns()}'))
+            elapsed = time.perf_counter() - started
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(variants)} variants in {elapsed * 1000:.0f}ms with {len(queries)} queries"
+        ))
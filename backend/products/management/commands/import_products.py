@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import import_products
+
+
+class Command(BaseCommand):
+    help = 'Import products for a seller from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--seller', required=True, help='Username of the seller who will own the products')
+        parser.add_argument(
+            '--format', choices=['csv', 'ndjson'],
+            help='File format (default: from the file extension)'
+        )
+        parser.add_argument('--chunk-size', type=int, help='Rows validated and inserted together')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            seller = User.objects.get(username=options['seller'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['seller']}")
+
+        file_format = options['format']
+        if not file_format:
+            if options['path'].lower().endswith('.csv'):
+                file_format = 'csv'
+            elif options['path'].lower().endswith(('.ndjson', '.jsonl')):
+                file_format = 'ndjson'
+            else:
+                raise CommandError('Could not tell the format from the file name; pass --format')
+
+        def report(totals, errors):
+            for error in errors:
+                self.stderr.write(f"Row {error['row']}: {error['errors']}")
+            self.stdout.write(f"{totals['processed_rows']} rows processed, {totals['created_count']} created")
+
+        with open(options['path'], 'rb') as file:
+            totals = import_products(
+                file, file_format, seller, chunk_size=options['chunk_size'],
+                on_progress=report if options['verbosity'] > 1 else None
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['created_count']} of {totals['processed_rows']} rows "
+            f"({totals['error_count']} rejected)"
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.inventory import MAX_STOCK_SHARDS, rebalance_all, set_stock_shards
+from products.models import Product, ProductVariant
+
+
+class Command(BaseCommand):
+    help = 'Split the stock of hot products or variants across counter rows, or rebalance their shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', default=[], dest='product_ids',
+                            help='Product id to shard (can be repeated)')
+        parser.add_argument('--variant', type=int, action='append', default=[], dest='variant_ids',
+                            help='Variant id to shard (can be repeated)')
+        parser.add_argument('--shards', type=int,
+                            help=f'Number of shards, up to {MAX_STOCK_SHARDS}; 0 moves the stock back into one row')
+        parser.add_argument('--interval', type=float,
+                            help='Keep running, rebalancing every sharded item every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        targets = [(Product, row_id) for row_id in options['product_ids']]
+        targets += [(ProductVariant, row_id) for row_id in options['variant_ids']]
+        if targets:
+            if options['shards'] is None:
+                raise CommandError('--shards is required with --product or --variant')
+            for model, row_id in targets:
+                try:
+                    set_stock_shards(model, row_id, options['shards'])
+                except (model.DoesNotExist, ValueError) as e:
+                    raise CommandError(f'{model.__name__} {row_id}: {e}')
+            self.stdout.write(self.style.SUCCESS(f"Set {len(targets)} items to {options['shards']} shards"))
+            return
+
+        while True:
+            count = rebalance_all()
+            self.stdout.write(self.style.SUCCESS(f'Rebalanced {count} sharded items'))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
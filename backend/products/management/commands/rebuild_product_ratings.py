@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DecimalField, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from products.cache import invalidate_catalog
+from products.models import Product, Review
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized product rating aggregates from products_review'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product', type=int, action='append', dest='product_ids',
+            help='Only rebuild the given product id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+
+        def aggregate(queryset, expression):
+            return Coalesce(
+                Subquery(queryset.annotate(value=expression).values('value')),
+                Value(0),
+                output_field=IntegerField()
+            )
+
+        rating_sum = aggregate(reviews, Sum('rating'))
+        rating_count = aggregate(reviews, Count('id'))
+        updates = {
+            'rating_sum': rating_sum,
+            'rating_count': rating_count,
+            'rating_average': Coalesce(
+                Cast(rating_sum, FloatField()) / NullIf(rating_count, 0),
+                Value(0),
+                output_field=DecimalField(max_digits=3, decimal_places=2)
+            ),
+        }
+        for rating in range(1, 6):
+            updates[f'rating_{rating}_count'] = aggregate(reviews.filter(rating=rating), Count('id'))
+
+        products = Product.objects.all()
+        if options['product_ids']:
+            products = products.filter(pk__in=options['product_ids'])
+
+        # One set-based UPDATE over all selected products
+        with transaction.atomic():
+            updated = products.update(**updates)
+            invalidate_catalog()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} products'))
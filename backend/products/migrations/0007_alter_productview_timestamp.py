@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_rating_1_count_product_rating_2_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productview',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:08
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The search document is built in the database so every write path
+# (save(), update(), bulk_create, raw SQL, category renames) keeps it current.
+CREATE_SEARCH_TRIGGERS = """
+CREATE OR REPLACE FUNCTION products_product_search_document(p_name text, p_description text, p_category_id bigint)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('english', coalesce(p_name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(p_description, '')), 'B')
+        || setweight(to_tsvector('english', coalesce(
+            (SELECT name FROM products_category WHERE id = p_category_id), '')), 'C')
+$$;
+
+CREATE OR REPLACE FUNCTION products_product_search_vector_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := products_product_search_document(NEW.name, NEW.description, NEW.category_id);
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER products_product_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, description, category_id, search_vector ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector_trigger();
+
+CREATE OR REPLACE FUNCTION products_category_search_vector_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE products_product
+    SET search_vector = products_product_search_document(name, description, category_id)
+    WHERE category_id = NEW.id;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER products_category_search_vector_update
+    AFTER UPDATE OF name ON products_category
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION products_category_search_vector_trigger();
+
+UPDATE products_product
+SET search_vector = products_product_search_document(name, description, category_id);
+
+CREATE INDEX product_search_vector_idx ON products_product USING gin (search_vector);
+"""
+
+DROP_SEARCH_TRIGGERS = """
+DROP INDEX IF EXISTS product_search_vector_idx;
+DROP TRIGGER IF EXISTS products_category_search_vector_update ON products_category;
+DROP FUNCTION IF EXISTS products_category_search_vector_trigger();
+DROP TRIGGER IF EXISTS products_product_search_vector_update ON products_product;
+DROP FUNCTION IF EXISTS products_product_search_vector_trigger();
+DROP FUNCTION IF EXISTS products_product_search_document(text, text, bigint);
+"""
+
+
+def run_on_postgresql(sql):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        # No parameters, so the multi-statement script is sent as-is
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_alter_productview_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_on_postgresql(CREATE_SEARCH_TRIGGERS), run_on_postgresql(DROP_SEARCH_TRIGGERS)),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'status', 'is_active'], name='product_category_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['seller', 'status', 'is_active'], name='product_seller_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.Case(models.When(discount_price__lt=models.F('price'), then=models.F('discount_price')), default=models.F('price'), output_field=models.DecimalField(decimal_places=2, max_digits=10)), models.F('id'), name='product_sale_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['product', 'is_active'], name='variant_product_active_idx'),
+        ),
+    ]
@@ -1,9 +1,103 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
 import uuid
 
+from .cache import catalog_cache
+
+# Stock columns also changed by conditional UPDATEs (checkout, cart holds,
+# shard moves); saving a loaded product or variant must not write back a
+# stale value of one it did not change
+STOCK_COUNTER_FIELDS = ('stock', 'reserved', 'stock_shards')
+
+
+def remember_stock_counters(instance):
+    instance._loaded_counters = {
+        name: instance.__dict__[name] for name in STOCK_COUNTER_FIELDS if name in instance.__dict__
+    }
+
+
+def save_without_stock_counters(instance, kwargs):
+    """
+    Leave the stock counters that were not edited since the row was loaded
+    out of a full save; counters that were edited are written as usual
+    """
+    loaded = instance.__dict__.get('_loaded_counters')
+    if instance._state.adding or not loaded or kwargs.get('update_fields') is not None or kwargs.get('force_insert'):
+        return
+    unchanged = {name for name, value in loaded.items() if getattr(instance, name) == value}
+    if not unchanged:
+        return
+    deferred = instance.get_deferred_fields()
+    kwargs['update_fields'] = [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in unchanged and field.attname not in deferred
+    ]
+
+# Breadcrumb paths only change with the category tree, which retires them
+BREADCRUMB_CACHE_TIMEOUT = 24 * 60 * 60
+
+# SQL counterpart of Product.sale_price: the discount price while it undercuts
+# the regular price, otherwise the regular price
+SALE_PRICE = Case(
+    When(discount_price__lt=F('price'), then=F('discount_price')),
+    default=F('price'),
+    output_field=models.DecimalField(max_digits=10, decimal_places=2)
+)
+
+
+def shard_total(model):
+    """
+    Subquery summing the InventoryShard stock of each ``model`` row
+    (Product or ProductVariant)
+    """
+    if model is ProductVariant:
+        shards = InventoryShard.objects.filter(variant=OuterRef('pk')).values('variant')
+    else:
+        shards = InventoryShard.objects.filter(product=OuterRef('pk'), variant__isnull=True).values('product')
+    return Coalesce(Subquery(shards.order_by().annotate(total=Sum('stock')).values('total')), 0)
+
+
+def held_total(model):
+    """
+    Subquery summing the units of each ``model`` row held by cart reservations
+    """
+    relation = model._meta.get_field('reservations')
+    column = relation.field.name
+    held = relation.related_model.objects.filter(**{column: OuterRef('pk')}).values(column)
+    return Coalesce(Subquery(held.order_by().annotate(total=Sum('quantity')).values('total')), 0)
+
+
+def current_stock_value(model):
+    """
+    SQL counterpart of ``current_stock`` for ``model`` rows: the stock
+    column, or for a sharded row its shards and the units held from them
+    """
+    return Case(
+        When(stock_shards=0, then=F('stock')),
+        default=shard_total(model) + held_total(model),
+        output_field=models.IntegerField()
+    )
+
+
+def available_stock_value(model):
+    """
+    SQL counterpart of ``available_stock`` for ``model`` rows: the stock
+    not held by a cart reservation, which for a sharded row is what its
+    shards hold
+    """
+    return Case(
+        When(stock_shards=0, then=Greatest(F('stock') - F('reserved'), Value(0))),
+        default=shard_total(model),
+        output_field=models.IntegerField()
+    )
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
@@ -20,11 +114,130 @@ class Category(models.Model):
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        # Keep the closure table in step with this category's position in the tree
+        with transaction.atomic():
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                CategoryClosure.link(self)
+                return
+            
+            previous_parent_id = Category.objects.filter(pk=self.pk).values_list('parent_id', flat=True).first()
+            if self.parent_id != previous_parent_id and self.parent_id is not None:
+                if CategoryClosure.objects.filter(ancestor_id=self.pk, descendant_id=self.parent_id).exists():
+                    raise ValueError("A category cannot be moved under itself or one of its subcategories")
+            super().save(*args, **kwargs)
+            if self.parent_id != previous_parent_id:
+                CategoryClosure.move(self)
+    
+    def get_descendants(self, include_self=True):
+        """Get all categories below this one, at any depth, in one query"""
+        descendants = Category.objects.filter(ancestor_links__ancestor=self)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+    
+    def get_ancestors(self, include_self=False):
+        """Get the categories above this one, root first, in one query"""
+        ancestors = Category.objects.filter(descendant_links__descendant=self).order_by('-descendant_links__depth')
+        if not include_self:
+            ancestors = ancestors.exclude(pk=self.pk)
+        return ancestors
+    
     def get_full_path(self):
         """Get the full category path (including parent categories)"""
-        if self.parent:
-            return f"{self.parent.get_full_path()} > {self.name}"
-        return self.name
+        breadcrumb = CategoryClosure.breadcrumbs([self.pk]).get(self.pk) or [{'id': self.pk, 'name': self.name}]
+        return ' > '.join(crumb['name'] for crumb in breadcrumb)
+
+
+class CategoryClosure(models.Model):
+    """
+    Transitive closure of the category tree: one row for every category and
+    each of its ancestors, plus the category itself at depth 0. Subtree and
+    ancestor queries become a single indexed join instead of one query per
+    level. Maintained by Category.save() and the category pre_delete signal.
+    """
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+    
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            # Ancestor lookups, walked in depth order for breadcrumbs
+            models.Index(fields=['descendant', 'depth'], name='category_closure_depth_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor_id} > {self.descendant_id} ({self.depth})"
+    
+    @classmethod
+    def link(cls, category):
+        """
+        Add the rows for a newly created category below its parent's ancestors
+        """
+        rows = [cls(ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+        if category.parent_id:
+            rows.extend(
+                cls(ancestor_id=ancestor_id, descendant_id=category.pk, depth=depth + 1)
+                for ancestor_id, depth in cls.objects.filter(
+                    descendant_id=category.parent_id
+                ).values_list('ancestor_id', 'depth')
+            )
+        cls.objects.bulk_create(rows)
+    
+    @classmethod
+    def detach(cls, category):
+        """
+        Cut the subtree rooted at ``category`` off from the categories above it
+        """
+        subtree = cls.objects.filter(ancestor_id=category.pk).values('descendant_id')
+        cls.objects.filter(descendant_id__in=subtree).exclude(ancestor_id__in=subtree).delete()
+    
+    @classmethod
+    def move(cls, category):
+        """
+        Re-link the subtree rooted at ``category`` under its current parent
+        """
+        cls.detach(category)
+        if not category.parent_id:
+            return
+        subtree = list(cls.objects.filter(ancestor_id=category.pk).values_list('descendant_id', 'depth'))
+        ancestors = list(cls.objects.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth'))
+        cls.objects.bulk_create([
+            cls(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + descendant_depth + 1)
+            for ancestor_id, ancestor_depth in ancestors
+            for descendant_id, descendant_depth in subtree
+        ])
+    
+    @classmethod
+    def breadcrumbs(cls, category_ids):
+        """
+        Get the root-first path of each category as {id: [{'id', 'name'}, ...]}.
+        
+        Paths are cached under the generation of the 'categories' catalog
+        scope, so any category change (a rename or a move) retires them all;
+        the uncached ones are loaded together in one query.
+        """
+        generation = catalog_cache.get_generations(['categories'])[0]
+        keys = {category_id: f"category:breadcrumb:{generation}:{category_id}" for category_id in category_ids}
+        cached = catalog_cache.cache.get_many(keys.values())
+        paths = {category_id: cached[key] for category_id, key in keys.items() if key in cached}
+        
+        missing = [category_id for category_id in keys if category_id not in paths]
+        if missing:
+            loaded = {category_id: [] for category_id in missing}
+            for descendant_id, ancestor_id, name in cls.objects.filter(
+                descendant_id__in=missing
+            ).order_by('descendant_id', '-depth').values_list('descendant_id', 'ancestor_id', 'ancestor__name'):
+                loaded[descendant_id].append({'id': ancestor_id, 'name': name})
+            loaded = {category_id: path for category_id, path in loaded.items() if path}
+            catalog_cache.cache.set_many(
+                {keys[category_id]: path for category_id, path in loaded.items()},
+                BREADCRUMB_CACHE_TIMEOUT
+            )
+            paths.update(loaded)
+        return paths
 
 
 class Product(models.Model):
@@ -39,6 +252,11 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, validators=[MinValueValidator(0)])
     stock = models.PositiveIntegerField(default=0)
+    # Units held by active cart reservations (see carts/reservations.py)
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    # Number of InventoryShard rows holding the stock of a hot product; 0 keeps
+    # it in the stock column (see products/inventory.py)
+    stock_shards = models.PositiveSmallIntegerField(default=0, editable=False)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='products')
     seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='products')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -50,15 +268,81 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     
+    # Denormalized review aggregates, maintained by Review.save() and review deletion
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_average = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    
+    # Weighted name/description/category name document for full-text search.
+    # On PostgreSQL it is kept current by database triggers and GIN-indexed
+    # (see migration 0008_product_search_vector); elsewhere it stays empty.
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Matches the keyset pagination order (-created_at, id)
+            models.Index(fields=['-created_at', 'id'], name='product_created_id_idx'),
+            # Backs sorting and filtering the product list by rating
+            models.Index(fields=['-rating_average', 'id'], name='product_rating_idx'),
+            # Faceted filtering: equality filters first, so a category or
+            # seller facet combined with the status filters is one range scan
+            models.Index(fields=['category', 'status', 'is_active'], name='product_category_status_idx'),
+            models.Index(fields=['seller', 'status', 'is_active'], name='product_seller_status_idx'),
+            # Price range filters compare against the effective sale price
+            models.Index(SALE_PRICE, F('id'), name='product_sale_price_idx'),
+        ]
     
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        save_without_stock_counters(self, kwargs)
+        super().save(*args, **kwargs)
+        remember_stock_counters(self)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored category so a move can be detected after save
+        if 'category_id' in instance.__dict__:
+            instance._loaded_category_id = instance.category_id
+        # Remember the stored stock counters so edits to them can be told apart
+        remember_stock_counters(instance)
+        return instance
+    
     @property
     def is_in_stock(self):
-        return self.stock > 0
+        return self.current_stock > 0
+    
+    @property
+    def current_stock(self):
+        """
+        Stock on hand, held units included. The stock column of a sharded
+        product is only a snapshot, so its stock is counted from the shards.
+        """
+        if 'current_stock_value' in self.__dict__:
+            # Annotated by a list queryset
+            return self.current_stock_value
+        if self.stock_shards:
+            return self.available_stock + (self.reservations.aggregate(total=Sum('quantity'))['total'] or 0)
+        return self.stock
+    
+    @property
+    def available_stock(self):
+        """Stock that is not held by a cart reservation"""
+        if 'available_stock_value' in self.__dict__:
+            # Annotated by a list queryset
+            return self.available_stock_value
+        if self.stock_shards:
+            # Shards hold exactly the units that are not held
+            return self.inventory_shards.filter(variant__isnull=True).aggregate(total=Sum('stock'))['total'] or 0
+        return max(self.stock - self.reserved, 0)
     
     @property
     def is_on_sale(self):
@@ -92,15 +376,47 @@ class Product(models.Model):
     @property
     def average_rating(self):
         """Calculate the average rating for the product"""
-        reviews = self.reviews.all()
-        if not reviews:
+        if not self.rating_count:
             return 0
-        return sum(review.rating for review in reviews) / reviews.count()
+        return self.rating_sum / self.rating_count
     
     @property
     def review_count(self):
         """Get the number of reviews for the product"""
-        return self.reviews.count()
+        return self.rating_count
+    
+    @property
+    def rating_histogram(self):
+        """Get the number of reviews for each star rating"""
+        return {rating: getattr(self, f'rating_{rating}_count') for rating in range(1, 6)}
+    
+    @classmethod
+    def update_rating_aggregates(cls, product_id, added=None, removed=None):
+        """
+        Apply a review rating change to the stored aggregates in a single UPDATE.
+        Pass the new rating as ``added`` and/or the previous one as ``removed``.
+        """
+        sum_delta = (added or 0) - (removed or 0)
+        count_delta = (1 if added else 0) - (1 if removed else 0)
+        rating_sum = F('rating_sum') + sum_delta
+        rating_count = F('rating_count') + count_delta
+        
+        updates = {
+            'rating_sum': rating_sum,
+            'rating_count': rating_count,
+            'rating_average': Coalesce(
+                Cast(rating_sum, models.FloatField()) / NullIf(rating_count, 0),
+                Value(0),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2)
+            ),
+        }
+        if added:
+            updates[f'rating_{added}_count'] = F(f'rating_{added}_count') + 1
+        if removed:
+            field = f'rating_{removed}_count'
+            updates[field] = updates.get(field, F(field)) - 1
+        
+        cls.objects.filter(pk=product_id).update(**updates)
 
 
 class ProductImage(models.Model):
@@ -135,13 +451,32 @@ class Review(models.Model):
     
     def __str__(self):
         return f"Review by {self.user.username} for {self.product.name}"
+    
+    def save(self, *args, **kwargs):
+        # Keep the product's rating aggregates in step with this review
+        with transaction.atomic():
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                Product.update_rating_aggregates(self.product_id, added=self.rating)
+                return
+            
+            previous = Review.objects.select_for_update().filter(pk=self.pk).values('product_id', 'rating').first()
+            super().save(*args, **kwargs)
+            if previous is None:
+                Product.update_rating_aggregates(self.product_id, added=self.rating)
+            elif previous['product_id'] != self.product_id:
+                Product.update_rating_aggregates(previous['product_id'], removed=previous['rating'])
+                Product.update_rating_aggregates(self.product_id, added=self.rating)
+            elif previous['rating'] != self.rating:
+                Product.update_rating_aggregates(self.product_id, added=self.rating, removed=previous['rating'])
 
 
 class ProductView(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='views')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     session_id = models.CharField(max_length=100, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the view is recorded, which can precede the batched insert
+    timestamp = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-timestamp']
@@ -152,6 +487,44 @@ class ProductView(models.Model):
         return f"Anonymous view for {self.product.name}"
 
 
+class ProductImportJob(models.Model):
+    """
+    A seller's bulk product import from an uploaded CSV or NDJSON file,
+    processed in the background (see products/importer.py). Counters are
+    updated after every chunk so clients can poll for progress.
+    """
+    FORMAT_CHOICES = (
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='product_imports')
+    file = models.FileField(upload_to='imports/')
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    # Per-row errors as [{'row': n, 'errors': {...}}], capped in size; error_count has the total
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Import {self.id} by {self.seller.username} ({self.status})"
+
+
 class ProductVariantType(models.Model):
     """
     Represents a type of variant (e.g., Size, Color)
@@ -185,13 +558,54 @@ class ProductVariant(models.Model):
     sku = models.CharField(max_length=100, unique=True)
     price_adjustment = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     stock = models.PositiveIntegerField(default=0)
+    # Units held by active cart reservations (see carts/reservations.py)
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    # Number of InventoryShard rows holding the stock of a hot variant (see products/inventory.py)
+    stock_shards = models.PositiveSmallIntegerField(default=0, editable=False)
     weight = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     is_active = models.BooleanField(default=True)
     
+    class Meta:
+        indexes = [
+            # Backs the "has an active variant with option X" facet filter
+            models.Index(fields=['product', 'is_active'], name='variant_product_active_idx'),
+        ]
+    
     def __str__(self):
         options_str = ", ".join([str(option) for option in self.options.all()])
         return f"{self.product.name} - {options_str}"
     
+    def save(self, *args, **kwargs):
+        save_without_stock_counters(self, kwargs)
+        super().save(*args, **kwargs)
+        remember_stock_counters(self)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored stock counters so edits to them can be told apart
+        remember_stock_counters(instance)
+        return instance
+    
+    @property
+    def current_stock(self):
+        """Stock on hand, held units included (see Product.current_stock)"""
+        if 'current_stock_value' in self.__dict__:
+            return self.current_stock_value
+        if self.stock_shards:
+            return self.available_stock + (self.reservations.aggregate(total=Sum('quantity'))['total'] or 0)
+        return self.stock
+    
+    @property
+    def available_stock(self):
+        """Stock that is not held by a cart reservation"""
+        if 'available_stock_value' in self.__dict__:
+            return self.available_stock_value
+        if self.stock_shards:
+            # Shards hold exactly the units that are not held
+            return self.inventory_shards.aggregate(total=Sum('stock'))['total'] or 0
+        return max(self.stock - self.reserved, 0)
+    
     @property
     def price(self):
         """Calculate the final price for this variant"""
@@ -206,6 +620,36 @@ class ProductVariant(models.Model):
         return self.product.discount_price + self.price_adjustment
 
 
+class InventoryShard(models.Model):
+    """
+    One of the counter rows holding the unreserved stock of a product or
+    variant in sharded inventory mode, so concurrent sales of one hot item
+    update different rows. Product shards have no variant.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='inventory_shards')
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='inventory_shards'
+    )
+    shard = models.PositiveSmallIntegerField()
+    stock = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'shard'], condition=models.Q(variant__isnull=True),
+                name='inventory_shard_product_uniq'
+            ),
+            models.UniqueConstraint(
+                fields=['variant', 'shard'], condition=models.Q(variant__isnull=False),
+                name='inventory_shard_variant_uniq'
+            ),
+        ]
+    
+    def __str__(self):
+        owner = self.variant.sku if self.variant_id else self.product.name
+        return f"Shard {self.shard} of {owner}: {self.stock}"
+
+
 class Wishlist(models.Model):
     """
     Represents a user's wishlist
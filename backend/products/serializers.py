@@ -1,13 +1,15 @@
 from rest_framework import serializers
-from django.db.models import Avg
+from django.db import transaction
+from django.db.models import Prefetch
 from typing import Dict, Any, Optional, List, Union
 from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 from decimal import Decimal
 from .models import (
-    Product, ProductVariant, ProductImage, Category, Review,
-    ProductVariantType, ProductVariantOption, Wishlist, WishlistItem
+    Product, ProductVariant, ProductImage, ProductImportJob, Category, CategoryClosure, Review,
+    ProductVariantType, ProductVariantOption, Wishlist, WishlistItem, available_stock_value, current_stock_value
 )
+from .variants import get_variant_index
 
 # Import the QuestionSerializer for product questions
 try:
@@ -17,6 +19,16 @@ except ImportError:
     Question = None
 
 
+class StockField(serializers.IntegerField):
+    """
+    Stock on hand, read through ``current_stock`` so sharded products and
+    variants report their shards rather than the snapshot in their stock column
+    """
+
+    def get_attribute(self, instance):
+        return instance.current_stock
+
+
 class ProductVariantOptionSerializer(serializers.ModelSerializer):
     """
     Serializer for product variant options (like "Red" for color, "Large" for size, etc.)
@@ -69,6 +81,14 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name', 'description', 'parent', 'image']
 
+    def validate_parent(self, value):
+        # Moving a category under its own subtree would create a cycle
+        if value is not None and self.instance is not None and CategoryClosure.objects.filter(
+            ancestor=self.instance, descendant=value
+        ).exists():
+            raise serializers.ValidationError("A category cannot be moved under itself or one of its subcategories")
+        return value
+
 
 class ReviewSerializer(serializers.ModelSerializer):
     """
@@ -82,6 +102,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'user', 'user_name', 'rating', 'comment', 'created_at']
         read_only_fields = ['user', 'created_at']
 
+    @transaction.atomic
     def create(self, validated_data):
         # Set the user to the current user
         validated_data['user'] = self.context['request'].user
@@ -110,7 +131,8 @@ class ProductSerializer(serializers.ModelSerializer):
     dimensions = serializers.SerializerMethodField()
     price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
     discount_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.00'), required=False, allow_null=True)
-    stock = serializers.IntegerField(min_value=0)
+    stock = StockField(min_value=0)
+    available_stock = serializers.IntegerField(read_only=True)
     weight = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.00'), required=False, allow_null=True)
     length = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.00'), required=False, allow_null=True)
     width = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.00'), required=False, allow_null=True)
@@ -120,7 +142,7 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = [
             'id', 'name', 'description', 'price', 'discount_price',
-            'stock', 'is_active', 'status', 'created_at', 'updated_at', 
+            'stock', 'available_stock', 'is_active', 'status', 'created_at', 'updated_at', 
             'seller', 'weight', 'length', 'width', 'height', 'dimensions'
         ]
 
@@ -136,6 +158,24 @@ class ProductSerializer(serializers.ModelSerializer):
         } if all([obj.length, obj.width, obj.height]) else None
 
 
+class ProductWithVariantIndexSerializer(ProductSerializer):
+    """
+    Product detail with its variant lookup index, so a client can map a
+    selected option combination to a variant without another request
+    """
+    variant_index = serializers.SerializerMethodField()
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['variant_index']
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_variant_index(self, obj) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the active variants keyed by their sorted option ids joined with "-"
+        """
+        return get_variant_index(obj.id)
+
+
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating and updating products
@@ -183,6 +223,80 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
+class ProductImportVariantSerializer(serializers.Serializer):
+    """
+    Serializer for a variant row nested in a product import.
+
+    SKU uniqueness and option ids are checked for a whole chunk at once by
+    the importer instead of with one query per row.
+    """
+    sku = serializers.CharField(max_length=100)
+    price_adjustment = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('-1000.00'), default=Decimal('0'))
+    stock = serializers.IntegerField(min_value=0, default=0)
+    weight = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=Decimal('0.00'), required=False, allow_null=True)
+    is_active = serializers.BooleanField(default=True)
+    options = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    def validate_options(self, value):
+        option_ids = self.context.get('option_ids')
+        unknown = [option_id for option_id in value if option_ids is not None and option_id not in option_ids]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown variant options: {unknown}")
+        return value
+
+
+class ProductImportSerializer(ProductCreateUpdateSerializer):
+    """
+    Serializer for one row of a bulk product import, with the same rules as
+    creating a product through the API plus its category and variants.
+
+    Categories and variant options are validated against id sets the
+    importer loads once per import (``category_ids`` and ``option_ids`` in
+    the context), so validating a row runs no queries.
+    """
+    category = serializers.IntegerField(required=False, allow_null=True)
+    variants = ProductImportVariantSerializer(many=True, required=False)
+
+    class Meta(ProductCreateUpdateSerializer.Meta):
+        fields = ProductCreateUpdateSerializer.Meta.fields + ['category', 'variants']
+
+    def validate_category(self, value):
+        category_ids = self.context.get('category_ids')
+        if value is not None and category_ids is not None and value not in category_ids:
+            raise serializers.ValidationError(f"Unknown category: {value}")
+        return value
+
+
+class ProductImportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for reporting the progress of a bulk product import
+    """
+    file_format = serializers.ChoiceField(choices=ProductImportJob.FORMAT_CHOICES, required=False)
+
+    class Meta:
+        model = ProductImportJob
+        fields = [
+            'id', 'file', 'file_format', 'status', 'processed_rows', 'created_count',
+            'error_count', 'errors', 'message', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = [
+            'status', 'processed_rows', 'created_count', 'error_count', 'errors',
+            'message', 'created_at', 'started_at', 'finished_at'
+        ]
+
+    def validate(self, attrs):
+        # Infer the format from the file name unless it was given
+        if not attrs.get('file_format'):
+            name = attrs['file'].name.lower()
+            if name.endswith('.csv'):
+                attrs['file_format'] = 'csv'
+            elif name.endswith(('.ndjson', '.jsonl')):
+                attrs['file_format'] = 'ndjson'
+            else:
+                raise serializers.ValidationError({'file_format': "Could not tell the format from the file name; pass csv or ndjson"})
+        return attrs
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
     """
     Serializer for product images
@@ -200,14 +314,15 @@ class ProductVariantSerializer(serializers.ModelSerializer):
     options = ProductVariantOptionSerializer(many=True, read_only=True)
     name = serializers.SerializerMethodField()
     price_adjustment = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('-1000.00'))
-    stock = serializers.IntegerField(min_value=0)
+    stock = StockField(min_value=0)
+    available_stock = serializers.IntegerField(read_only=True)
     weight = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.00'), required=False, allow_null=True)
 
     class Meta:
         model = ProductVariant
         fields = [
             'id', 'product', 'sku', 'price_adjustment', 
-            'stock', 'weight', 'is_active', 'options', 'name'
+            'stock', 'available_stock', 'weight', 'is_active', 'options', 'name'
         ]
         read_only_fields = ['product']
 
@@ -223,31 +338,74 @@ class ProductVariantSerializer(serializers.ModelSerializer):
 class ProductListSerializer(serializers.ModelSerializer):
     """
     Serializer for listing products
+
+    Querysets prepared with ``setup_eager_loading`` carry the image files
+    prefetched, so rendering a page costs a fixed number of queries
+    instead of several per product.
     """
     primary_image = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
+    review_count = serializers.SerializerMethodField()
     seller_name = serializers.CharField(source='seller.username', read_only=True)
     category_details = serializers.SerializerMethodField()
     in_wishlist = serializers.SerializerMethodField()
     dimensions = serializers.SerializerMethodField()
     price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'), read_only=True)
     discount_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.00'), required=False, allow_null=True, read_only=True)
+    stock = StockField(read_only=True)
+    available_stock = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'description', 'price', 'discount_price',
-            'stock', 'is_active', 'status', 'created_at', 'category_details',
-            'primary_image', 'average_rating', 'seller', 'seller_name', 'in_wishlist',
+            'stock', 'available_stock', 'is_active', 'status', 'created_at', 'updated_at', 'category_details',
+            'primary_image', 'average_rating', 'review_count', 'seller', 'seller_name', 'in_wishlist',
             'weight', 'length', 'width', 'height', 'dimensions'
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Prefetch related rows and image files for a product queryset, and
+        annotate its stock on hand and the stock not held in carts
+        """
+        return queryset.select_related('category', 'seller').defer('search_vector').annotate(
+            current_stock_value=current_stock_value(Product),
+            available_stock_value=available_stock_value(Product)
+        ).prefetch_related(
+            Prefetch(
+                'images',
+                queryset=ProductImage.objects.filter(file_type='image'),
+                to_attr='image_files'
+            )
+        )
+
+    def get_wishlisted_ids(self):
+        """
+        Get the ids of all products in the requester's wishlist, loaded once per serializer
+        """
+        if not hasattr(self, '_wishlisted_ids'):
+            request = self.context.get('request')
+            if request and request.user.is_authenticated:
+                self._wishlisted_ids = set(
+                    WishlistItem.objects.filter(
+                        wishlist__user=request.user
+                    ).values_list('product_id', flat=True)
+                )
+            else:
+                self._wishlisted_ids = set()
+        return self._wishlisted_ids
+
     @extend_schema_field(OpenApiTypes.STR)
     def get_primary_image(self, obj) -> Optional[str]:
         """
         Get the primary image URL for the product
         """
-        primary_image = obj.images.filter(file_type='image').first()
+        if hasattr(obj, 'image_files'):
+            primary_image = obj.image_files[0] if obj.image_files else None
+        else:
+            primary_image = obj.images.filter(file_type='image').first()
         if primary_image:
             return primary_image.file.url
         return None
@@ -257,8 +415,14 @@ class ProductListSerializer(serializers.ModelSerializer):
         """
         Calculate the average rating for the product
         """
-        avg_rating = obj.reviews.aggregate(avg=Avg('rating'))['avg']
-        return round(avg_rating, 1) if avg_rating else None
+        return round(obj.average_rating, 1) if obj.rating_count else None
+
+    @extend_schema_field(OpenApiTypes.INT)
+    def get_review_count(self, obj) -> int:
+        """
+        Get the number of reviews for the product
+        """
+        return obj.rating_count
 
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_category_details(self, obj) -> Optional[Dict[str, Any]]:
@@ -274,13 +438,7 @@ class ProductListSerializer(serializers.ModelSerializer):
         """
         Check if the product is in the user's wishlist
         """
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Wishlist.objects.filter(
-                user=request.user,
-                items__product=obj
-            ).exists()
-        return False
+        return obj.id in self.get_wishlisted_ids()
 
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_dimensions(self, obj) -> Dict[str, Optional[float]]:
@@ -301,6 +459,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     variants = ProductVariantSerializer(many=True, read_only=True)
     average_rating = serializers.SerializerMethodField()
+    rating_histogram = serializers.SerializerMethodField()
     seller_name = serializers.CharField(source='seller.username', read_only=True)
     questions = serializers.SerializerMethodField()
     reviews = serializers.SerializerMethodField()
@@ -310,13 +469,15 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     dimensions = serializers.SerializerMethodField()
     price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'), read_only=True)
     discount_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.00'), required=False, allow_null=True, read_only=True)
+    stock = StockField(read_only=True)
+    available_stock = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'description', 'price', 'discount_price',
-            'stock', 'is_active', 'status', 'created_at', 'category_details',
-            'updated_at', 'images', 'variants', 'variant_types', 'average_rating', 'seller',
+            'stock', 'available_stock', 'is_active', 'status', 'created_at', 'category_details',
+            'updated_at', 'images', 'variants', 'variant_types', 'average_rating', 'rating_count', 'rating_histogram', 'seller',
             'seller_name', 'weight', 'length', 'width', 'height', 'dimensions', 'questions', 'reviews', 'in_wishlist'
         ]
 
@@ -325,8 +486,14 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         """
         Calculate the average rating for the product
         """
-        avg_rating = obj.reviews.aggregate(avg=Avg('rating'))['avg']
-        return round(avg_rating, 1) if avg_rating else None
+        return round(obj.average_rating, 1) if obj.rating_count else None
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_rating_histogram(self, obj) -> Dict[str, int]:
+        """
+        Get the number of reviews for each star rating
+        """
+        return {str(rating): count for rating, count in obj.rating_histogram.items()}
 
     @extend_schema_field({'type': 'array', 'items': {'type': 'object'}})
     def get_questions(self, obj) -> List[Dict[str, Any]]:
@@ -472,68 +639,14 @@ class ProductImageCreateSerializer(serializers.ModelSerializer):
         return ProductImage.objects.create(product=product, **validated_data)
 
 
-class ProductSearchSerializer(serializers.ModelSerializer):
+class ProductSearchSerializer(ProductListSerializer):
     """
-    Serializer for search results
+    Serializer for search results; list fields plus the relevance rank
     """
-    primary_image = serializers.SerializerMethodField()
-    seller_name = serializers.CharField(source='seller.username', read_only=True)
-    category_details = serializers.SerializerMethodField()
-    in_wishlist = serializers.SerializerMethodField()
-    dimensions = serializers.SerializerMethodField()
-    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'), read_only=True)
-    discount_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.00'), required=False, allow_null=True, read_only=True)
-
-    class Meta:
-        model = Product
-        fields = [
-            'id', 'name', 'description', 'price', 'discount_price',
-            'stock', 'is_active', 'status', 'category_details',
-            'primary_image', 'seller', 'seller_name', 'weight', 'length', 'width', 'height', 'dimensions', 'in_wishlist'
-        ]
+    rank = serializers.FloatField(read_only=True)
 
-    @extend_schema_field(OpenApiTypes.STR)
-    def get_primary_image(self, obj) -> Optional[str]:
-        """
-        Get the primary image URL for the product
-        """
-        primary_image = obj.images.filter(file_type='image').first()
-        if primary_image:
-            return primary_image.file.url
-        return None
-
-    @extend_schema_field(OpenApiTypes.OBJECT)
-    def get_category_details(self, obj) -> Optional[Dict[str, Any]]:
-        """
-        Get category details if available
-        """
-        if obj.category:
-            return CategorySerializer(obj.category).data
-        return None
-            
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_in_wishlist(self, obj) -> bool:
-        """
-        Check if the product is in the user's wishlist
-        """
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Wishlist.objects.filter(
-                user=request.user,
-                items__product=obj
-            ).exists()
-        return False
-
-    @extend_schema_field(OpenApiTypes.OBJECT)
-    def get_dimensions(self, obj) -> Dict[str, Optional[float]]:
-        """
-        Get dimensions as a dictionary
-        """
-        return {
-            'length': obj.length,
-            'width': obj.width,
-            'height': obj.height
-        } if all([obj.length, obj.width, obj.height]) else None
+    class Meta(ProductListSerializer.Meta):
+        fields = ProductListSerializer.Meta.fields + ['rank']
 
 
 # Wishlist serializers
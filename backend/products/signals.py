@@ -0,0 +1,81 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_catalog, invalidate_categories, invalidate_category_tree, invalidate_products
+from .inventory import rebalance
+from .models import Category, CategoryClosure, Product, ProductImage, ProductVariant, Review
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    """
+    Take a deleted review out of its product's rating aggregates
+    """
+    Product.update_rating_aggregates(instance.product_id, removed=instance.rating)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    invalidate_products(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_tree_on_product_move(sender, instance, created, **kwargs):
+    """
+    The category tree counts products, so it changes when a product is
+    added or moves to another category
+    """
+    if created or instance.__dict__.get('_loaded_category_id', object()) != instance.category_id:
+        invalidate_category_tree()
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+def sync_sharded_stock(sender, instance, created, **kwargs):
+    """
+    The stock column of a sharded product or variant is a snapshot, so an
+    edit to it is passed on to the shards as the new stock level
+    """
+    loaded = instance.__dict__.get('_loaded_counters', {})
+    if instance.stock_shards and instance.stock != loaded.get('stock', instance.stock):
+        rebalance(sender, instance.pk, total=instance.stock)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_tree_on_product_delete(sender, instance, **kwargs):
+    invalidate_category_tree()
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=ProductVariant)
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_product_child(sender, instance, **kwargs):
+    invalidate_products(instance.product_id)
+
+
+@receiver(m2m_changed, sender=ProductVariant.options.through)
+def invalidate_variant_options(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_products(instance.product_id)
+    elif pk_set:
+        # Changed from the option side; pk_set holds variant ids
+        invalidate_products(*ProductVariant.objects.filter(pk__in=pk_set).values_list('product_id', flat=True))
+    else:
+        invalidate_catalog()
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    invalidate_categories()
+
+
+@receiver(pre_delete, sender=Category)
+def detach_category(sender, instance, **kwargs):
+    """
+    The children of a deleted category become roots (parent is SET_NULL),
+    so unlink its subtree from the categories above it
+    """
+    CategoryClosure.detach(instance)
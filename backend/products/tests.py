@@ -1,8 +1,38 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Case, F, Value, When
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
-from rest_framework.test import APIClient
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
-from .models import Category, Product
+from core.pagination import KeysetPagination
+from .cache import catalog_cache
+from .category_tree import get_category_tree
+from .inventory import rebalance, set_stock_shards
+from .serializers import ProductSerializer
+from .models import (
+    Category, CategoryClosure, InventoryShard, Product, ProductImage, ProductVariant, ProductVariantOption,
+    ProductVariantType, ProductView, Review, Wishlist, WishlistItem
+)
+from .view_buffer import ProductViewBuffer
+from .views import SEARCH_RANK_FIELD
+from analytics.activity_buffer import UserActivityBuffer
+from analytics.models import UserActivity
 
 User = get_user_model()
 
@@ -27,3 +57,1177 @@ class ProductTests(TestCase):
         self.assertEqual(Product.objects.count(), 1)
         self.assertEqual(Product.objects.get().name, 'Test Product')
 
+
+
+# These exercise the database path, so bypass the anonymous response cache
+@override_settings(CATALOG_CACHE={'ENABLED': False})
+class ProductPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.category = Category.objects.create(name='Test Category')
+        self.products = [
+            Product.objects.create(
+                name=f'Product {i}',
+                description='Paginated product',
+                price='9.99',
+                stock=10,
+                category=self.category,
+                seller=self.seller
+            )
+            for i in range(25)
+        ]
+
+    def collect_pages(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_list_is_paginated(self):
+        response = self.client.get('/api/products/', {'page_size': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_other_lists_are_not_paginated(self):
+        ProductVariantType.objects.create(name='Size')
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.get('/api/products/variant-types/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([variant_type['name'] for variant_type in response.data], ['Size'])
+
+    def test_cursor_walks_every_product_once(self):
+        ids = self.collect_pages('/api/products/?page_size=7')
+        expected = list(Product.objects.order_by('-created_at', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_ties_on_created_at_are_broken_by_id(self):
+        Product.objects.update(created_at=self.products[0].created_at)
+        ids = self.collect_pages('/api/products/?page_size=4')
+        self.assertEqual(ids, sorted(p.id for p in self.products))
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/products/', {'page_size': 5})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in back.data['results']],
+            [item['id'] for item in first.data['results']]
+        )
+
+    def test_page_size_is_capped(self):
+        with self.settings(MAX_PAGE_SIZE=5):
+            response = self.client.get('/api/products/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get('/api/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_rank_cursor_handles_tied_and_near_tied_ranks(self):
+        ranks = [Decimal('0.060793'), Decimal('0.060793'), Decimal('0.060794'), Decimal('0.060792'), Decimal('0.000001')]
+        ranked = {product.id: ranks[index % len(ranks)] for index, product in enumerate(self.products)}
+        queryset = Product.objects.annotate(rank=Case(
+            *(When(id=product_id, then=Value(rank)) for product_id, rank in ranked.items()),
+            output_field=SEARCH_RANK_FIELD
+        ))
+        view = type('SearchView', (), {'keyset_ordering': ['-rank', 'id']})()
+
+        def page(cursor=None):
+            params = {'page_size': 3, **({'cursor': cursor} if cursor else {})}
+            paginator = KeysetPagination()
+            rows = paginator.paginate_queryset(queryset, Request(APIRequestFactory().get('/search/', params)), view)
+            links = {name: paginator.get_paginated_response([]).data[name] for name in ('next', 'previous')}
+            cursors = {name: link and parse_qs(urlparse(link).query).get('cursor', [None])[0] for name, link in links.items()}
+            return [row.id for row in rows], cursors
+
+        ids, cursors, pages = [], {'next': None}, []
+        while True:
+            rows, cursors = page(cursors['next'])
+            ids.extend(rows)
+            pages.append((rows, cursors['previous']))
+            if not cursors['next']:
+                break
+        self.assertEqual(ids, sorted(ranked, key=lambda product_id: (-ranked[product_id], product_id)))
+        # The previous link of each page leads back to the page before it
+        for (rows, _), (_, previous) in zip(pages, pages[1:]):
+            self.assertEqual(page(previous)[0], rows)
+
+
+@override_settings(CATALOG_CACHE={'ENABLED': False})
+class ProductListQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        self.reviewers = [
+            User.objects.create_user(f'reviewer{i}', f'reviewer{i}@test.com', 'password123')
+            for i in range(3)
+        ]
+        self.category = Category.objects.create(name='Test Category')
+        self.wishlist = Wishlist.objects.create(user=self.customer)
+
+    def create_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                name=f'Product {i}',
+                description='Listed product',
+                price='9.99',
+                stock=10,
+                category=self.category,
+                seller=self.seller
+            )
+            ProductImage.objects.create(product=product, file=f'products/{i}.glb', file_type='model')
+            ProductImage.objects.create(product=product, file=f'products/{i}.jpg')
+            for rating, reviewer in enumerate(self.reviewers, start=3):
+                Review.objects.create(product=product, user=reviewer, rating=rating)
+            if i % 2:
+                WishlistItem.objects.create(wishlist=self.wishlist, product=product)
+
+    def test_listing_fields_are_precomputed(self):
+        self.create_products(2)
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get('/api/products/')
+        results = {item['name']: item for item in response.data['results']}
+        self.assertEqual(results['Product 1']['average_rating'], 4.0)
+        self.assertEqual(results['Product 1']['review_count'], 3)
+        self.assertTrue(results['Product 1']['primary_image'].endswith('products/1.jpg'))
+        self.assertTrue(results['Product 1']['in_wishlist'])
+        self.assertFalse(results['Product 0']['in_wishlist'])
+
+    def test_listing_keeps_product_fields(self):
+        self.create_products(1)
+        response = self.client.get('/api/products/')
+        self.assertLessEqual(set(ProductSerializer.Meta.fields), set(response.data['results'][0]))
+
+    def test_anonymous_listing_uses_constant_queries(self):
+        self.create_products(3)
+        with self.assertNumQueries(2):
+            self.client.get('/api/products/')
+        self.create_products(12)
+        with self.assertNumQueries(2):
+            self.client.get('/api/products/')
+
+    def test_authenticated_listing_uses_constant_queries(self):
+        self.client.force_authenticate(user=self.customer)
+        self.create_products(3)
+        with self.assertNumQueries(3):
+            self.client.get('/api/products/')
+        self.create_products(12)
+        with self.assertNumQueries(3):
+            self.client.get('/api/products/')
+
+
+@override_settings(CATALOG_CACHE={'ENABLED': False})
+class ProductRatingAggregateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.users = [
+            User.objects.create_user(f'user{i}', f'user{i}@test.com', 'password123')
+            for i in range(3)
+        ]
+        self.product = Product.objects.create(
+            name='Rated Product', description='Rated', price='9.99', stock=10, seller=self.seller
+        )
+
+    def test_reviews_update_aggregates(self):
+        for user, rating in zip(self.users, [5, 4, 4]):
+            Review.objects.create(product=self.product, user=user, rating=rating)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_sum, 13)
+        self.assertEqual(self.product.rating_count, 3)
+        self.assertEqual(str(self.product.rating_average), '4.33')
+        self.assertEqual(self.product.rating_histogram, {1: 0, 2: 0, 3: 0, 4: 2, 5: 1})
+
+    def test_changed_and_deleted_reviews_update_aggregates(self):
+        review = Review.objects.create(product=self.product, user=self.users[0], rating=5)
+        Review.objects.create(product=self.product, user=self.users[1], rating=3)
+        review.rating = 1
+        review.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_count), (4, 2))
+        self.assertEqual(self.product.rating_histogram, {1: 1, 2: 0, 3: 1, 4: 0, 5: 0})
+
+        Review.objects.filter(user=self.users[1]).delete()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_count), (1, 1))
+        self.assertEqual(self.product.rating_3_count, 0)
+
+    def test_add_review_endpoint_updates_aggregates(self):
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.post(
+            f'/api/products/{self.product.id}/add-review/',
+            {'product': self.product.id, 'rating': 4, 'comment': 'Good'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_count), (4, 1))
+
+    def test_rebuild_command_recomputes_aggregates(self):
+        Review.objects.create(product=self.product, user=self.users[0], rating=2)
+        Review.objects.create(product=self.product, user=self.users[1], rating=5)
+        Product.objects.update(rating_sum=0, rating_count=0, rating_average=0, rating_5_count=0)
+
+        call_command('rebuild_product_ratings', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_count), (7, 2))
+        self.assertEqual(str(self.product.rating_average), '3.50')
+        self.assertEqual(self.product.rating_histogram, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+
+    def test_list_sorts_and_filters_by_rating(self):
+        low = Product.objects.create(name='Low', description='Low', price='1.00', stock=1, seller=self.seller)
+        Review.objects.create(product=low, user=self.users[0], rating=2)
+        Review.objects.create(product=self.product, user=self.users[0], rating=5)
+
+        response = self.client.get('/api/products/', {'ordering': '-rating'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.product.id, low.id])
+        response = self.client.get('/api/products/', {'ordering': 'rating'})
+        self.assertEqual([item['id'] for item in response.data['results']], [low.id, self.product.id])
+        response = self.client.get('/api/products/', {'min_rating': '4'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.product.id])
+
+
+@override_settings(CATALOG_CACHE={'ENABLED': False})
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.other = User.objects.create_user('other', 'other@test.com', 'password123', role='seller')
+        self.clothing = Category.objects.create(name='Clothing')
+        self.shirts = Category.objects.create(name='Shirts', parent=self.clothing)
+        self.toys = Category.objects.create(name='Toys')
+
+        color = ProductVariantType.objects.create(name='Color')
+        size = ProductVariantType.objects.create(name='Size')
+        self.red = ProductVariantOption.objects.create(variant_type=color, value='Red')
+        self.blue = ProductVariantOption.objects.create(variant_type=color, value='Blue')
+        self.large = ProductVariantOption.objects.create(variant_type=size, value='Large')
+
+        def create(name, price, category, seller, stock=5, discount_price=None, options=()):
+            product = Product.objects.create(
+                name=name, description=name, price=price, discount_price=discount_price,
+                stock=stock, category=category, seller=seller
+            )
+            if options:
+                variant = ProductVariant.objects.create(product=product, sku=f'{name}-variant', stock=1)
+                variant.options.set(options)
+            return product
+
+        self.red_shirt = create('Red Shirt', '30.00', self.shirts, self.seller, options=[self.red, self.large])
+        self.blue_shirt = create('Blue Shirt', '60.00', self.shirts, self.other, discount_price='20.00',
+                                 options=[self.blue])
+        self.jacket = create('Jacket', '120.00', self.clothing, self.seller, stock=0)
+        self.ball = create('Ball', '10.00', self.toys, self.other)
+
+    def ids(self, **params):
+        response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['id'] for item in response.data['results']}
+
+    def test_filters(self):
+        self.assertEqual(self.ids(category=self.clothing.id), {self.red_shirt.id, self.blue_shirt.id, self.jacket.id})
+        self.assertEqual(self.ids(category=self.shirts.id), {self.red_shirt.id, self.blue_shirt.id})
+        # The effective price of the blue shirt is its discount price
+        self.assertEqual(self.ids(min_price='15', max_price='40'), {self.red_shirt.id, self.blue_shirt.id})
+        self.assertEqual(self.ids(seller=f'{self.other.id}'), {self.blue_shirt.id, self.ball.id})
+        self.assertEqual(self.ids(in_stock='true', category=self.clothing.id), {self.red_shirt.id, self.blue_shirt.id})
+        self.assertEqual(self.ids(on_sale='true'), {self.blue_shirt.id})
+
+    def test_option_filters(self):
+        # Options of one type are alternatives, different types must all match
+        self.assertEqual(self.ids(options=f'{self.red.id},{self.blue.id}'), {self.red_shirt.id, self.blue_shirt.id})
+        self.assertEqual(self.ids(options=f'{self.blue.id},{self.large.id}'), set())
+        self.assertEqual(self.ids(options=f'{self.red.id},{self.large.id}'), {self.red_shirt.id})
+
+    def test_facet_counts_exclude_their_own_filter(self):
+        # Page, images, then one aggregate and one UNION ALL for every facet
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/products/', {'seller': self.seller.id, 'facets': 'true'})
+        facets = response.data['facets']
+        self.assertEqual({item['id'] for item in response.data['results']}, {self.red_shirt.id, self.jacket.id})
+
+        # The seller facet ignores the seller filter, every other facet applies it
+        self.assertEqual({s['name']: s['count'] for s in facets['sellers']}, {'seller': 2, 'other': 2})
+        self.assertEqual({c['name']: c['count'] for c in facets['categories']}, {'Shirts': 1, 'Clothing': 1})
+        self.assertEqual({o['name']: o['count'] for o in facets['options']}, {'Color: Red': 1, 'Size: Large': 1})
+        self.assertEqual(facets['in_stock'], 1)
+        self.assertEqual(facets['on_sale'], 0)
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [0, 1, 0, 1, 0])
+
+    def test_price_facet_uses_sale_price(self):
+        response = self.client.get('/api/products/', {'facets': 'true', 'min_price': '100'})
+        facets = response.data['facets']
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [2, 1, 0, 1, 0])
+        self.assertEqual({s['name']: s['count'] for s in facets['sellers']}, {'seller': 1})
+
+
+@override_settings(CATALOG_CACHE={'ENABLED': False})
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.electronics = Category.objects.create(name='Electronics')
+        self.computers = Category.objects.create(name='Computers', parent=self.electronics)
+        self.laptops = Category.objects.create(name='Laptops', parent=self.computers)
+        self.phones = Category.objects.create(name='Phones', parent=self.electronics)
+        self.garden = Category.objects.create(name='Garden')
+
+    def closure(self):
+        return set(CategoryClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def assert_closure_matches_parents(self):
+        # Rebuild the closure from parent pointers and compare
+        expected = set()
+        for category in Category.objects.all():
+            ancestor, depth = category, 0
+            while ancestor is not None:
+                expected.add((ancestor.id, category.id, depth))
+                ancestor, depth = ancestor.parent, depth + 1
+        self.assertEqual(self.closure(), expected)
+
+    def test_descendants_and_ancestors(self):
+        self.assert_closure_matches_parents()
+        with self.assertNumQueries(1):
+            names = {category.name for category in self.electronics.get_descendants()}
+        self.assertEqual(names, {'Electronics', 'Computers', 'Laptops', 'Phones'})
+        with self.assertNumQueries(1):
+            names = [category.name for category in self.laptops.get_ancestors()]
+        self.assertEqual(names, ['Electronics', 'Computers'])
+
+        response = self.client.get(f'/api/products/categories/{self.electronics.id}/descendants/')
+        self.assertEqual([category['name'] for category in response.data], ['Computers', 'Phones', 'Laptops'])
+        response = self.client.get(f'/api/products/categories/{self.laptops.id}/ancestors/')
+        self.assertEqual([category['name'] for category in response.data], ['Electronics', 'Computers'])
+
+    def test_moving_a_subtree(self):
+        self.computers.parent = self.garden
+        self.computers.save()
+        self.assert_closure_matches_parents()
+        self.assertEqual([category.name for category in self.laptops.get_ancestors()], ['Garden', 'Computers'])
+
+        self.computers.parent = None
+        self.computers.save()
+        self.assert_closure_matches_parents()
+
+    def test_moving_under_own_subtree_is_rejected(self):
+        self.electronics.parent = self.laptops
+        with self.assertRaises(ValueError):
+            self.electronics.save()
+
+        admin = User.objects.create_user('admin', 'admin@test.com', 'password123', role='admin', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.patch(
+            f'/api/products/categories/{self.electronics.id}/', {'parent': self.laptops.id}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assert_closure_matches_parents()
+
+    def test_deleting_a_category_makes_its_children_roots(self):
+        self.computers.delete()
+        self.assert_closure_matches_parents()
+        self.laptops.refresh_from_db()
+        self.assertEqual(list(self.laptops.get_ancestors()), [])
+
+    def test_full_path_is_cached_until_the_tree_changes(self):
+        self.assertEqual(self.laptops.get_full_path(), 'Electronics > Computers > Laptops')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.laptops.get_full_path(), 'Electronics > Computers > Laptops')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.electronics.name = 'Tech'
+            self.electronics.save()
+        self.assertEqual(self.laptops.get_full_path(), 'Tech > Computers > Laptops')
+
+    def test_products_can_include_descendants(self):
+        def create(name, category):
+            return Product.objects.create(
+                name=name, description=name, price='10.00', stock=1, category=category, seller=self.seller
+            )
+        tv = create('TV', self.electronics)
+        laptop = create('Laptop', self.laptops)
+        create('Rake', self.garden)
+
+        url = f'/api/products/categories/{self.electronics.id}/products/'
+        response = self.client.get(url)
+        self.assertEqual([item['id'] for item in response.data['results']], [tv.id])
+        response = self.client.get(url, {'include_descendants': 'true'})
+        self.assertEqual({item['id'] for item in response.data['results']}, {tv.id, laptop.id})
+
+
+class CategoryTreeSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.electronics = Category.objects.create(name='Electronics')
+        self.phones = Category.objects.create(name='Phones', parent=self.electronics)
+        self.garden = Category.objects.create(name='Garden')
+        self.phone = Product.objects.create(
+            name='Phone', description='Phone', price='100.00', stock=1, category=self.phones, seller=self.seller
+        )
+        Product.objects.create(
+            name='TV', description='TV', price='300.00', stock=1, category=self.electronics, seller=self.seller
+        )
+
+    def get_tree(self, **headers):
+        return self.client.get('/api/products/categories/tree/', headers=headers)
+
+    def test_nested_tree_with_counts(self):
+        response = self.get_tree()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        electronics, garden = response.json()
+        self.assertEqual((electronics['name'], electronics['product_count'], electronics['total_product_count']),
+                         ('Electronics', 1, 2))
+        self.assertEqual([(child['name'], child['total_product_count']) for child in electronics['children']],
+                         [('Phones', 1)])
+        self.assertEqual((garden['name'], garden['children']), ('Garden', []))
+
+    def test_snapshot_is_reused_until_the_tree_changes(self):
+        first = get_category_tree()
+        with self.assertNumQueries(0):
+            self.assertIs(get_category_tree(), first)
+
+        # Edits that leave categories and product placement alone keep the snapshot
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.name = 'Smartphone'
+            self.phone.save()
+        self.assertIs(get_category_tree(), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.category = self.garden
+            self.phone.save()
+        second = get_category_tree()
+        self.assertNotEqual(second.version, first.version)
+        self.assertEqual([node['total_product_count'] for node in second.tree], [1, 1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Books')
+        self.assertEqual([node['name'] for node in get_category_tree().tree], ['Books', 'Electronics', 'Garden'])
+
+    def test_etag_revalidation(self):
+        etag = self.get_tree()['ETag']
+        with self.assertNumQueries(0):
+            response = self.get_tree(if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.garden.name = 'Outdoors'
+            self.garden.save()
+        response = self.get_tree(if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(PRODUCT_IMPORT={'BACKGROUND': False, 'CHUNK_SIZE': 2})
+class ProductImportTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.category = Category.objects.create(name='Imported')
+        size = ProductVariantType.objects.create(name='Size')
+        self.small = ProductVariantOption.objects.create(variant_type=size, value='S')
+        self.large = ProductVariantOption.objects.create(variant_type=size, value='L')
+        self.client.force_authenticate(user=self.seller)
+
+    def upload(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/products/imports/', {'file': SimpleUploadedFile(name, content.encode('utf-8'))},
+                format='multipart'
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return self.client.get(f"/api/products/imports/{response.data['id']}/").data
+
+    def test_csv_import_reports_row_errors(self):
+        job = self.upload('products.csv', (
+            'name,description,price,discount_price,stock,category\n'
+            f'Mug,Ceramic,9.99,,5,{self.category.id}\n'
+            'Bowl,Ceramic,not-a-price,,5,\n'
+            'Plate,Ceramic,4.50,,3,9999\n'
+            'Cup,Ceramic,3.00,2.50,1,\n'
+        ))
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual((job['processed_rows'], job['created_count'], job['error_count']), (4, 2, 2))
+        self.assertEqual([error['row'] for error in job['errors']], [3, 4])
+        self.assertIn('price', job['errors'][0]['errors'])
+        self.assertIn('category', job['errors'][1]['errors'])
+
+        mug = Product.objects.get(name='Mug')
+        self.assertEqual((mug.seller, mug.category, mug.discount_price), (self.seller, self.category, None))
+        self.assertEqual(str(Product.objects.get(name='Cup').discount_price), '2.50')
+
+    def test_ndjson_import_creates_variants(self):
+        rows = [
+            {'name': 'Shirt', 'description': 'Cotton', 'price': '20.00', 'stock': 4, 'variants': [
+                {'sku': 'SHIRT-S', 'stock': 2, 'options': [self.small.id]},
+                {'sku': 'SHIRT-L', 'stock': 2, 'price_adjustment': '1.50', 'options': [self.large.id]},
+            ]},
+            {'name': 'Copy', 'description': 'Reuses a SKU', 'price': '20.00', 'stock': 1, 'variants': [
+                {'sku': 'SHIRT-S', 'stock': 1},
+            ]},
+            {'name': 'Odd', 'description': 'Unknown option', 'price': '20.00', 'stock': 1, 'variants': [
+                {'sku': 'ODD-1', 'options': [9999]},
+            ]},
+        ]
+        content = '\n'.join(json.dumps(row) for row in rows) + '\n{not json\n'
+        job = self.upload('products.ndjson', content)
+        self.assertEqual((job['created_count'], job['error_count']), (1, 3))
+        self.assertEqual([error['row'] for error in job['errors']], [2, 3, 4])
+
+        shirt = Product.objects.get(name='Shirt')
+        variants = {variant.sku: variant for variant in shirt.variants.prefetch_related('options')}
+        self.assertEqual(set(variants), {'SHIRT-S', 'SHIRT-L'})
+        self.assertEqual(list(variants['SHIRT-L'].options.all()), [self.large])
+        self.assertEqual(str(variants['SHIRT-L'].price_adjustment), '1.50')
+
+    def test_jobs_are_private_to_their_seller(self):
+        job = self.upload('products.csv', 'name,description,price,stock\nMug,Ceramic,9.99,5\n')
+        other = User.objects.create_user('other', 'other@test.com', 'password123', role='seller')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(f"/api/products/imports/{job['id']}/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        self.client.force_authenticate(user=customer)
+        response = self.client.post('/api/products/imports/', {'file': SimpleUploadedFile('a.csv', b'name\n')})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_management_command(self):
+        path = os.path.join(settings.MEDIA_ROOT, 'products.csv')
+        with open(path, 'w') as file:
+            file.write('name,description,price,stock\nMug,Ceramic,9.99,5\nBad,Ceramic,-1,5\n')
+        out = StringIO()
+        call_command('import_products', path, seller='seller', stdout=out)
+        self.assertIn('Imported 1 of 2 rows (1 rejected)', out.getvalue())
+        self.assertTrue(Product.objects.filter(name='Mug', seller=self.seller).exists())
+
+
+class VariantGenerationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.product = Product.objects.create(
+            name='Tee', description='Tee', price='10.00', stock=1, seller=self.seller
+        )
+        self.groups = []
+        for name, count in [('Size', 5), ('Color', 5), ('Fit', 4)]:
+            variant_type = ProductVariantType.objects.create(name=name)
+            self.groups.append([
+                ProductVariantOption.objects.create(variant_type=variant_type, value=f'{name} {index}').id
+                for index in range(count)
+            ])
+        self.url = f'/api/products/{self.product.id}/bulk-create-variants/'
+        self.client.force_authenticate(user=self.seller)
+
+    def test_matrix_is_created_in_a_fixed_number_of_queries(self):
+        first_size = self.groups[0][0]
+        # get_object, option load, SKU check, savepoint, two inserts, release, reload and its prefetch
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url, {
+                'option_groups': self.groups,
+                'base_sku': 'TEE',
+                'price_adjustments': {str(first_size): 2.5},
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 100)
+
+        variant = ProductVariant.objects.get(sku='TEE-1')
+        self.assertEqual(
+            set(variant.options.values_list('id', flat=True)),
+            {self.groups[0][0], self.groups[1][0], self.groups[2][0]}
+        )
+        self.assertEqual(str(variant.price_adjustment), '2.50')
+        self.assertEqual(ProductVariant.objects.get(sku='TEE-100').price_adjustment, 0)
+        self.assertEqual(ProductVariant.options.through.objects.count(), 300)
+
+    def test_sku_collisions_are_detected_up_front(self):
+        ProductVariant.objects.create(product=self.product, sku='TEE-7')
+        response = self.client.post(self.url, {'option_groups': self.groups, 'base_sku': 'TEE'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('TEE-7', response.data['error'])
+        self.assertEqual(ProductVariant.objects.count(), 1)
+
+    def test_unknown_options_are_rejected(self):
+        response = self.client.post(self.url, {'option_groups': [[9999]], 'base_sku': 'TEE'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ProductVariant.objects.exists())
+
+
+class VariantIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.product = Product.objects.create(
+            name='Tee', description='Tee', price='10.00', discount_price='8.00', stock=1, seller=self.seller
+        )
+        size = ProductVariantType.objects.create(name='Size')
+        color = ProductVariantType.objects.create(name='Color')
+        self.small = ProductVariantOption.objects.create(variant_type=size, value='S')
+        self.large = ProductVariantOption.objects.create(variant_type=size, value='L')
+        self.red = ProductVariantOption.objects.create(variant_type=color, value='Red')
+        self.variant = ProductVariant.objects.create(
+            product=self.product, sku='TEE-S-RED', price_adjustment='1.50', stock=4
+        )
+        self.variant.options.add(self.small, self.red)
+        ProductVariant.objects.create(product=self.product, sku='TEE-L-RED', stock=2).options.add(self.large, self.red)
+        self.url = f'/api/products/{self.product.id}/resolve-variant/'
+        self.client.force_authenticate(user=self.seller)
+
+    def test_options_resolve_in_any_order_from_the_cache(self):
+        response = self.client.get(self.url, {'options': f'{self.red.id},{self.small.id}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'id': self.variant.id, 'sku': 'TEE-S-RED', 'price': '11.50', 'discount_price': '9.50', 'stock': 4,
+            'available_stock': 4
+        })
+        # Authenticated requests skip the response cache but still reuse the index
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'options': f'{self.small.id},{self.red.id}'})
+        self.assertEqual(response.data['sku'], 'TEE-S-RED')
+
+    def test_unknown_combinations_and_missing_options(self):
+        response = self.client.get(self.url, {'options': f'{self.small.id}'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_variant_changes_invalidate_the_index(self):
+        options = f'{self.small.id},{self.red.id}'
+        self.assertEqual(self.client.get(self.url, {'options': options}).data['stock'], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.variant.stock = 0
+            self.variant.save()
+        self.assertEqual(self.client.get(self.url, {'options': options}).data['stock'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.variant.options.remove(self.red)
+        self.assertEqual(self.client.get(self.url, {'options': options}).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(CATALOG_CACHE={'ENABLED': False})
+    def test_product_detail_embeds_the_index(self):
+        with mock.patch('products.views.record_product_view'):
+            response = self.client.get(f'/api/products/{self.product.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        index = response.data['variant_index']
+        self.assertEqual(set(index), {
+            '-'.join(str(option_id) for option_id in sorted([self.small.id, self.red.id])),
+            '-'.join(str(option_id) for option_id in sorted([self.large.id, self.red.id])),
+        })
+
+    def test_variants_by_product_loads_options_in_bulk(self):
+        for index in range(10):
+            ProductVariant.objects.create(product=self.product, sku=f'TEE-{index}').options.add(self.small, self.red)
+        # Variants with their product, then options with their type
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/variants/by-product/', {'product_id': self.product.id})
+        self.assertEqual(len(response.data), 12)
+        self.assertEqual(response.data[0]['name'], 'Tee - Size: S, Color: Red')
+
+
+class InventoryShardTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        self.product = Product.objects.create(
+            name='Hot', description='Hot', price='5.00', stock=10, seller=self.seller
+        )
+        set_stock_shards(Product, self.product.id, 4)
+        self.product.refresh_from_db()
+        self.client.force_authenticate(user=self.customer)
+
+    def shard_stock(self):
+        return list(InventoryShard.objects.filter(product=self.product).order_by('shard').values_list('stock', flat=True))
+
+    def test_stock_is_split_across_shards(self):
+        self.assertEqual(self.product.stock_shards, 4)
+        self.assertEqual(self.shard_stock(), [3, 3, 2, 2])
+        self.assertEqual(self.product.available_stock, 10)
+
+    @mock.patch('products.views.record_product_view')
+    def test_cart_and_checkout_take_units_from_shards(self, record_product_view):
+        self.client.get(f'/api/products/{self.product.id}/')
+        response = self.client.post('/api/cart/add_item/', {'product_id': self.product.id, 'quantity': 7})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum(self.shard_stock()), 3)
+        response = self.client.post('/api/cart/add_item/', {'product_id': self.product.id, 'quantity': 4})
+        self.assertEqual(response.data['error'], 'Not enough stock. Only 10 available.')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/orders/', {
+                'shipping_address': 'a', 'billing_address': 'b', 'payment_method': 'card', 'total_price': '35.00'
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(sum(self.shard_stock()), 3)
+        # The single row is never written on the hot path
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (10, 0))
+
+        # The API counts the stock of a sharded product from its shards
+        response = self.client.get(f'/api/products/{self.product.id}/')
+        self.assertEqual((response.data['stock'], response.data['available_stock']), (3, 3))
+        response = self.client.get('/api/products/')
+        self.assertEqual([(item['stock'], item['available_stock']) for item in response.data['results']], [(3, 3)])
+        self.assertEqual(self.product.current_stock, 3)
+
+        rebalance(Product, self.product.id)
+        self.product.refresh_from_db()
+        self.assertEqual(self.shard_stock(), [1, 1, 1, 0])
+        self.assertEqual((self.product.stock, self.product.reserved), (3, 0))
+
+    def test_released_holds_go_back_to_shards(self):
+        response = self.client.post('/api/cart/add_item/', {'product_id': self.product.id, 'quantity': 10})
+        self.assertEqual(self.shard_stock(), [0, 0, 0, 0])
+        self.client.post('/api/cart/remove_item/', {'item_id': response.data['items'][0]['id']})
+        self.assertEqual(sum(self.shard_stock()), 10)
+
+    def test_deleting_a_sharded_product_removes_its_shards(self):
+        variant = ProductVariant.objects.create(product=self.product, sku='HOT-L', stock=6)
+        set_stock_shards(ProductVariant, variant.id, 2)
+        self.client.post('/api/cart/add_item/', {'product_id': self.product.id, 'variant_id': variant.id, 'quantity': 2})
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.delete(f'/api/products/{self.product.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Product.objects.filter(id=self.product.id).exists())
+        self.assertFalse(InventoryShard.objects.exists())
+
+    def test_stock_edits_and_unsharding(self):
+        self.client.post('/api/cart/add_item/', {'product_id': self.product.id, 'quantity': 2})
+        self.product.stock = 20
+        self.product.save()
+        # 20 units on hand, 2 of them held by the cart
+        self.assertEqual(self.shard_stock(), [5, 5, 4, 4])
+
+        set_stock_shards(Product, self.product.id, 0)
+        self.product.refresh_from_db()
+        self.assertFalse(InventoryShard.objects.exists())
+        self.assertEqual((self.product.stock_shards, self.product.stock, self.product.reserved), (0, 20, 2))
+
+    def test_save_does_not_overwrite_stock_counters(self):
+        stale = Product.objects.get(id=self.product.id)
+        Product.objects.filter(id=self.product.id).update(reserved=3)
+        stale.name = 'Renamed'
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.reserved, self.product.stock_shards), ('Renamed', 3, 4))
+
+    def test_save_writes_edited_stock_counters(self):
+        product = Product.objects.create(name='Plain', description='Plain', price='5.00', stock=10, seller=self.seller)
+        stale = Product.objects.get(id=product.id)
+        Product.objects.filter(id=product.id).update(stock=F('stock') - 1)
+        stale.name = 'Renamed'
+        stale.save()
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.stock), ('Renamed', 9))
+
+        stale.stock = 50
+        stale.save()
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 50)
+
+
+class ProductViewBufferTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.product = Product.objects.create(
+            name='Viewed Product', description='Viewed', price='9.99', stock=10, seller=self.seller
+        )
+
+    def test_retrieve_buffers_view_instead_of_inserting(self):
+        buffer = ProductViewBuffer(background=False)
+        self.client.force_authenticate(user=self.seller)
+        with mock.patch('products.view_buffer._buffer', buffer):
+            response = self.client.get(f'/api/products/{self.product.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ProductView.objects.count(), 0)
+        self.assertEqual(buffer.stats()['pending'], 1)
+
+        self.assertEqual(buffer.flush(), 1)
+        view = ProductView.objects.get()
+        self.assertEqual((view.product_id, view.user_id), (self.product.id, self.seller.id))
+
+    def test_concurrent_records_are_not_lost(self):
+        buffer = ProductViewBuffer(batch_size=50, background=False)
+
+        def record_views():
+            for _ in range(250):
+                buffer.record(self.product.id, session_id='session')
+
+        threads = [threading.Thread(target=record_views) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        buffer.flush()
+        self.assertEqual(ProductView.objects.count(), 2000)
+        self.assertEqual(buffer.stats(), {'pending': 0, 'written': 2000, 'dropped': 0})
+
+    def test_failed_flush_keeps_rows_for_the_next_one(self):
+        buffer = ProductViewBuffer(background=False)
+        buffer.record(self.product.id, session_id='first')
+        with mock.patch.object(ProductView.objects, 'bulk_create', side_effect=OperationalError('gone away')), \
+                self.assertLogs('core.write_buffer', level='ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        buffer.record(self.product.id, session_id='second')
+        self.assertEqual(buffer.stats(), {'pending': 2, 'written': 0, 'dropped': 0})
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(list(ProductView.objects.order_by('id').values_list('session_id', flat=True)), ['first', 'second'])
+
+    def test_rejected_rows_are_dropped_and_the_rest_written(self):
+        buffer = ProductViewBuffer(background=False)
+        for session_id in 'abc':
+            buffer.record(self.product.id, session_id=session_id)
+        # A view of no product violates NOT NULL
+        buffer.add(ProductView(product_id=None, session_id='bad', timestamp=timezone.now()))
+        for session_id in 'de':
+            buffer.record(self.product.id, session_id=session_id)
+
+        with self.assertLogs('core.write_buffer', level='WARNING'):
+            self.assertEqual(buffer.flush(), 5)
+        self.assertEqual(buffer.stats(), {'pending': 0, 'written': 5, 'dropped': 1})
+        self.assertEqual(sorted(ProductView.objects.values_list('session_id', flat=True)), list('abcde'))
+
+    def test_requeued_rows_stay_within_max_pending(self):
+        buffer = ProductViewBuffer(max_pending=3, background=False)
+        for session_id in 'ab':
+            buffer.record(self.product.id, session_id=session_id)
+
+        def fail_after_more_views(*args, **kwargs):
+            # More views arrive while the failing batch is being written
+            for session_id in 'cd':
+                buffer.record(self.product.id, session_id=session_id)
+            raise OperationalError('gone away')
+
+        with mock.patch.object(ProductView.objects, 'bulk_create', side_effect=fail_after_more_views), \
+                self.assertLogs('core.write_buffer', level='ERROR'):
+            buffer.flush()
+        self.assertEqual(buffer.stats(), {'pending': 3, 'written': 0, 'dropped': 1})
+        self.assertEqual([view.session_id for view in buffer.pending], ['b', 'c', 'd'])
+
+    def test_background_worker_loses_no_views_under_load(self):
+        written = []
+        buffer = ProductViewBuffer(batch_size=100, flush_interval=0.01)
+
+        def record_views():
+            for _ in range(500):
+                buffer.record(self.product.id, session_id='session')
+
+        # Only the buffer's own locking is exercised; the rows are collected instead of inserted
+        with mock.patch.object(ProductView.objects, 'bulk_create', side_effect=lambda rows, **kwargs: written.extend(rows)):
+            buffer.start()
+            threads = [threading.Thread(target=record_views) for _ in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            buffer.stop()
+
+        self.assertEqual(len(written), 8000)
+        self.assertEqual(buffer.stats(), {'pending': 0, 'written': 8000, 'dropped': 0})
+
+    def test_worker_starts_with_the_first_view(self):
+        buffer = ProductViewBuffer(flush_interval=0.01)
+        self.assertIsNone(buffer.worker)
+        with mock.patch.object(ProductView.objects, 'bulk_create'):
+            buffer.record(self.product.id)
+            worker = buffer.worker
+            self.assertTrue(worker.is_alive())
+            buffer.record(self.product.id)
+            self.assertIs(buffer.worker, worker)
+            buffer.stop()
+        idle = ProductViewBuffer(background=False)
+        idle.record(self.product.id)
+        self.assertIsNone(idle.worker)
+
+    def test_full_buffer_drops_and_counts_views(self):
+        buffer = ProductViewBuffer(max_pending=3, background=False)
+        results = [buffer.record(self.product.id) for _ in range(5)]
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(buffer.stats(), {'pending': 3, 'written': 0, 'dropped': 2})
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('products.views.record_product_view')
+        self.record_product_view = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.category = Category.objects.create(name='Cached')
+        self.product = Product.objects.create(
+            name='Cached Product', description='Cached', price='9.99', stock=10,
+            category=self.category, seller=self.seller
+        )
+
+    def get(self, url, params=None, expected='HIT'):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Cache'], expected)
+        return response.json()
+
+    def test_second_anonymous_read_is_served_from_cache(self):
+        self.get('/api/products/', expected='MISS')
+        with self.assertNumQueries(0):
+            self.get('/api/products/')
+        self.assertEqual(catalog_cache.stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_query_params_are_normalized(self):
+        self.get('/api/products/', {'page_size': 5, 'ordering': '-rating', 'status': ''}, expected='MISS')
+        self.get('/api/products/?ordering=-rating&page_size=5')
+        self.get('/api/products/', {'page_size': 6}, expected='MISS')
+
+    def test_authenticated_reads_bypass_cache(self):
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.get('/api/products/')
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual(catalog_cache.stats()['misses'], 0)
+
+    def test_product_change_invalidates_listing_and_its_detail_only(self):
+        other = Product.objects.create(name='Other', description='d', price='1.00', stock=1, seller=self.seller)
+        url = f'/api/products/{self.product.id}/'
+        other_url = f'/api/products/{other.id}/'
+        self.get('/api/products/', expected='MISS')
+        self.get(url, expected='MISS')
+        self.get(other_url, expected='MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Renamed'
+            self.product.save()
+
+        self.assertEqual(self.get(url, expected='MISS')['name'], 'Renamed')
+        self.get('/api/products/', expected='MISS')
+        self.get(other_url)
+
+    def test_deleting_a_product_invalidates_listing_and_detail(self):
+        url = f'/api/products/{self.product.id}/'
+        self.get('/api/products/', expected='MISS')
+        self.get(url, expected='MISS')
+        self.get(url)
+
+        self.client.force_authenticate(user=self.seller)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.client.force_authenticate(user=None)
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        listing = self.get('/api/products/', expected='MISS')
+        self.assertNotIn(self.product.id, [item['id'] for item in listing['results']])
+
+    def test_related_models_invalidate_product(self):
+        url = f'/api/products/{self.product.id}/'
+        customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        size = ProductVariantType.objects.create(name='Size')
+        option = ProductVariantOption.objects.create(variant_type=size, value='M')
+        changes = [
+            lambda: ProductImage.objects.create(product=self.product, file='products/a.jpg'),
+            lambda: ProductVariant.objects.create(product=self.product, sku='CACHED-M', stock=1),
+            lambda: ProductVariant.objects.get(sku='CACHED-M').options.add(option),
+            lambda: Review.objects.create(product=self.product, user=customer, rating=4),
+            lambda: Review.objects.filter(product=self.product).delete(),
+        ]
+        for change in changes:
+            self.get(url, expected='MISS')
+            self.get(url)
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+        self.get(url, expected='MISS')
+
+    def test_category_change_invalidates_category_reads(self):
+        self.get('/api/products/categories/', expected='MISS')
+        self.get(f'/api/products/categories/{self.category.id}/products/', expected='MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Another')
+        self.assertEqual(len(self.get('/api/products/categories/', expected='MISS')['results']), 2)
+        self.get(f'/api/products/categories/{self.category.id}/products/', expected='MISS')
+
+    def test_cached_detail_still_records_views(self):
+        url = f'/api/products/{self.product.id}/'
+        self.get(url, expected='MISS')
+        self.get(url)
+        self.assertEqual(self.record_product_view.call_count, 2)
+
+    def test_waiting_request_uses_leaders_result(self):
+        key_prefix = 'catalog:resp:'
+        original_add = cache.add
+
+        def contended_add(key, *args, **kwargs):
+            if key.startswith(key_prefix) and key.endswith(':lock'):
+                # Another worker holds the lock and publishes its result meanwhile
+                original_add(key, *args, **kwargs)
+                cache.set(key[:-len(':lock')], b'{"from": "leader"}')
+                return False
+            return original_add(key, *args, **kwargs)
+
+        with mock.patch.object(catalog_cache.cache, 'add', side_effect=contended_add):
+            with self.assertNumQueries(0):
+                data = self.get('/api/products/')
+        self.assertEqual(data, {'from': 'leader'})
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.client.force_authenticate(user=self.seller)
+        self.assertEqual(self.client.get('/api/products/cache-stats/').status_code, status.HTTP_403_FORBIDDEN)
+        admin = User.objects.create_user('admin', 'admin@test.com', 'password123', role='admin', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/products/cache-stats/')
+        self.assertEqual(response.data, {'hits': 0, 'misses': 0, 'hit_ratio': None})
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.shoes = Category.objects.create(name='Running Shoes')
+        self.products = {
+            name: Product.objects.create(
+                name=name, description=description, price='9.99', stock=10, category=category, seller=self.seller
+            )
+            for name, description, category in [
+                ('Trail Runner', 'Grippy sole for muddy trails', self.shoes),
+                ('Road Racer', 'Light shoe for fast road running', self.shoes),
+                ('Rain Jacket', 'Keeps you dry on the trail', None),
+                ('Coffee Mug', 'Ceramic, dishwasher safe', None),
+            ]
+        }
+        self.activity_buffer = UserActivityBuffer(background=False)
+        patcher = mock.patch('analytics.activity_buffer._buffer', self.activity_buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def search(self, **params):
+        response = self.client.get('/api/products/search/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def names(self, data):
+        return {item['name'] for item in data['results']}
+
+    def test_matches_name_description_and_category(self):
+        self.assertEqual(self.names(self.search(q='trail')), {'Trail Runner', 'Rain Jacket'})
+        self.assertEqual(self.names(self.search(q='shoes')), {'Trail Runner', 'Road Racer'})
+
+    def test_all_words_must_match_and_last_is_a_prefix(self):
+        self.assertEqual(self.names(self.search(q='trail grip')), {'Trail Runner'})
+        self.assertEqual(self.names(self.search(q='cof')), {'Coffee Mug'})
+
+    def test_results_are_keyset_paginated(self):
+        first = self.search(q='r', page_size=2)
+        self.assertEqual(len(first['results']), 2)
+        second = self.client.get(first['next']).json()
+        seen = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertIn('rank', first['results'][0])
+
+    def test_empty_query_is_rejected(self):
+        response = self.client.get('/api/products/search/', {'q': ' !& '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_searches_are_logged_asynchronously(self):
+        customer = User.objects.create_user('customer', 'customer@test.com', 'password123')
+        self.client.force_authenticate(user=customer)
+        self.search(q='road', page_size=1)
+        self.client.get('/api/products/search/', {'q': 'road', 'cursor': 'x'})
+        self.assertFalse(UserActivity.objects.exists())
+        self.assertEqual(self.activity_buffer.flush(), 1)
+        activity = UserActivity.objects.get()
+        self.assertEqual(
+            (activity.activity_type, activity.search_query, activity.user_id), ('search', 'road', customer.id)
+        )
+
+    def test_cached_anonymous_search_is_still_logged(self):
+        self.search(q='mug')
+        self.search(q='mug')
+        self.assertEqual(self.activity_buffer.stats()['pending'], 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Full-text search needs PostgreSQL')
+class ProductFullTextSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        self.category = Category.objects.create(name='Kitchen')
+        self.title_match = Product.objects.create(
+            name='Kettle', description='Boils water', price='9.99', stock=1, category=self.category, seller=seller
+        )
+        self.body_match = Product.objects.create(
+            name='Teapot', description='Pairs well with a kettle', price='9.99', stock=1, seller=seller
+        )
+
+    def test_name_matches_rank_above_description_matches(self):
+        with mock.patch('products.views.record_search'):
+            response = self.client.get('/api/products/search/', {'q': 'kettl'})
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], [self.title_match.id, self.body_match.id]
+        )
+
+    def test_rank_cursor_walks_near_tied_results_once(self):
+        seller = self.title_match.seller
+        for index in range(12):
+            Product.objects.create(
+                name=f'Kettle {index}', description='kettle ' * (index % 3 + 1), price='9.99', stock=1, seller=seller
+            )
+        with mock.patch('products.views.record_search'):
+            expected = [item['id'] for item in self.client.get(
+                '/api/products/search/', {'q': 'kettle', 'page_size': 100}
+            ).data['results']]
+            ids, url = [], '/api/products/search/?q=kettle&page_size=4'
+            while url:
+                response = self.client.get(url)
+                ids.extend(item['id'] for item in response.data['results'])
+                url = response.data['next']
+        self.assertEqual(len(expected), 14)
+        self.assertEqual(ids, expected)
+
+    def test_triggers_keep_vector_current(self):
+        self.category.name = 'Appliances'
+        self.category.save()
+        Product.objects.filter(pk=self.body_match.pk).update(description='Porcelain')
+        with mock.patch('products.views.record_search'):
+            appliances = self.client.get('/api/products/search/', {'q': 'appliance'}).data['results']
+            kettles = self.client.get('/api/products/search/', {'q': 'kettle'}).data['results']
+        self.assertEqual([item['id'] for item in appliances], [self.title_match.id])
+        self.assertEqual([item['id'] for item in kettles], [self.title_match.id])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Concurrent flushing needs a server database')
+class ProductViewBufferWorkerTests(TransactionTestCase):
+    def test_background_worker_loses_no_views_under_load(self):
+        seller = User.objects.create_user('seller', 'seller@test.com', 'password123', role='seller')
+        product = Product.objects.create(
+            name='Viewed Product', description='Viewed', price='9.99', stock=10, seller=seller
+        )
+        buffer = ProductViewBuffer(batch_size=100, flush_interval=0.05)
+        buffer.start()
+
+        def record_views():
+            for _ in range(500):
+                buffer.record(product.id, session_id='session')
+
+        threads = [threading.Thread(target=record_views) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        buffer.stop()
+
+        self.assertEqual(ProductView.objects.filter(product=product).count(), 8000)
+        self.assertEqual(buffer.stats(), {'pending': 0, 'written': 8000, 'dropped': 0})
@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
     ProductViewSet, CategoryViewSet, ProductVariantTypeViewSet, 
-    ProductVariantOptionViewSet, ProductVariantViewSet
+    ProductVariantOptionViewSet, ProductVariantViewSet, ProductImportViewSet, catalog_cache_stats
 )
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
@@ -22,6 +22,11 @@ urlpatterns = [
         'delete': 'destroy'
     }), name='product-detail'),
     
+    # Full-text product search
+    path('search/', ProductViewSet.as_view({
+        'get': 'search'
+    }), name='product-search'),
+    
     # Seller-specific product routes
     path('my-products/', ProductViewSet.as_view({
         'get': 'my_products'
@@ -35,6 +40,19 @@ urlpatterns = [
         'get': 'all_images'
     }), name='all-images'),
     
+    # Bulk product imports
+    path('imports/', ProductImportViewSet.as_view({
+        'get': 'list',
+        'post': 'create'
+    }), name='product-import-list'),
+    
+    path('imports/<int:pk>/', ProductImportViewSet.as_view({
+        'get': 'retrieve'
+    }), name='product-import-detail'),
+    
+    # Catalog cache monitoring
+    path('cache-stats/', catalog_cache_stats, name='catalog-cache-stats'),
+    
     # Category routes
     path('categories/', CategoryViewSet.as_view({
         'get': 'list',
@@ -48,6 +66,11 @@ urlpatterns = [
         'delete': 'destroy'
     }), name='category-detail'),
     
+    # Whole category tree with product counts
+    path('categories/tree/', CategoryViewSet.as_view({
+        'get': 'tree'
+    }), name='category-tree'),
+    
     # Seller-specific category routes
     path('categories/my-categories/', CategoryViewSet.as_view({
         'get': 'my_categories'
@@ -58,6 +81,14 @@ urlpatterns = [
         'get': 'subcategories'
     }), name='category-subcategories'),
     
+    path('categories/<int:pk>/descendants/', CategoryViewSet.as_view({
+        'get': 'descendants'
+    }), name='category-descendants'),
+    
+    path('categories/<int:pk>/ancestors/', CategoryViewSet.as_view({
+        'get': 'ancestors'
+    }), name='category-ancestors'),
+    
     path('categories/<int:pk>/products/', CategoryViewSet.as_view({
         'get': 'products'
     }), name='category-products'),
@@ -75,6 +106,13 @@ urlpatterns = [
         'post': 'add_variant'
     }), name='product-add-variant'),
     
+    path('<int:pk>/bulk-create-variants/', ProductViewSet.as_view({
+        'post': 'bulk_create_variants'
+    }), name='product-bulk-create-variants'),
+    path('<int:pk>/resolve-variant/', ProductViewSet.as_view({
+        'get': 'resolve_variant'
+    }), name='product-resolve-variant'),
+    
     # Variant type routes
     path('variant-types/', ProductVariantTypeViewSet.as_view({
         'get': 'list',
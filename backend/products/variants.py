@@ -0,0 +1,156 @@
+from decimal import Decimal, InvalidOperation
+from itertools import product as cartesian_product
+
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .cache import catalog_cache, invalidate_products
+from .models import ProductVariant, ProductVariantOption, available_stock_value, current_stock_value
+
+# Largest option matrix a single request may generate
+MAX_GENERATED_VARIANTS = 5000
+
+# Indexes are keyed by the product's cache generations, which retire them on change
+VARIANT_INDEX_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def generate_variants(product, option_groups, base_sku, price_adjustments=None):
+    """
+    Create one variant of ``product`` for every combination of options,
+    taking one option from each group of ``option_groups``.
+
+    Variants get the SKUs ``{base_sku}-1``, ``{base_sku}-2``, ... in
+    combination order and the sum of their options' ``price_adjustments``.
+    The whole matrix costs a fixed number of queries however large it is:
+    one to load the options, one to check the SKUs, and one bulk insert each
+    for the variants and their options, all in one transaction. Raises
+    ValidationError without writing anything if the input is invalid or any
+    SKU is already taken.
+    """
+    if not isinstance(option_groups, list) or not option_groups or not all(
+        isinstance(group, list) and group for group in option_groups
+    ):
+        raise serializers.ValidationError('option_groups must be a list of non-empty lists of option ids')
+    try:
+        option_groups = [[int(option_id) for option_id in group] for group in option_groups]
+        price_adjustments = {
+            int(option_id): Decimal(str(adjustment))
+            for option_id, adjustment in (price_adjustments or {}).items()
+        }
+    except (TypeError, ValueError, InvalidOperation):
+        raise serializers.ValidationError('Option ids must be integers and price adjustments numbers')
+
+    count = 1
+    for group in option_groups:
+        count *= len(group)
+    if count > MAX_GENERATED_VARIANTS:
+        raise serializers.ValidationError(
+            f'{count} combinations requested; at most {MAX_GENERATED_VARIANTS} variants can be generated at once'
+        )
+
+    option_ids = {option_id for group in option_groups for option_id in group}
+    options = ProductVariantOption.objects.in_bulk(option_ids)
+    unknown = sorted(option_ids - set(options))
+    if unknown:
+        raise serializers.ValidationError(f'Unknown variant options: {unknown}')
+
+    combinations = list(cartesian_product(*option_groups))
+    skus = [f"{base_sku}-{index}" for index in range(1, len(combinations) + 1)]
+    taken = sorted(ProductVariant.objects.filter(sku__in=skus).values_list('sku', flat=True))
+    if taken:
+        raise serializers.ValidationError(f"SKUs already exist: {', '.join(taken)}")
+
+    Through = ProductVariant.options.through
+    try:
+        with transaction.atomic():
+            variants = ProductVariant.objects.bulk_create([
+                ProductVariant(
+                    product=product,
+                    sku=sku,
+                    price_adjustment=sum((price_adjustments.get(option_id, Decimal('0')) for option_id in combo), Decimal('0')),
+                    stock=0,  # Default stock to 0
+                    is_active=True
+                )
+                for sku, combo in zip(skus, combinations)
+            ])
+            Through.objects.bulk_create([
+                Through(productvariant_id=variant.id, productvariantoption_id=option_id)
+                for variant, combo in zip(variants, combinations)
+                for option_id in set(combo)
+            ])
+    except IntegrityError:
+        # A concurrent request took one of the SKUs after the check
+        raise serializers.ValidationError('SKUs already exist, please try again')
+
+    # bulk_create sends no model or m2m signals
+    invalidate_products(product.id)
+
+    return ProductVariant.objects.filter(id__in=[variant.id for variant in variants]).select_related(
+        'product'
+    ).prefetch_related(
+        Prefetch('options', queryset=ProductVariantOption.objects.select_related('variant_type'))
+    ).order_by('id')
+
+
+def option_signature(option_ids):
+    """
+    Canonical key for a set of option ids, e.g. [7, 3, 7] -> "3-7"
+    """
+    return '-'.join(str(option_id) for option_id in sorted(set(option_ids)))
+
+
+def build_variant_index(product_id):
+    """
+    Map the option signature of each active variant of a product to its
+    id, SKU, prices, stock and the stock not held in carts. Runs two queries.
+    """
+    variants = ProductVariant.objects.filter(product_id=product_id, is_active=True).annotate(
+        current_stock_value=current_stock_value(ProductVariant),
+        available_stock_value=available_stock_value(ProductVariant)
+    ).values_list(
+        'id', 'sku', 'price_adjustment', 'current_stock_value', 'available_stock_value',
+        'product__price', 'product__discount_price'
+    )
+    option_ids = {}
+    for variant_id, option_id in ProductVariant.options.through.objects.filter(
+        productvariant__product_id=product_id, productvariant__is_active=True
+    ).values_list('productvariant_id', 'productvariantoption_id'):
+        option_ids.setdefault(variant_id, []).append(option_id)
+
+    index = {}
+    for variant_id, sku, price_adjustment, stock, available_stock, price, discount_price in variants:
+        # Same prices as the ProductVariant.price and discount_price properties
+        index[option_signature(option_ids.get(variant_id, []))] = {
+            'id': variant_id,
+            'sku': sku,
+            'price': str(price + price_adjustment),
+            'discount_price': str(discount_price + price_adjustment) if discount_price else None,
+            'stock': stock,
+            'available_stock': available_stock,
+        }
+    return index
+
+
+def get_variant_index(product_id):
+    """
+    Get the variant index of a product from the cache, building it on a miss.
+
+    Entries are keyed by the product's catalog cache generations, so any
+    change that invalidates the product's cached responses (variants,
+    their options, prices or stock) also retires its index.
+    """
+    generations = catalog_cache.get_generations(['catalog', f"product:{product_id}"])
+    key = f"variant-index:{':'.join(str(generation) for generation in generations)}:{product_id}"
+    index = catalog_cache.cache.get(key)
+    if index is None:
+        index = build_variant_index(product_id)
+        catalog_cache.cache.set(key, index, VARIANT_INDEX_CACHE_TIMEOUT)
+    return index
+
+
+def resolve_variant(product_id, option_ids):
+    """
+    Find the active variant of a product with exactly the given options, or None
+    """
+    return get_variant_index(product_id).get(option_signature(option_ids))
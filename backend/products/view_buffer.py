@@ -0,0 +1,45 @@
+import threading
+
+from django.utils import timezone
+
+from core.write_buffer import WriteBuffer
+from .models import ProductView
+
+
+class ProductViewBuffer(WriteBuffer):
+    """
+    Buffers ProductView rows so product detail requests never wait on the insert
+    """
+    model = ProductView
+    settings_name = 'PRODUCT_VIEW_BUFFER'
+
+    def record(self, product_id, user_id=None, session_id=None):
+        """
+        Queue a view; returns False if it was dropped because the buffer is full
+        """
+        return self.add(ProductView(
+            product_id=product_id,
+            user_id=user_id,
+            session_id=session_id,
+            timestamp=timezone.now()
+        ))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_product_view_buffer():
+    """
+    Get the process-wide ProductView buffer, creating it from settings on first use
+    """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ProductViewBuffer.from_settings()
+    return _buffer
+
+
+def record_product_view(product_id, user_id=None, session_id=None):
+    return get_product_view_buffer().record(product_id, user_id=user_id, session_id=session_id)
@@ -1,27 +1,49 @@
+import re
 import uuid
+from decimal import Decimal
 
-from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import action, parser_classes
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny
+from rest_framework import viewsets, status, permissions, serializers
+from rest_framework.decorators import action, api_view, parser_classes, permission_classes
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
 from django.db import transaction, connection
-from django.db.models import Q
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import DecimalField, F, Prefetch, Q, Value
+from django.db.models.functions import Cast
 
 from .models import (
     Product, ProductView, Review, ProductImage, Category, 
-    ProductVariantType, ProductVariantOption, ProductVariant,
-    Wishlist, WishlistItem
+    ProductVariantType, ProductVariantOption, ProductVariant, ProductImportJob,
+    Wishlist, WishlistItem, available_stock_value, current_stock_value
 )
 from .serializers import (
     ProductSerializer, ProductCreateUpdateSerializer, ReviewSerializer, 
     ProductImageSerializer, CategorySerializer, ProductVariantTypeSerializer, 
-    ProductVariantOptionSerializer, ProductVariantSerializer,
-    WishlistSerializer, WishlistItemSerializer
+    ProductVariantOptionSerializer, ProductVariantSerializer, ProductListSerializer, ProductSearchSerializer,
+    ProductImportJobSerializer, ProductWithVariantIndexSerializer, WishlistSerializer, WishlistItemSerializer
 )
+from .cache import (
+    catalog_cache, category_products_scopes, category_scopes, product_detail_scopes, product_list_scopes
+)
+from .category_tree import get_category_tree
+from .facets import ProductFacets, parse_ids
+from .importer import start_import
+from .variants import generate_variants, resolve_variant
+from .view_buffer import record_product_view
+from analytics.activity_buffer import record_search
+from carts.reservations import release_product
 from permissions import IsSellerOrAdmin, IsProductSeller
+from core.conditional import etag_matches, not_modified, with_etag
+from core.pagination import KeysetPagination
+
+# Words of a search query; anything else (tsquery operators included) is dropped
+SEARCH_TERM_PATTERN = re.compile(r'\w+')
+
+# Search ranks as a fixed-point number that sorts and compares exactly
+SEARCH_RANK_FIELD = DecimalField(max_digits=12, decimal_places=6)
 
 
 class WishlistViewSet(viewsets.ModelViewSet):
@@ -183,6 +205,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
     parser_classes = [JSONParser, MultiPartParser, FormParser]  # Add parsers to handle file uploads
     
@@ -201,6 +224,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         description="List all categories",
         responses={200: CategorySerializer(many=True)}
     )
+    @catalog_cache.cached(category_scopes)
     def list(self, request, *args, **kwargs):
         """
         Get all categories in the store
@@ -210,9 +234,10 @@ class CategoryViewSet(viewsets.ModelViewSet):
         except Exception as e:
             # Simplified error handling
             categories = self.get_queryset()
+            page = self.paginate_queryset(categories)
             simplified_categories = []
             
-            for category in categories:
+            for category in (page if page is not None else categories):
                 try:
                     simplified_categories.append({
                         'id': category.id,
@@ -228,6 +253,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
                 except Exception:
                     continue
             
+            if page is not None:
+                return self.get_paginated_response(simplified_categories)
             return Response(simplified_categories)
     
     @extend_schema(
@@ -262,6 +289,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         description="Retrieve a specific category by ID",
         responses={200: CategorySerializer}
     )
+    @catalog_cache.cached(category_scopes)
     def retrieve(self, request, *args, **kwargs):
         try:
             return super().retrieve(request, *args, **kwargs)
@@ -412,6 +440,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         responses={200: CategorySerializer(many=True)}
     )
     @action(detail=True, methods=['get'])
+    @catalog_cache.cached(category_scopes)
     def subcategories(self, request, pk=None):
         """
         Get all subcategories for a specific category
@@ -444,26 +473,93 @@ class CategoryViewSet(viewsets.ModelViewSet):
             
             return Response(simplified_subcategories)
     
+    @extend_schema(
+        description="Get the whole category tree, nested, with the number of products in each "
+                    "category (product_count) and in its subtree (total_product_count). "
+                    "Send the last ETag in If-None-Match to get 304 while the tree is unchanged.",
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """
+        Get the category tree from the in-process snapshot
+        """
+        snapshot = get_category_tree()
+        if etag_matches(request, snapshot.etag):
+            return not_modified(snapshot.etag, public=True)
+        return with_etag(Response(snapshot.tree), snapshot.etag, public=True)
+    
+    @extend_schema(
+        description="Get all categories below a specific category, at any depth",
+        responses={200: CategorySerializer(many=True)}
+    )
+    @action(detail=True, methods=['get'])
+    @catalog_cache.cached(category_scopes)
+    def descendants(self, request, pk=None):
+        """
+        Get the whole subtree below a category in one query
+        """
+        category = self.get_object()
+        descendants = category.get_descendants(include_self=False).order_by('ancestor_links__depth', 'name')
+        serializer = self.get_serializer(descendants, many=True)
+        return Response(serializer.data)
+    
+    @extend_schema(
+        description="Get the categories above a specific category, root first",
+        responses={200: CategorySerializer(many=True)}
+    )
+    @action(detail=True, methods=['get'])
+    @catalog_cache.cached(category_scopes)
+    def ancestors(self, request, pk=None):
+        """
+        Get the path from the root down to a category's parent in one query
+        """
+        category = self.get_object()
+        serializer = self.get_serializer(category.get_ancestors(), many=True)
+        return Response(serializer.data)
+    
     @extend_schema(
         description="Get all products in a specific category",
+        parameters=[
+            OpenApiParameter(
+                name='include_descendants',
+                description='Also include products from all subcategories, at any depth',
+                required=False,
+                type=bool,
+            ),
+        ],
         responses={200: ProductSerializer(many=True)}
     )
     @action(detail=True, methods=['get'])
+    @catalog_cache.cached(category_products_scopes)
     def products(self, request, pk=None):
         """
         Get all products in a specific category
         """
         category = self.get_object()
-        products = category.products.all().select_related('category', 'seller')
+        if request.query_params.get('include_descendants', '').lower() == 'true':
+            # One join against the closure table covers the whole subtree
+            products = Product.objects.filter(
+                category__ancestor_links__ancestor=category
+            ).select_related('category', 'seller')
+        else:
+            products = category.products.all().select_related('category', 'seller')
+        
+        # Paginate results
+        page = self.paginate_queryset(products)
         
         try:
+            if page is not None:
+                serializer = ProductSerializer(page, many=True, context={'request': request})
+                return self.get_paginated_response(serializer.data)
+            
             serializer = ProductSerializer(products, many=True, context={'request': request})
             return Response(serializer.data)
         except Exception as e:
             # Simplified error handling
             simplified_products = []
             
-            for product in products:
+            for product in (page if page is not None else products):
                 try:
                     simplified_products.append({
                         'id': product.id,
@@ -488,6 +584,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
                 except Exception:
                     continue
             
+            if page is not None:
+                return self.get_paginated_response(simplified_products)
             return Response(simplified_products)
 
 
@@ -550,9 +648,18 @@ class ProductVariantViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsSellerOrAdmin]
     
     def get_queryset(self):
+        # The variant name reads the product and every option with its type
+        queryset = ProductVariant.objects.select_related('product').prefetch_related(
+            Prefetch('options', queryset=ProductVariantOption.objects.select_related('variant_type'))
+        )
+        if self.action in ['list', 'by_product']:
+            queryset = queryset.annotate(
+                current_stock_value=current_stock_value(ProductVariant),
+                available_stock_value=available_stock_value(ProductVariant)
+            )
         if self.request.user.is_staff or self.request.user.role == 'admin':
-            return ProductVariant.objects.all()
-        return ProductVariant.objects.filter(product__seller=self.request.user)
+            return queryset
+        return queryset.filter(product__seller=self.request.user)
     
     @extend_schema(
         description="Get variants for a specific product",
@@ -576,25 +683,102 @@ class ProductVariantViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        variants = ProductVariant.objects.filter(product_id=product_id)
+        variants = self.get_queryset().filter(product_id=product_id)
         serializer = self.get_serializer(variants, many=True)
         return Response(serializer.data)
 
 
+class ProductImportViewSet(viewsets.GenericViewSet):
+    """
+    API endpoint for bulk product imports: upload a CSV or NDJSON file, then
+    poll the returned job for progress and per-row errors
+    """
+    serializer_class = ProductImportJobSerializer
+    permission_classes = [IsAuthenticated, IsSellerOrAdmin]
+    parser_classes = [MultiPartParser, FormParser]
+    
+    def get_queryset(self):
+        return ProductImportJob.objects.filter(seller=self.request.user)
+    
+    @extend_schema(
+        description="Start a bulk import of products for the authenticated seller. "
+                    "CSV files have one product per row with a header of field names, and an optional "
+                    "`variants` column holding a JSON list; NDJSON files have one product object per line. "
+                    "Rows follow the same rules as creating a product, plus `category` (id) and `variants` "
+                    "(each with sku, price_adjustment, stock, weight, is_active and option ids). "
+                    "Returns the job to poll.",
+        request={
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {
+                    'file': {'type': 'string', 'format': 'binary'},
+                    'file_format': {'type': 'string', 'enum': ['csv', 'ndjson']},
+                },
+                'required': ['file']
+            }
+        },
+        responses={202: ProductImportJobSerializer}
+    )
+    def create(self, request):
+        """
+        Store the upload and process it in the background
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            job = serializer.save(seller=request.user)
+            start_import(job)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+    
+    @extend_schema(
+        description="Get the progress and row errors of an import",
+        responses={200: ProductImportJobSerializer}
+    )
+    def retrieve(self, request, pk=None):
+        job = self.get_object()
+        return Response(self.get_serializer(job).data)
+    
+    @extend_schema(
+        description="List the authenticated seller's imports, newest first",
+        responses={200: ProductImportJobSerializer(many=True)}
+    )
+    def list(self, request):
+        jobs = self.get_queryset()
+        
+        # Paginate results
+        page = self.paginate_queryset(jobs)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = KeysetPagination
     parser_classes = [JSONParser, MultiPartParser, FormParser]
       
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return ProductCreateUpdateSerializer
+        elif self.action == 'list':
+            return ProductListSerializer
+        elif self.action == 'search':
+            return ProductSearchSerializer
+        elif self.action == 'retrieve':
+            return ProductWithVariantIndexSerializer
         return ProductSerializer
     
-    def get_queryset(self):
+    def get_base_queryset(self):
+        """
+        Products before the facet filters are applied
+        """
         # Optimize queries with select_related
         queryset = Product.objects.select_related('category', 'seller')
         
+        # Precompute list fields in bulk instead of per product
+        if self.action in ['list', 'search']:
+            queryset = ProductListSerializer.setup_eager_loading(queryset)
+        
         # Filter by status if provided
         status_param = self.request.query_params.get('status', None)
         if status_param:
@@ -605,11 +789,38 @@ class ProductViewSet(viewsets.ModelViewSet):
         if is_active is not None:
             is_active_bool = is_active.lower() == 'true'
             queryset = queryset.filter(is_active=is_active_bool)
-            
+        
         return queryset
     
+    def get_facets(self):
+        """
+        Parse the facet filters of the request, once per request
+        """
+        if not hasattr(self, '_facets'):
+            self._facets = ProductFacets(self.request.query_params)
+        return self._facets
+    
+    def get_queryset(self):
+        # Filter by price, category subtree, seller, stock, sale, rating and variant options
+        return self.get_facets().apply(self.get_base_queryset())
+    
+    def get_keyset_ordering(self):
+        """
+        Sort order used by the paginator; ?ordering=-rating or rating sorts by
+        average rating, search results are sorted by relevance
+        """
+        if self.action == 'search':
+            return ['-rank', 'id']
+        ordering = self.request.query_params.get('ordering')
+        if ordering == '-rating':
+            return ['-rating_average', 'id']
+        elif ordering == 'rating':
+            # Reverse of the product_rating_idx order so the same index serves both
+            return ['rating_average', '-id']
+        return None
+    
     def get_permissions(self):
-        if self.action == 'list' or self.action == 'retrieve':
+        if self.action in ['list', 'retrieve', 'search', 'resolve_variant']:
             # Allow anyone to view products
             return []
         elif self.action == 'create':
@@ -622,20 +833,89 @@ class ProductViewSet(viewsets.ModelViewSet):
     
     @extend_schema(
         description="List all products in the store - accessible to anyone",
-        responses={200: ProductSerializer(many=True)}
+        parameters=[
+            OpenApiParameter(
+                name='ordering',
+                description='Sort by average rating',
+                required=False,
+                type=str,
+                enum=['rating', '-rating']
+            ),
+            OpenApiParameter(
+                name='min_rating',
+                description='Only include products with at least this average rating',
+                required=False,
+                type=float,
+            ),
+            OpenApiParameter(
+                name='min_price',
+                description='Only include products whose sale price is at least this',
+                required=False,
+                type=float,
+            ),
+            OpenApiParameter(
+                name='max_price',
+                description='Only include products whose sale price is at most this',
+                required=False,
+                type=float,
+            ),
+            OpenApiParameter(
+                name='category',
+                description='Only include products in this category or its subcategories',
+                required=False,
+                type=int,
+            ),
+            OpenApiParameter(
+                name='seller',
+                description='Comma-separated seller ids',
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name='in_stock',
+                description='Only include products that are (true) or are not (false) in stock',
+                required=False,
+                type=bool,
+            ),
+            OpenApiParameter(
+                name='on_sale',
+                description='Only include products that are (true) or are not (false) on sale',
+                required=False,
+                type=bool,
+            ),
+            OpenApiParameter(
+                name='options',
+                description='Comma-separated variant option ids; options of one variant type '
+                            'match any of them, different types must all match',
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name='facets',
+                description='Include facet counts for the current filters in the response',
+                required=False,
+                type=bool,
+            ),
+        ],
+        responses={200: ProductListSerializer(many=True)}
     )
+    @catalog_cache.cached(product_list_scopes)
     def list(self, request, *args, **kwargs):
         """
         Get all products in the store. This endpoint is accessible to anyone.
         """
         try:
-            return super().list(request, *args, **kwargs)
+            response = super().list(request, *args, **kwargs)
+            if request.query_params.get('facets', '').lower() == 'true':
+                response.data['facets'] = self.get_facets().counts(self.get_base_queryset())
+            return response
         except Exception as e:
             # Simplified error handling
             products = self.get_queryset()
+            page = self.paginate_queryset(products)
             simplified_products = []
             
-            for product in products:
+            for product in (page if page is not None else products):
                 try:
                     simplified_products.append({
                         'id': product.id,
@@ -660,35 +940,60 @@ class ProductViewSet(viewsets.ModelViewSet):
                 except Exception:
                     continue
             
+            if page is not None:
+                return self.get_paginated_response(simplified_products)
             return Response(simplified_products)
     
+    @staticmethod
+    def get_session_id(request):
+        """
+        Get the anonymous tracking id from the session, assigning one if needed
+        """
+        session_id = request.session.get('session_id')
+        if not session_id:
+            session_id = str(uuid.uuid4())
+            request.session['session_id'] = session_id
+        return session_id
+    
+    def track_view(self, request, product_id):
+        """
+        Track a product view - buffered and written in batches off the request path
+        """
+        try:
+            if request.user.is_authenticated:
+                record_product_view(product_id, user_id=request.user.id)
+            else:
+                record_product_view(product_id, session_id=self.get_session_id(request))
+        except Exception:
+            # Don't let view tracking failure affect the API response
+            pass
+    
+    def track_search(self, request):
+        """
+        Log a search to UserActivity - buffered like product views. Only the
+        first page counts, so paging through results is not logged again.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query or request.query_params.get(self.paginator.cursor_query_param):
+            return
+        try:
+            if request.user.is_authenticated:
+                record_search(query, user_id=request.user.id)
+            else:
+                record_search(query, session_id=self.get_session_id(request))
+        except Exception:
+            # Don't let search tracking failure affect the API response
+            pass
+    
+    @catalog_cache.cached(
+        product_detail_scopes,
+        # Views are still counted when the response comes from the cache
+        on_hit=lambda view, request, kwargs: view.track_view(request, int(kwargs['pk']))
+    )
     def retrieve(self, request, *args, **kwargs):
         try:
             instance = self.get_object()
-            # Track view - simplified
-            try:
-                # Check if ProductView model exists in the database
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT EXISTS (
-                            SELECT FROM information_schema.tables 
-                            WHERE table_name = 'products_productview'
-                        );
-                    """)
-                    table_exists = cursor.fetchone()[0]
-                
-                if table_exists:
-                    if request.user.is_authenticated:
-                        ProductView.objects.create(product=instance, user=request.user)
-                    else:
-                        session_id = request.session.get('session_id')
-                        if not session_id:
-                            session_id = str(uuid.uuid4())
-                            request.session['session_id'] = session_id
-                        ProductView.objects.create(product=instance, session_id=session_id)
-            except Exception:
-                # Don't let view tracking failure affect the API response
-                pass
+            self.track_view(request, instance.id)
             
             serializer = self.get_serializer(instance)
             return Response(serializer.data)
@@ -717,6 +1022,61 @@ class ProductViewSet(viewsets.ModelViewSet):
             }
             return Response(simplified_product)
     
+    @extend_schema(
+        description="Full-text search over product name, description and category name, "
+                    "ranked by relevance. The last word is prefix-matched for type-ahead.",
+        parameters=[
+            OpenApiParameter(
+                name='q',
+                description='Search text',
+                required=True,
+                type=str,
+            ),
+        ],
+        responses={200: ProductSearchSerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'])
+    @catalog_cache.cached(
+        product_list_scopes,
+        # Searches are still logged when the response comes from the cache
+        on_hit=lambda view, request, kwargs: view.track_search(request)
+    )
+    def search(self, request):
+        """
+        Search products. Uses the GIN-indexed search vector on PostgreSQL and
+        falls back to substring matching on other databases.
+        """
+        terms = SEARCH_TERM_PATTERN.findall(request.query_params.get('q', ''))
+        if not terms:
+            return Response({'error': 'Search query is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        products = self.get_queryset()
+        if connection.vendor == 'postgresql':
+            # Every word must match; the last one may be incomplete
+            search_query = SearchQuery(
+                ' & '.join(terms[:-1] + [f'{terms[-1]}:*']),
+                search_type='raw',
+                config='english'
+            )
+            # Results are paginated by rank, so it is rounded to a fixed-point
+            # number that round-trips through the cursor; a float4 ts_rank does not
+            products = products.filter(search_vector=search_query).annotate(
+                rank=Cast(SearchRank(F('search_vector'), search_query), SEARCH_RANK_FIELD)
+            )
+        else:
+            for term in terms:
+                products = products.filter(
+                    Q(name__icontains=term) | Q(description__icontains=term) | Q(category__name__icontains=term)
+                )
+            products = products.annotate(rank=Value(Decimal('0'), output_field=SEARCH_RANK_FIELD))
+        
+        self.track_search(request)
+        
+        # Paginate results
+        page = self.paginate_queryset(products)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
     @extend_schema(
         description="Get products for the authenticated seller",
         responses={200: ProductSerializer(many=True)}
@@ -1113,61 +1473,13 @@ class ProductViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            # Use a direct SQL approach to delete the product
-            # This avoids ORM cascading which might try to access non-existent tables
-            with connection.cursor() as cursor:
-                # Get the product ID for use in queries
-                product_id = instance.id
-                
-                # List of tables to check and clean up before deleting the product
-                # We'll only delete from tables that actually exist
-                tables_to_check = [
-                    # Format: (table_name, column_name)
-                    ('products_productview', 'product_id'),
-                    ('products_review', 'product_id'),
-                    ('products_productimage', 'product_id'),
-                    ('products_productvariant', 'product_id'),
-                    ('carts_cartitem', 'product_id'),
-                    ('orders_orderitem', 'product_id'),
-                    ('products_wishlistitem', 'product_id'),
-                    # Add any other tables that might reference products
-                ]
-
-                # Check each table and delete related records if the table exists
-                for table_name, column_name in tables_to_check:
-                    try:
-                        # Check if the table exists
-                        cursor.execute(f"""
-                            SELECT EXISTS (
-                                SELECT FROM information_schema.tables 
-                                WHERE table_name = %s
-                            );
-                        """, [table_name])
-                        table_exists = cursor.fetchone()[0]
-                        
-                        if table_exists:
-                            # Check if the column exists in the table
-                            cursor.execute(f"""
-                                SELECT EXISTS (
-                                    SELECT FROM information_schema.columns 
-                                    WHERE table_name = %s AND column_name = %s
-                                );
-                            """, [table_name, column_name])
-                            column_exists = cursor.fetchone()[0]
-                            
-                            if column_exists:
-                                # Delete records where the product is referenced
-                                cursor.execute(f"""
-                                    DELETE FROM "{table_name}" 
-                                    WHERE "{column_name}" = %s
-                                """, [product_id])
-                    except Exception as e:
-                        # Log the error but continue with other tables
-                        print(f"Error handling {table_name}: {str(e)}")
-                
-                # Finally, delete the product
-                cursor.execute('DELETE FROM "products_product" WHERE "id" = %s', [product_id])
-                
+            with transaction.atomic():
+                # Give back the units carts hold, locking the holds before the
+                # stock rows as checkout and the reaper do
+                release_product(instance)
+                # Delete through the ORM so related rows cascade and the post_delete
+                # signals invalidate the cached catalog and category tree
+                instance.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
             return Response(
@@ -1178,7 +1490,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def add_review(self, request, pk=None):
         product = self.get_object()
-        serializer = ReviewSerializer(data=request.data)
+        serializer = ReviewSerializer(data=request.data, context={'request': request})
         
         if serializer.is_valid():
             # Check if user already reviewed this product
@@ -1355,43 +1667,48 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Convert string keys to integers for price_adjustments
-        price_adjustments = {int(k): v for k, v in price_adjustments.items()}
-        
-        # Generate all combinations of options
-        from itertools import product as itertools_product
-        combinations = list(itertools_product(*option_groups))
+        # Load the options, check the SKUs and insert every combination in a fixed number of queries
+        try:
+            variants = generate_variants(product, option_groups, base_sku, price_adjustments)
+        except serializers.ValidationError as e:
+            return Response({'error': e.detail[0]}, status=status.HTTP_400_BAD_REQUEST)
         
-        created_variants = []
+        return Response(ProductVariantSerializer(variants, many=True).data, status=status.HTTP_201_CREATED)
         
-        for i, combo in enumerate(combinations):
-            # Generate SKU
-            sku = f"{base_sku}-{i+1}"
-            
-            # Calculate price adjustment
-            price_adjustment = sum(price_adjustments.get(option_id, 0) for option_id in combo)
-            
-            # Create variant
-            variant = ProductVariant.objects.create(
-                product=product,
-                sku=sku,
-                price_adjustment=price_adjustment,
-                stock=0,  # Default stock to 0
-                is_active=True
+    @extend_schema(
+        description="Find the active variant of a product with exactly the selected options. "
+                    "Served from the product's cached variant index.",
+        parameters=[
+            OpenApiParameter(
+                name='options',
+                description='Comma-separated option IDs, one per variant type, in any order',
+                required=True,
+                type=str,
+                location=OpenApiParameter.QUERY
+            ),
+        ],
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @catalog_cache.cached(product_detail_scopes)
+    def resolve_variant(self, request, pk=None):
+        """
+        Resolve a combination of options to a variant's id, SKU, prices and stock
+        """
+        option_ids = parse_ids(request.query_params.get('options'))
+        if not option_ids:
+            return Response(
+                {'error': 'options parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Add options
-            for option_id in combo:
-                try:
-                    option = ProductVariantOption.objects.get(id=option_id)
-                    variant.options.add(option)
-                except ProductVariantOption.DoesNotExist:
-                    pass
-            
-            created_variants.append(ProductVariantSerializer(variant).data)
-        
-        return Response(created_variants, status=status.HTTP_201_CREATED)
         
+        variant = resolve_variant(int(pk), option_ids)
+        if variant is None:
+            return Response(
+                {'error': 'No variant matches the selected options'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(variant)
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def toggle_wishlist(self, request, pk=None):
         """
@@ -1413,4 +1730,16 @@ class ProductViewSet(viewsets.ModelViewSet):
         else:
             # Add to wishlist
             WishlistItem.objects.create(wishlist=wishlist, product=product)
-            return Response({'status': 'added', 'message': 'Product added to wishlist'})
\ No newline at end of file
+            return Response({'status': 'added', 'message': 'Product added to wishlist'})
+
+@extend_schema(
+    description="Hit/miss counters of the anonymous catalog response cache (admin only)",
+    responses={200: OpenApiTypes.OBJECT}
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def catalog_cache_stats(request):
+    """
+    Get catalog cache counters for monitoring
+    """
+    return Response(catalog_cache.stats())
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from django.db.models import Q
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
+from core.pagination import KeysetPagination
 from .models import Question, Answer
 from .serializers import (
     QuestionSerializer, 
@@ -53,6 +54,7 @@ class QuestionViewSet(viewsets.ModelViewSet):
     """
     queryset = Question.objects.all()
     serializer_class = QuestionSerializer
+    pagination_class = KeysetPagination
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['content', 'product__name']
     ordering_fields = ['created_at', 'updated_at']